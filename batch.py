@@ -0,0 +1,196 @@
+"""
+Solve the plans of many students against one catalog.
+
+    python batch.py                                   # data/ and data/students.csv
+    python batch.py CATALOG STUDENTS --workers 4 --output plans.jsonl
+
+CATALOG is an instance directory or JSON file (see loader.load_instance)
+listing every offered course; STUDENTS is a students table (see
+loader.read_students). One JSON line per student is written as soon as its
+plan is solved.
+"""
+import argparse
+import concurrent.futures
+import json
+import logging
+import multiprocessing
+import os
+import sys
+
+from csp import CSP
+from encoding import DomainEncoding
+from loader import Instance, load_instance, read_students
+from preferences import (
+    prefer_later_start_times,
+    prefer_professor,
+    prefer_building_room,
+    prefer_room_diversity_incremental
+)
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+PREFERENCES = {
+    "later_start_time": prefer_later_start_times,
+    "professor_preference": prefer_professor,
+    "building_room_preference": prefer_building_room,
+    "room_diversity_preference": prefer_room_diversity_incremental,
+}
+
+# Unary constraints of Instance.constraints() that do not depend on the
+# student; Catalog applies them once to every offered course.
+CATALOG_UNARY = ("prof_availability", "prof_specialty")
+
+
+class Catalog:
+    """
+    The student-independent part of many scheduling problems, built once: the
+    value encoding of every offered course of a loader.Instance and its domain
+    filtered by the CATALOG_UNARY constraints.
+
+    plan(student) gives the CSP of one student, sharing the encoding and
+    starting from the filtered domains; only the prerequisite index (whose
+    term bounds depend on the completed courses) and the stateful global
+    constraints are built per student, and the latter share the keys they
+    compute for each value.
+    """
+
+    def __init__(self, instance, preferences=None):
+        self.instance = instance
+        self.preferences = preferences
+        self.encoding = DomainEncoding()
+        unary = {name: c for name, c in instance.constraints().items() if name in CATALOG_UNARY}
+        csp = CSP(instance.variables, instance.domains, {}, unary, instance.prerequisites, instance.course_term,
+                  encoding=self.encoding)
+        self.masks = dict(csp.masks)
+        csp.node_consistency(self.masks)
+        self.value_keys = {}  # (constraint class, key fields) -> value id -> key
+
+    def view(self, student):
+        """The Instance of `student`: its courses in their catalog terms, its completed courses."""
+        catalog = self.instance
+        unknown = [course for course in student.courses if course not in self.masks]
+        if unknown:
+            raise ValueError(f"Courses not offered in the catalog: {', '.join(unknown)}")
+        view = Instance()
+        view.variables = list(student.courses)
+        view.course_term = {course: catalog.course_term[course] for course in student.courses}
+        view.course_term.update((course, "Completed") for course in student.completed)
+        view.days = {course: catalog.days[course] for course in student.courses}
+        view.domains = {course: catalog.domains[course] for course in student.courses}
+        view.slots = catalog.slots
+        view.rooms = catalog.rooms
+        view.professors = catalog.professors
+        view.availability = catalog.availability
+        view.specialties = catalog.specialties
+        view.prerequisites = catalog.prerequisites
+        view.term_names = catalog.terms()
+        return view
+
+    def plan(self, student):
+        """(CSP, encoded domains to solve from) for `student`."""
+        view = self.view(student)
+        constraints = view.constraints()
+        for name in CATALOG_UNARY:
+            constraints.pop(name, None)
+        for constraint in constraints.values():
+            if hasattr(constraint, "value_keys"):
+                constraint.value_keys = self.value_keys.setdefault((type(constraint), constraint.fields), {})
+        csp = CSP(view.variables, view.domains, view.neighbors(), constraints, view.prerequisites, view.course_term,
+                  self.preferences, encoding=self.encoding)
+        domains = {course: self.masks[course] for course in view.variables}
+        csp.node_consistency(domains)
+        return csp, domains
+
+
+def solve_student(catalog, student, solve_kwargs=None):
+    """
+    Solve one student's plan; returns (solution, metrics). A plan the
+    catalog cannot accommodate (an unknown course, an impossible prerequisite
+    chain) has no solution and its metrics hold the "error".
+    """
+    try:
+        csp, domains = catalog.plan(student)
+    except ValueError as e:
+        return None, {"error": str(e)}
+    return csp.solve(domains=domains, **(solve_kwargs or {}))
+
+
+# Set in each worker process by _init_worker; with the fork start method the
+# catalog is inherited copy-on-write instead of being pickled.
+_catalog = None
+
+
+def _init_worker(catalog):
+    global _catalog
+    _catalog = catalog
+
+
+def _solve_task(student, solve_kwargs):
+    return student.student_id, solve_student(_catalog, student, solve_kwargs)
+
+
+def solve_batch(catalog, students, workers=None, **solve_kwargs):
+    """
+    Yield (student_id, solution, metrics) for every Student of the iterable
+    `students`. With more than one worker the plans are solved in a process
+    pool and yielded as they finish, with at most two per worker in flight, so
+    `students` may be a stream of any length.
+    """
+    if workers is None or workers <= 1:
+        for student in students:
+            solution, metrics = solve_student(catalog, student, solve_kwargs)
+            yield student.student_id, solution, metrics
+        return
+
+    context = multiprocessing.get_context()
+    students = iter(students)
+    with concurrent.futures.ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                                                initargs=(catalog,)) as pool:
+        pending = set()
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < 2 * workers:
+                student = next(students, None)
+                if student is None:
+                    exhausted = True
+                else:
+                    pending.add(pool.submit(_solve_task, student, solve_kwargs))
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                student_id, (solution, metrics) = future.result()
+                yield student_id, solution, metrics
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve many students' plans against one catalog.")
+    parser.add_argument("catalog", nargs="?", default=DATA_DIR)
+    parser.add_argument("students", nargs="?", default=os.path.join(DATA_DIR, "students.csv"))
+    parser.add_argument("--workers", type=int, default=None, help="processes to solve in (default: one)")
+    parser.add_argument("--solve-kwargs", type=json.loads, default={},
+                        help='JSON keyword arguments for CSP.solve, e.g. \'{"optimize": true}\'')
+    parser.add_argument("--output", help="JSON Lines file for the plans (default: standard output)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    catalog = Catalog(load_instance(args.catalog), PREFERENCES)
+    out = open(args.output, "w") if args.output else sys.stdout
+    solved = total = 0
+    try:
+        for student_id, solution, metrics in solve_batch(catalog, read_students(args.students), args.workers,
+                                                         **args.solve_kwargs):
+            total += 1
+            solved += solution is not None
+            record = {"student": student_id, "solution": solution, "metrics": metrics}
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"Solved {solved} of {total} plans", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,319 @@
+"""
+Benchmark the solver on seeded synthetic instances.
+
+    python benchmark.py                                  # quick grid, results to benchmark.json
+    python benchmark.py --grid full --repeat 3
+    python benchmark.py --grid tight --seeds 10         # cases where the search backtracks
+    python benchmark.py --save-baseline baseline.json    # record a baseline
+    python benchmark.py --baseline baseline.json         # compare against it
+
+Every case of the grid is solved `repeat` times and the median wall time is
+kept, together with the search counters of CSP.solve and the peak memory
+allocated during one extra, traced run. Against a baseline, a case is a
+regression when its median time grows by more than --threshold (and a speedup
+when it shrinks by as much); a change in node count means the search itself
+changed. The exit status is 1 if any case regressed. With --instrument, each
+record also holds the Instrumentation summary of one extra, profiled run.
+"""
+import argparse
+import itertools
+import json
+import logging
+import platform
+import random
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+
+from csp import CSP
+from loader import CourseDomain, Instance
+from preferences import (
+    prefer_later_start_times,
+    prefer_professor,
+    prefer_building_room,
+    prefer_room_diversity_incremental
+)
+
+PREFIXES = ["CMPUT", "MATH", "STAT", "PHYS", "CHEM", "BIOL", "ENGL", "HIST"]
+TIMES = ["8AM", "9AM", "10AM", "11AM", "12PM", "1PM", "2PM", "3PM", "4PM"]
+BUILDINGS = ["CCIS", "ETLC", "CSC", "SUB", "CAB", "TELUS", "HUB", "NRE"]
+
+PARAMETERS = ("courses", "terms", "rooms", "professors", "depth", "tightness", "booked")
+
+GRIDS = {
+    "quick": {
+        "courses": [10, 20],
+        "terms": [2],
+        "rooms": [4, 8],
+        "professors": [6],
+        "depth": [1],
+        "tightness": [0.0, 0.4],
+        "booked": [0.0],
+    },
+    "full": {
+        "courses": [10, 20, 30, 40],
+        "terms": [2, 3],
+        "rooms": [4, 8, 16],
+        "professors": [6, 12],
+        "depth": [1, 2],
+        "tightness": [0.0, 0.3, 0.6],
+        "booked": [0.0],
+    },
+    # Every room and slot is needed and some rooms are booked, so the slot and
+    # room constraints interact and the search has to backtrack.
+    "tight": {
+        "courses": [16, 24],
+        "terms": [2],
+        "rooms": [4, 6],
+        "professors": [6],
+        "depth": [1],
+        "tightness": [0.3],
+        "booked": [0.7, 0.8],
+    },
+}
+
+METRICS = ("backtracks", "consistency_checks", "forward_check_calls", "nodes", "nodes_per_second")
+
+PREFERENCES = {
+    "later_start_time": prefer_later_start_times,
+    "professor_preference": prefer_professor,
+    "building_room_preference": prefer_building_room,
+    "room_diversity_preference": prefer_room_diversity_incremental,
+}
+
+
+def term_capacity(rooms):
+    """Most courses a term can hold: one per slot, and at most 2 per room (room_diversity_constraint)."""
+    return min(2 * len(TIMES), 2 * rooms)
+
+
+def fits(params):
+    return -(-params["courses"] // params["terms"]) <= term_capacity(params["rooms"])
+
+
+def generate_instance(seed, courses=10, terms=2, rooms=4, professors=6, depth=1, tightness=0.0, booked=0.0):
+    """
+    A random instance shaped like the one in data/.
+
+    courses:    number of courses, spread evenly over the terms and day types;
+                at most term_capacity(rooms) per term.
+    rooms:      number of (building, room) pairs.
+    professors: each teaches two course prefixes; every prefix has a teacher.
+    depth:      longest prerequisite chain, in courses (capped at terms - 1).
+    tightness:  probability that a professor is unavailable at a given time of
+                a term (every professor keeps at least one time per term).
+    booked:     probability that a room is already taken at a given slot of a
+                term, which ties the rooms a course can use to its slot.
+    """
+    if not fits({"courses": courses, "terms": terms, "rooms": rooms}):
+        raise ValueError(f"{courses} courses over {terms} terms do not fit in {rooms} rooms "
+                         f"(at most {term_capacity(rooms)} per term)")
+    rng = random.Random(seed)
+    instance = Instance()
+    term_names = [f"Term{i + 1}" for i in range(terms)]
+    instance.slots = {days: tuple((f"{days}{i + 1}", time_label) for i, time_label in enumerate(TIMES))
+                      for days in ("MWF", "TTH")}
+    instance.rooms = tuple((f"{BUILDINGS[i // 2 % len(BUILDINGS)]}{i // (2 * len(BUILDINGS)) or ''}",
+                            "101" if i % 2 == 0 else "201") for i in range(rooms))
+    instance.professors = tuple(f"Prof{i}" for i in range(professors))
+    for i, professor in enumerate(instance.professors):
+        taught = {PREFIXES[i % len(PREFIXES)], rng.choice(PREFIXES)}
+        instance.specialties[professor] = sorted(taught)
+        instance.availability[professor] = {}
+        for term in term_names:
+            times = [t for t in TIMES if rng.random() >= tightness] or [rng.choice(TIMES)]
+            instance.availability[professor][term] = times
+    taught = {prefix for prefixes in instance.specialties.values() for prefix in prefixes}
+    prefixes = [prefix for prefix in PREFIXES if prefix in taught]
+    shared = {}  # (term, days) -> domain, so courses with the same one are encoded once
+    if booked:
+        taken = {(term, slot, room) for term in term_names for days in instance.slots
+                 for slot, _ in instance.slots[days] for room in instance.rooms if rng.random() < booked}
+        for term in term_names:
+            for days in instance.slots:
+                domain = CourseDomain(term, instance.slots[days], instance.rooms, instance.professors)
+                shared[term, days] = [value for value in domain if (term, value[1], value[3:5]) not in taken]
+
+    chain = {}  # course -> length of its longest prerequisite chain
+    by_term = {term: [] for term in term_names}
+    for i in range(courses):
+        term = term_names[i * terms // courses]
+        course = f"{rng.choice(prefixes)}{100 * (term_names.index(term) + 1) + i}"
+        days = ("MWF", "TTH")[len(by_term[term]) % 2]  # balanced, so a full term fits both day types
+        instance.variables.append(course)
+        instance.course_term[course] = term
+        instance.days[course] = days
+        if booked:
+            instance.domains[course] = shared[term, days]
+        else:
+            instance.domains[course] = CourseDomain(term, instance.slots[days], instance.rooms, instance.professors)
+        chain[course] = 0
+        earlier = [c for t in term_names[:term_names.index(term)] for c in by_term[t] if chain[c] < depth]
+        if earlier and rng.random() < 0.5:
+            if len(earlier) > 1 and rng.random() < 0.3:
+                requirement = rng.sample(earlier, 2)
+                chain[course] = min(chain[c] for c in requirement) + 1
+            else:
+                requirement = rng.choice(earlier)
+                chain[course] = chain[requirement] + 1
+            instance.prerequisites[course] = [requirement]
+        by_term[term].append(course)
+    return instance
+
+
+def grid_cases(grid):
+    """The parameter combinations of `grid`, leaving out those whose courses cannot fit (see fits)."""
+    names = list(grid)
+    for values in itertools.product(*(grid[name] for name in names)):
+        params = dict(zip(names, values))
+        if fits(params):
+            yield params
+
+
+def case_id(params, seed):
+    return ",".join(f"{name}={params[name]}" for name in PARAMETERS) + f",seed={seed}"
+
+
+def _solve(instance, solve_kwargs, timeout):
+    csp = CSP(*instance.csp_args(PREFERENCES))
+    cancel = threading.Event()
+    timer = threading.Timer(timeout, cancel.set) if timeout else None
+    if timer is not None:
+        timer.start()
+    start = time.perf_counter()
+    try:
+        solution, metrics = csp.solve(cancel_event=cancel, **solve_kwargs)
+    finally:
+        if timer is not None:
+            timer.cancel()
+    return solution, metrics, time.perf_counter() - start
+
+
+def run_case(params, seed, repeat=1, solve_kwargs=None, timeout=None, memory=True, instrument=False):
+    """Solve one grid case `repeat` times; returns its result record."""
+    solve_kwargs = solve_kwargs or {}
+    instance = generate_instance(seed, **params)
+    times = []
+    for _ in range(repeat):
+        solution, metrics, elapsed = _solve(instance, solve_kwargs, timeout)
+        times.append(elapsed)
+    record = {"id": case_id(params, seed), "params": params, "seed": seed,
+              "solved": solution is not None, "cancelled": metrics.get("cancelled", False),
+              "wall_time": statistics.median(times), "wall_times": times}
+    for name in METRICS:
+        record[name] = metrics.get(name, 0)
+    if instrument:
+        # A separate run, so the profiling overhead stays out of the timings.
+        record["instrumentation"] = _solve(instance, dict(solve_kwargs, instrumentation=True),
+                                           timeout)[1]["instrumentation"]
+    if memory:
+        tracemalloc.start()
+        try:
+            _solve(instance, solve_kwargs, timeout)
+            record["peak_memory"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return record
+
+
+def run_grid(grid, seeds=(0,), repeat=1, solve_kwargs=None, timeout=None, memory=True, instrument=False):
+    results = []
+    for params in grid_cases(grid):
+        for seed in seeds:
+            record = run_case(params, seed, repeat, solve_kwargs, timeout, memory, instrument)
+            print(f"{record['id']}: {record['wall_time']:.4f}s nodes={record['nodes']} "
+                  f"{'solved' if record['solved'] else 'cancelled' if record['cancelled'] else 'infeasible'}")
+            results.append(record)
+    return results
+
+
+def compare(results, baseline, threshold=0.1):
+    """
+    Compare `results` with the results of a baseline run, matched by case id.
+    Returns (rows, regressions) where each row is (id, baseline time, time,
+    ratio, status) and status is "regression", "speedup", "search changed",
+    "new" or "ok".
+    """
+    previous = {record["id"]: record for record in baseline}
+    rows = []
+    regressions = 0
+    for record in results:
+        old = previous.get(record["id"])
+        if old is None:
+            rows.append((record["id"], None, record["wall_time"], None, "new"))
+            continue
+        ratio = record["wall_time"] / old["wall_time"] if old["wall_time"] else None
+        if ratio is not None and ratio > 1 + threshold:
+            status = "regression"
+            regressions += 1
+        elif ratio is not None and ratio < 1 - threshold:
+            status = "speedup"
+        elif record["nodes"] != old["nodes"] or record["solved"] != old["solved"]:
+            status = "search changed"
+        else:
+            status = "ok"
+        rows.append((record["id"], old["wall_time"], record["wall_time"], ratio, status))
+    return rows, regressions
+
+
+def print_comparison(rows):
+    for case, old, new, ratio, status in rows:
+        if old is None:
+            print(f"{case}: {new:.4f}s ({status})")
+        else:
+            print(f"{case}: {old:.4f}s -> {new:.4f}s"
+                  f"{f' (x{ratio:.2f})' if ratio is not None else ''} {status}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark CSP.solve on synthetic instances.")
+    parser.add_argument("--grid", choices=sorted(GRIDS), default="quick")
+    parser.add_argument("--seeds", type=int, default=1, help="instances per grid point")
+    parser.add_argument("--repeat", type=int, default=1, help="timed runs per instance")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds before a run is cancelled")
+    parser.add_argument("--solve-kwargs", type=json.loads, default={},
+                        help='JSON keyword arguments for CSP.solve, e.g. \'{"variable_ordering": "dom/wdeg"}\'')
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced run for peak memory")
+    parser.add_argument("--instrument", action="store_true",
+                        help="add a profile of an extra run to every record (see instrumentation.py)")
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--save-baseline", help="also write the results to this file")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative time change reported as a regression or speedup")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    results = run_grid(GRIDS[args.grid], range(args.seeds), args.repeat, args.solve_kwargs,
+                       args.timeout, not args.no_memory, args.instrument)
+    report = {
+        "meta": {
+            "grid": args.grid,
+            "solve_kwargs": args.solve_kwargs,
+            "repeat": args.repeat,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        rows, regressions = compare(results, baseline, args.threshold)
+        print("\n=== Comparison with baseline ===")
+        print_comparison(rows)
+        print(f"{regressions} regression(s), {sum(1 for row in rows if row[4] == 'speedup')} speedup(s)")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
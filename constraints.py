@@ -1,10 +1,194 @@
+from encoding import FIELDS
+from resources import day_type, resource_keys
+
+TERM_ORDER = {"Completed": -1, "Term1": 0, "Term2": 1}
+
+PROFESSOR_AVAILABILITY = {
+    "Johnson": {
+        "Term1": ["10AM", "11AM"],
+        "Term2": ["9AM", "2PM"]
+    },
+    "Smith": {
+        "Term1": ["8AM", "9AM"],
+        "Term2": ["9AM", "10AM", "11AM"]
+    },
+    "Williams": {
+        "Term1": ["11AM", "1PM", "3PM"],
+        "Term2": ["11AM", "12PM", "2PM"]
+    },
+    "Brown": {
+        "Term1": ["8AM", "9AM", "10AM", "1PM"],
+        "Term2": ["10AM", "12PM", "2PM", "3PM"]
+    },
+    "Anderson": {
+        "Term1": ["8AM", "9AM", "10AM", "11AM", "1PM"],
+        "Term2": ["8AM", "9AM", "10AM", "11AM", "1PM"]
+    },
+    "Taylor": {
+        "Term1": ["9AM", "11AM", "1PM", "3PM"],
+        "Term2": ["10AM", "12PM", "2PM", "4PM"]
+    }
+}
+
+PROFESSOR_SPECIALTIES = {
+    "Johnson": ["PHYS", "CHEM"],
+    "Smith": ["MATH", "CMPUT"],
+    "Williams": ["CMPUT", "STAT"],
+    "Brown": ["ENGL", "HIST"],
+    "Anderson": ["PSYCO", "ECON"],
+    "Taylor": ["BIOL", "ANTHRO", "ENGL"]
+}
+
+def unary_constraint(func):
+    """
+    Declare that a constraint depends only on (var, value). The solver applies
+    such constraints once, before search, to shrink the domains.
+    """
+    func.unary = True
+    return func
+
+def explained_by(explain):
+    """
+    Attach an explanation to a constraint: a function with the constraint's
+    signature returning the assigned courses that make `value` fail. The solver
+    uses it to build conflict sets; without one, every assigned course is blamed.
+    """
+    def decorate(func):
+        func.explain = explain
+        return func
+    return decorate
+
+def reads_fields(*fields):
+    """
+    Declare the value fields (see encoding.FIELDS) a constraint function reads,
+    like Constraint.fields, so the solver can reuse its verdicts for values
+    that agree on them.
+    """
+    def decorate(func):
+        func.fields = fields
+        return func
+    return decorate
+
+class Constraint:
+    """
+    Declarative constraint.
+
+    scope:     "unary" (depends only on the course's own value), "binary" or
+               "global".
+    variables: the courses it constrains, or None for every course. The solver
+               only checks it when one of them is being assigned.
+    fields:    names of the value fields (see encoding.FIELDS) it reads. Values
+               of a course that agree on these fields get the same verdict, so
+               the solver checks each distinct combination once per node.
+
+    Calling an instance is the stateless check with the usual constraint
+    signature, so it can be used wherever a constraint function is expected.
+    The solver calls check() instead, which may use incremental state kept by
+    on_assign/on_unassign; reset() is called before each search.
+    """
+
+    scope = "global"
+    variables = None
+    fields = FIELDS
+
+    @property
+    def unary(self):
+        return self.scope == "unary"
+
+    def applies_to(self, var):
+        return self.variables is None or var in self.variables
+
+    def __call__(self, var, value, assignment, course_term=None, prerequisites=None):
+        raise NotImplementedError
+
+    def check(self, var, value, assignment, course_term=None, prerequisites=None):
+        return self(var, value, assignment, course_term, prerequisites)
+
+    def explain(self, var, value, assignment, course_term=None, prerequisites=None):
+        """Assigned courses that make `value` fail; by default all assigned courses in scope."""
+        return [course for course in assignment if course != var and self.applies_to(course)]
+
+    def groups(self, variables, domains):
+        """
+        Sets of `variables` whose values this constraint may relate, given their
+        encoded `domains` (an assigned course has only its value's bit). Courses
+        linked by no chain of groups can be searched independently (see
+        CSP.count_solutions). By default, all the courses in scope.
+        """
+        return [[var for var in variables if self.applies_to(var)]]
+
+    def signature(self):
+        """
+        Plain data describing what the verdicts depend on, for the fingerprint
+        of domaincache.DomainCache. By default the class, scope, courses and
+        fields; constraints holding tables add them.
+        """
+        return type(self).__module__, type(self).__qualname__, self.scope, self.variables, self.fields
+
+    def reset(self):
+        pass
+
+    def on_assign(self, var, value):
+        pass
+
+    def on_unassign(self, var, value):
+        pass
+
+class FunctionConstraint(Constraint):
+    """Adapter for a plain constraint function (or any callable with that signature)."""
+
+    def __init__(self, func):
+        self.func = func
+        self.scope = "unary" if getattr(func, "unary", False) else "global"
+        self.fields = getattr(func, "fields", FIELDS)
+
+    def __call__(self, var, value, assignment, course_term=None, prerequisites=None):
+        return self.func(var, value, assignment, course_term, prerequisites)
+
+    def signature(self):
+        return super().signature() + (self.func,)
+
+    def explain(self, var, value, assignment, course_term=None, prerequisites=None):
+        explain = getattr(self.func, "explain", None)
+        if explain is None:
+            return list(assignment)
+        return explain(var, value, assignment, course_term, prerequisites)
+
+class BinaryConstraint(Constraint):
+    """`relation(value_a, value_b)` must hold once both courses a and b are assigned."""
+
+    scope = "binary"
+
+    def __init__(self, a, b, relation, fields=FIELDS):
+        self.a = a
+        self.b = b
+        self.relation = relation
+        self.variables = (a, b)
+        self.fields = fields
+
+    def signature(self):
+        return super().signature() + (self.relation,)
+
+    def __call__(self, var, value, assignment, course_term=None, prerequisites=None):
+        if var == self.a and self.b in assignment:
+            return self.relation(value, assignment[self.b])
+        if var == self.b and self.a in assignment:
+            return self.relation(assignment[self.a], value)
+        return True
+
+def as_constraint(constraint):
+    """Return `constraint` as a Constraint object, wrapping plain functions."""
+    if isinstance(constraint, Constraint):
+        return constraint
+    return FunctionConstraint(constraint)
+
 def satisfies_prerequisites(course, assignment, course_term, prerequisites):
     """
     Recursively check prerequisites. If a prerequisite is scheduled but not yet assigned,
     we defer the check (assume it can be satisfied later).
     """
-    term_order = {"Completed": -1, "Term1": 0, "Term2": 1}
-    
+    term_order = TERM_ORDER
+
     if course in course_term and course_term[course] == "Completed":
         return True
     if course not in course_term:
@@ -48,7 +232,7 @@ def prerequisite_constraint_transitive(var, value, assignment, course_term, prer
     Check that the full chain of prerequisites for course `var` is satisfied.
     When a prerequisite is not yet assigned, the check is deferred.
     """
-    term_order = {"Completed": -1, "Term1": 0, "Term2": 1}
+    term_order = TERM_ORDER
     course_term_val = value[0]
     if var in course_term and course_term[var] == "Completed":
         return True
@@ -91,63 +275,231 @@ def prerequisite_constraint_transitive(var, value, assignment, course_term, prer
 def generic_constraint(var, value, assignment, course_term, prerequisites):
     return prerequisite_constraint_transitive(var, value, assignment, course_term, prerequisites)
 
+class PrerequisiteIndex(Constraint):
+    """
+    Prerequisite DAG compiled once for a given course_term/prerequisites pair.
+
+    Every requirement is stored as a tuple of alternatives (a plain prerequisite
+    is a 1-tuple), together with the reverse index of dependents. Instances are
+    used as a constraint with the usual signature: assigning `var` checks only
+    its direct requirements and the assigned courses that directly require it,
+    so every prerequisite edge between assigned courses holds at all times and
+    the whole chain holds by induction, with no recursion during search.
+    Completed, unscheduled and not yet assigned prerequisites are treated as in
+    prerequisite_constraint_transitive, which remains the reference check.
+
+    Building the index computes a topological order and, per course, the
+    earliest and latest term index its chain allows. A cycle or a chain that
+    cannot fit the terms raises ValueError here rather than during search.
+
+    As a Constraint it only involves courses on a prerequisite edge and only
+    reads the term of a value.
+    """
+
+    fields = ("term",)
+
+    def __init__(self, course_term, prerequisites, term_order=TERM_ORDER):
+        self.course_term = course_term
+        self.term_order = term_order
+        self.requirements = {}
+        self.dependents = {}
+        for course, reqs in prerequisites.items():
+            groups = []
+            for req in reqs:
+                group = tuple(req) if isinstance(req, (list, tuple)) else (req,)
+                groups.append(group)
+                for alt in group:
+                    self.dependents.setdefault(alt, []).append((course, group))
+            self.requirements[course] = groups
+        self.variables = set(self.requirements) | set(self.dependents)
+        self.order = self._topological_order()
+        self.earliest, self.latest = self._term_bounds()
+
+    def signature(self):
+        return super().signature() + (self.course_term, self.requirements, self.term_order)
+
+    def _topological_order(self):
+        order = []
+        state = {}  # course -> 1 while on the DFS stack, 2 once finished
+        for root in self.requirements:
+            if root in state:
+                continue
+            state[root] = 1
+            stack = [(root, iter(self._prerequisites_of(root)))]
+            while stack:
+                course, children = stack[-1]
+                child = next(children, None)
+                if child is None:
+                    stack.pop()
+                    state[course] = 2
+                    order.append(course)
+                elif state.get(child) == 1:
+                    path = [c for c, _ in stack]
+                    cycle = path[path.index(child):] + [child]
+                    raise ValueError("Prerequisite cycle: " + " -> ".join(cycle))
+                elif child not in state:
+                    state[child] = 1
+                    stack.append((child, iter(self._prerequisites_of(child))))
+        return order
+
+    def _prerequisites_of(self, course):
+        return [alt for group in self.requirements.get(course, ()) for alt in group]
+
+    def _is_open(self, course):
+        """A course with no term to check: completed or not scheduled at all."""
+        term = self.course_term.get(course)
+        return term is None or term == "Completed"
+
+    def _term_bounds(self):
+        last = max(self.term_order.values())
+        earliest, latest = {}, {}
+        for course in self.course_term:
+            if self._is_open(course):
+                continue
+            fixed = self.term_order.get(self.course_term[course])
+            earliest[course] = fixed if fixed is not None else 0
+            latest[course] = fixed if fixed is not None else last
+
+        # Prerequisites come before their dependents in self.order.
+        for course in self.order:
+            if course not in earliest:
+                continue
+            for group in self.requirements.get(course, ()):
+                if any(self._is_open(alt) for alt in group):
+                    continue
+                earliest[course] = max(earliest[course], min(earliest[alt] + 1 for alt in group))
+        for course in reversed(self.order):
+            if course not in latest:
+                continue
+            for group in self.requirements.get(course, ()):
+                if len(group) == 1 and group[0] in latest:
+                    latest[group[0]] = min(latest[group[0]], latest[course] - 1)
+
+        for course in earliest:
+            if earliest[course] > latest[course]:
+                raise ValueError(
+                    f"Prerequisite chain for {course} cannot be scheduled: needs a term index "
+                    f">= {earliest[course]} and <= {latest[course]}")
+        return earliest, latest
+
+    def _group_satisfied(self, group, term, assignment, var, var_term):
+        for alt in group:
+            if self._is_open(alt):
+                return True
+            if alt == var:
+                alt_term = var_term
+            elif alt in assignment:
+                alt_term = self.term_order[assignment[alt][0]]
+            else:
+                return True  # deferred until the prerequisite is assigned
+            if alt_term < term:
+                return True
+        return False
+
+    def __call__(self, var, value, assignment, course_term=None, prerequisites=None):
+        if self.course_term.get(var) == "Completed":
+            return True
+        term = self.term_order[value[0]]
+        for group in self.requirements.get(var, ()):
+            if not self._group_satisfied(group, term, assignment, var, term):
+                return False
+        for dependent, group in self.dependents.get(var, ()):
+            if dependent in assignment and not self._is_open(dependent):
+                dependent_term = self.term_order[assignment[dependent][0]]
+                if not self._group_satisfied(group, dependent_term, assignment, var, term):
+                    return False
+        return True
+
+    def explain(self, var, value, assignment, course_term=None, prerequisites=None):
+        """Assigned courses on the requirement edges of var that `value` violates."""
+        term = self.term_order[value[0]]
+        culprits = []
+        for group in self.requirements.get(var, ()):
+            if not self._group_satisfied(group, term, assignment, var, term):
+                culprits.extend(alt for alt in group if alt in assignment)
+        for dependent, group in self.dependents.get(var, ()):
+            if dependent in assignment and not self._is_open(dependent):
+                dependent_term = self.term_order[assignment[dependent][0]]
+                if not self._group_satisfied(group, dependent_term, assignment, var, term):
+                    culprits.append(dependent)
+                    culprits.extend(alt for alt in group if alt != var and alt in assignment)
+        return culprits
+
+    def groups(self, variables, domains):
+        """Each course together with the alternatives of one of its requirements."""
+        present = set(variables)
+        return [[var for var in (course,) + group if var in present]
+                for course, groups in self.requirements.items() if course in present for group in groups]
+
+    @unary_constraint
+    @reads_fields("term")
+    def within_term_bounds(self, var, value, assignment, course_term=None, prerequisites=None):
+        """Unary part: the term of `value` must lie within the bounds of the prerequisite chain."""
+        if var not in self.earliest:
+            return True
+        term = self.term_order.get(value[0])
+        return term is None or self.earliest[var] <= term <= self.latest[var]
+
+@unary_constraint
+@reads_fields("term", "time_label", "professor")
 def professor_availability_constraint(var, value, assignment, course_term, prerequisites):
     term, slot, time_label, building, room, professor = value
-    availability = {
-        "Johnson": {
-            "Term1": ["10AM", "11AM"],
-            "Term2": ["9AM", "2PM"]
-        },
-        "Smith": {
-            "Term1": ["8AM", "9AM"],
-            "Term2": ["9AM", "10AM", "11AM"]
-        },
-        "Williams": {
-            "Term1": ["11AM", "1PM", "3PM"],
-            "Term2": ["11AM", "12PM", "2PM"]
-        },
-        "Brown": {
-            "Term1": ["8AM", "9AM", "10AM", "1PM"],
-            "Term2": ["10AM", "12PM", "2PM", "3PM"]
-        },
-        "Anderson": {
-            "Term1": ["8AM", "9AM", "10AM", "11AM", "1PM"],
-            "Term2": ["8AM", "9AM", "10AM", "11AM", "1PM"]
-        },
-        "Taylor": {
-            "Term1": ["9AM", "11AM", "1PM", "3PM"],
-            "Term2": ["10AM", "12PM", "2PM", "4PM"]
-        }
-    }
-    
-    if professor in availability and term in availability[professor]:
-        return time_label in availability[professor][term]
+    if professor in PROFESSOR_AVAILABILITY and term in PROFESSOR_AVAILABILITY[professor]:
+        return time_label in PROFESSOR_AVAILABILITY[professor][term]
     return True
 
+@unary_constraint
+@reads_fields("professor")
 def professor_specialty_constraint(var, value, assignment, course_term, prerequisites):
-    professor_specialties = {
-        "Johnson": ["PHYS", "CHEM"],
-        "Smith": ["MATH", "CMPUT"],
-        "Williams": ["CMPUT", "STAT"],
-        "Brown": ["ENGL", "HIST"],
-        "Anderson": ["PSYCO", "ECON"],
-        "Taylor": ["BIOL", "ANTHRO", "ENGL"]
-    }
     _, _, _, _, _, professor = value
-    allowed_prefixes = professor_specialties.get(professor, [])
+    allowed_prefixes = PROFESSOR_SPECIALTIES.get(professor, [])
     if not allowed_prefixes:
         return True
     return any(var.startswith(prefix) for prefix in allowed_prefixes)
 
-def room_capacity_constraint(var, value, assignment, course_term, prerequisites):
-    def day_type(slot):
-        if slot.startswith("MWF"):
-            return "MWF"
-        elif slot.startswith("TTH"):
-            return "TTH"
-        else:
-            return None
+class ProfessorAvailability(Constraint):
+    """
+    professor_availability_constraint for a given table of professor ->
+    term -> available time labels, e.g. one read by loader.load_instance.
+    """
+
+    scope = "unary"
+    fields = ("term", "time_label", "professor")
+
+    def __init__(self, availability=PROFESSOR_AVAILABILITY):
+        self.availability = availability
+
+    def signature(self):
+        return super().signature() + (self.availability,)
+
+    def __call__(self, var, value, assignment, course_term=None, prerequisites=None):
+        term, slot, time_label, building, room, professor = value
+        if professor in self.availability and term in self.availability[professor]:
+            return time_label in self.availability[professor][term]
+        return True
+
+class ProfessorSpecialty(Constraint):
+    """
+    professor_specialty_constraint for a given table of professor -> course
+    code prefixes they can teach.
+    """
+
+    scope = "unary"
+    fields = ("professor",)
 
+    def __init__(self, specialties=PROFESSOR_SPECIALTIES):
+        self.specialties = specialties
+
+    def signature(self):
+        return super().signature() + (self.specialties,)
+
+    def __call__(self, var, value, assignment, course_term=None, prerequisites=None):
+        allowed_prefixes = self.specialties.get(value[5], [])
+        if not allowed_prefixes:
+            return True
+        return any(var.startswith(prefix) for prefix in allowed_prefixes)
+
+def room_capacity_constraint(var, value, assignment, course_term, prerequisites):
     capacity_tracker = {}
     temp_assignment = assignment.copy()
     temp_assignment[var] = value
@@ -170,5 +522,40 @@ def room_diversity_constraint(var, value, assignment, course_term, prerequisites
             room_count += 1
     return room_count < 2
 
+def _same_room_courses(index):
+    def explain(var, value, assignment, course_term, prerequisites):
+        key = resource_keys(value)[index]
+        return [course for course, other in assignment.items()
+                if course != var and resource_keys(other)[index] == key]
+    return explain
+
+@explained_by(_same_room_courses(0))
+def room_capacity_constraint_incremental(var, value, assignment, course_term, prerequisites):
+    """
+    At most 2 courses per (term, building, room, day type), read from the
+    occupancy counters of a TrackedAssignment in O(1).
+    """
+    counters = getattr(assignment, "room_day_usage", None)
+    if counters is None:
+        return room_capacity_constraint(var, value, assignment, course_term, prerequisites)
+    key = resource_keys(value)[0]
+    count = counters[key]
+    if var in assignment and resource_keys(assignment[var])[0] == key:
+        count -= 1  # var is being reassigned within the same room
+    return count + 1 <= 2
+
+@explained_by(_same_room_courses(1))
+def room_diversity_constraint_incremental(var, value, assignment, course_term, prerequisites):
+    """
+    Fewer than 2 assigned courses in the same (term, building, room), read from
+    the occupancy counters of a TrackedAssignment in O(1).
+    """
+    counters = getattr(assignment, "room_term_usage", None)
+    if counters is None:
+        return room_diversity_constraint(var, value, assignment, course_term, prerequisites)
+    return counters[resource_keys(value)[1]] < 2
+
+@unary_constraint
+@reads_fields()
 def required_courses_constraint(var, value, assignment, course_term, prerequisites):
     return True
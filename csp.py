@@ -1,8 +1,59 @@
+import asyncio
 from collections import deque
+from contextlib import nullcontext
+import functools
+import logging
+import random
+import threading
 import time
 
+from constraints import FunctionConstraint, as_constraint
+from domaincache import fingerprint
+from encoding import FIELDS, DomainEncoding, iter_bits
+from heuristics import SlotSupport, VariableQueue, restart_cutoffs
+from instrumentation import Instrumentation
+from localsearch import MinConflicts
+from nogoods import NoGoodStore
+from optimization import BranchAndBound
+from resources import TrackedAssignment
+from symmetry import RoomSymmetry
+
+logger = logging.getLogger(__name__)
+
+class _Frame:
+    """
+    An open node of CSP.backtrack: its variable, the values left to try and its
+    conflict set so far. CSP.count_solutions uses the same frames for the
+    components it branches on.
+    """
+
+    __slots__ = ("var", "values", "index", "conflict", "verdicts", "rest", "domains", "value", "gain", "mark",
+                 "parts", "product", "total", "key")
+
+    def __init__(self, var, values, conflict, rest, domains):
+        self.var = var
+        self.values = values
+        self.index = 0
+        self.conflict = conflict
+        self.verdicts = {}
+        # optimize mode: bound on the score of the other unassigned courses;
+        # counting: the other courses of the component
+        self.rest = rest
+        self.domains = domains
+        self.value = None  # the value whose subtree is being searched
+        self.gain = 0
+        self.mark = None
+        # counting: components left below `value` (last first), the product
+        # of the counts of the others, the sum over the values done, cache key
+        self.parts = []
+        self.product = 1
+        self.total = 0
+        self.key = None
+
+
 class CSP:
-    def __init__(self, variables, domains, neighbors, constraints=None, prerequisites=None, course_term=None, preferences=None):
+    def __init__(self, variables, domains, neighbors, constraints=None, prerequisites=None, course_term=None, preferences=None,
+                 encoding=None):
         """
         variables: list of course codes.
         domains: dict mapping each variable to a list of possible assignments.
@@ -10,10 +61,25 @@ class CSP:
                    (term, slot, time_label, building, room, professor)
         neighbors: dict mapping each variable to a list of other variables that may conflict.
         constraints: dict mapping a constraint name to a function of 
-                     (var, value, assignment, course_term, prerequisites).
+                     (var, value, assignment, course_term, prerequisites), or to a
+                     constraints.Constraint object declaring its scope, courses and
+                     fields; functions are adapted with constraints.FunctionConstraint.
+                     Functions marked with constraints.unary_constraint (or added with
+                     add_unary_constraint) depend only on (var, value); solve() applies
+                     them once before search instead of at every node. Constraint
+                     objects with a propagate() method (see propagators.py) also
+                     filter the domains of their whole scope after every assignment.
         prerequisites: dict mapping courses to their direct prerequisites.
         course_term: dict mapping each course to its fixed term ("Term1", "Term2", or "Completed")
-        preferences: dict mapping preference name to a function that scores assignments
+        preferences: dict mapping preference name to a function that scores assignments.
+                     Functions marked with preferences.static_preference are scored
+                     once per value before search.
+        encoding: a DomainEncoding shared with other CSPs over the same values
+                  (see batch.Catalog); a new one by default.
+
+        Internally every value is encoded as an integer id (see encoding.py) and
+        each domain is kept as a bitset of ids in `self.masks`. Constraint and
+        preference functions still receive the decoded tuples.
         """
         self.variables = variables
         self.domains = domains
@@ -22,162 +88,1129 @@ class CSP:
         self.prerequisites = prerequisites if prerequisites is not None else {}
         self.course_term = course_term
         self.preferences = preferences if preferences is not None else {}
-        self.no_goods = set()  # record failed partial assignments
+        self.unary_constraints = {name: c for name, c in self.constraints.items() if getattr(c, "unary", False)}
+        self._checked_constraints = None  # (name, Constraint, field indices) re-checked during search
+        self._woken = None  # var -> the entries of _checked_constraints that involve it
+        self.nogoods = None  # NoGoodStore of learned no-goods, set up by solve()
+        self._propagators = []  # global constraints with propagate(), set up by preprocess
+
+        self.encoding = encoding if encoding is not None else DomainEncoding()
+        self.masks = {var: self.encoding.encode_domain(domains[var]) for var in domains}
+        # Decoded view of the current assignment for constraint and preference
+        # functions; it also keeps the room occupancy counters (see resources.py).
+        self._decoded = TrackedAssignment()
+        self._trail = None  # undo log of (var, previous mask) when searching in trail mode
+        self._pruners = None  # var -> reasons (tuples of assigned vars) of its prunings on the trail
+        self._depth = {}  # var -> number of variables assigned before it
+        self._failure = set()  # explanation (set of assigned vars) of the last failure
+        self._variable_queue = None  # incremental MRV queue, only used in trail mode
+        self._watchers = []  # trail-mode structures told about every domain change
+        self._slot_support = None  # per-(term, slot) neighbor support counts, only used in trail mode
+        self._static_scores = {}  # var -> {value id: summed static preference score}
+        self._optimizer = None  # BranchAndBound state in optimize mode
+        self._cancel_event = None  # object with is_set(), polled at every search node
+        self._stopped = False
+        self._stop_reason = None  # "cancelled", "time_limit" or "node_limit" once stopped
+        self._deadline = None  # time.monotonic() after which the search stops
+        self._node_limit = None  # node count at which the search stops
+        self._deepest = {}  # largest consistent partial assignment of the current search
+        self._backjumping = True
+        self._restart_limit = None  # backtrack count at which the current run restarts
+        self._restarting = False
+        self._tie_rank = None  # var -> random tie-breaking rank, set by solve() when seeded
+        self.instrumentation = None  # Instrumentation profiling the current solve, if any
+        self.domain_cache = None  # DomainCache of preprocessed domains (see domaincache.py), if any
 
         # Performance metrics.
         self.backtracks = 0
         self.consistency_checks = 0
         self.forward_check_calls = 0
+        self.nodes = 0
+        self.backjumps = 0
+        self.restarts = 0
 
     def is_consistent(self, var, value, assignment):
+        return self.explain_inconsistency(var, value, assignment) is None
+
+    def explain_inconsistency(self, var, value, assignment, verdicts=None):
+        """
+        Return None if encoded `value` is consistent for var, otherwise the set of
+        assigned variables whose values rule it out. `assignment` maps variables
+        to encoded ids. Constraint functions without an `explain` function blame
+        every assigned variable.
+
+        verdicts: optional dict kept for one search node; the outcome of a
+                  constraint that reads only some value fields is stored there
+                  and reused for other values agreeing on those fields.
+        """
         self.consistency_checks += 1
-        term, slot, time_label, building, room, professor = value
+        inst = self.instrumentation
+        if self.nogoods is not None and self.nogoods.is_banned(var, value):
+            if inst is not None:
+                inst.reject("nogood")
+            return set()
+        ts = self.encoding.ts
 
         # Check all already-assigned neighbors (enforcing an all-different on slots within the term)
         for neighbor in self.neighbors.get(var, []):
-            if neighbor in assignment:
-                n_term, n_slot, n_time, n_building, n_room, n_professor = assignment[neighbor]
-                if term == n_term and slot == n_slot:
-                    return False
+            if neighbor in assignment and ts[assignment[neighbor]] == ts[value]:
+                if inst is not None:
+                    inst.reject("slot_neighbors")
+                return {neighbor}
 
-        # Check custom constraints.
-        for cname, constraint in self.constraints.items():
-            if not constraint(var, value, assignment, self.course_term, self.prerequisites):
-                return False
-        return True
+        # Check the custom constraints that involve var.
+        if self._woken is not None:
+            constraints = self._woken.get(var, ())
+        else:
+            constraints = [(name, FunctionConstraint(c), None) for name, c in self.constraints.items()]
+        codes = self.encoding.codes
+        decoded = self.encoding.values[value]
+        for cname, constraint, fields in constraints:
+            key = None
+            if verdicts is not None and fields is not None:
+                key = (cname, tuple(codes[field][value] for field in fields))
+                if key in verdicts:
+                    if verdicts[key] is None:
+                        continue
+                    return verdicts[key]
+            culprits = None
+            if inst is None:
+                ok = constraint.check(var, decoded, self._decoded, self.course_term, self.prerequisites)
+            else:
+                ok = inst.check(cname, constraint.check, var, decoded, self._decoded, self.course_term,
+                                self.prerequisites)
+            if not ok:
+                culprits = constraint.explain(var, decoded, self._decoded, self.course_term, self.prerequisites)
+                culprits = {culprit for culprit in culprits if culprit in assignment}
+            if key is not None:
+                verdicts[key] = culprits
+            if culprits is not None:
+                return culprits
+        return None
+
+    def add_unary_constraint(self, name, constraint):
+        """Register a constraint that depends only on (var, value)."""
+        self.constraints[name] = constraint
+        self.unary_constraints[name] = constraint
 
-    def select_unassigned_variable(self, assignment):
+    def node_consistency(self, domains, variables=None):
+        """
+        Apply every unary constraint once to shrink `domains` in place (only the
+        domains of `variables`, if given). After this, is_consistent only
+        re-checks constraints that read the assignment. Returns False if a
+        domain becomes empty.
+
+        A constraint that reads only some value fields (Constraint.fields) is
+        called once per course for each combination of those fields in its
+        domain, and its verdict applies to all the values sharing it.
+        """
+        unary = []
+        for c in self.unary_constraints.values():
+            fields = as_constraint(c).fields
+            unary.append((c, tuple(FIELDS.index(field) for field in fields) if set(fields) != set(FIELDS) else None))
+        self._compile_constraints()
+        if not unary:
+            return True
+        values = self.encoding.values
+        partitions = {}  # (fields, domain) -> its values split by those fields; courses often share domains
+        consistent = True
+        for var in (self.variables if variables is None else variables):
+            removed = 0
+            for c, fields in unary:
+                live = domains[var] & ~removed
+                if fields is None:
+                    parts = (1 << value for value in iter_bits(live))
+                else:
+                    parts = partitions.get((fields, live))
+                    if parts is None:
+                        parts = [live]
+                        for field in fields:
+                            parts = [part & mask for part in parts for mask in self.encoding.label_masks(field)
+                                     if part & mask]
+                        partitions[fields, live] = parts
+                for part in parts:
+                    if not c(var, values[(part & -part).bit_length() - 1], {}, self.course_term,
+                             self.prerequisites):
+                        removed |= part
+            if removed:
+                domains[var] &= ~removed
+                logger.debug("Node consistency: For %s, removed %d values; new domain size: %d",
+                             var, removed.bit_count(), domains[var].bit_count())
+            if not domains[var]:
+                logger.info("Node consistency: Domain for %s is empty. Inconsistency detected.", var)
+                consistent = False
+        return consistent
+
+    def _compile_constraints(self):
+        """Adapt the non-unary constraints to Constraint objects and index them by course."""
+        self._checked_constraints = []
+        for name, c in self.constraints.items():
+            if name in self.unary_constraints:
+                continue
+            constraint = as_constraint(c)
+            fields = None
+            if set(constraint.fields) != set(FIELDS):
+                fields = tuple(FIELDS.index(field) for field in constraint.fields)
+            self._checked_constraints.append((name, constraint, fields))
+        self._woken = {var: [entry for entry in self._checked_constraints if entry[1].applies_to(var)]
+                       for var in self.variables}
+
+    def select_unassigned_variable(self, assignment, domains=None):
+        if self._variable_queue is not None:
+            return self._variable_queue.pop()
+        if domains is None:
+            domains = self.masks
         unassigned = [v for v in self.variables if v not in assignment]
-        # MRV heuristic; tie-breaker uses the degree heuristic.
+        rank = self._tie_rank
+        # MRV heuristic on the live domains; tie-breaker uses the degree heuristic,
+        # then the random rank when the search is seeded.
         return min(unassigned,
-                   key=lambda var: (len(self.domains[var]),
-                                    -len([n for n in self.neighbors.get(var, []) if n not in assignment])))
+                   key=lambda var: (domains[var].bit_count(),
+                                    -len([n for n in self.neighbors.get(var, []) if n not in assignment]),
+                                    rank[var] if rank is not None else 0))
 
     def order_domain_values(self, var, assignment, domains):
+        ts = self.encoding.ts
+        ts_masks = self.encoding.ts_masks
+        values = self.encoding.values
+        static_scores = self._static_scores.get(var)
+        if static_scores is None:
+            static_scores = self._score_static_preferences(var, domains[var])
+        dynamic = list(self._dynamic_preferences().values())
+        support = self._slot_support
+        neighbors = self.neighbors.get(var, [])
+
         def calculate_value_score(value):
-            term, slot, time_label, building, room, professor = value
-            conflict_count = 0
-            for neighbor in self.neighbors.get(var, []):
-                for neighbor_val in domains[neighbor]:
-                    if term == neighbor_val[0] and slot == neighbor_val[1]:
-                        conflict_count += 1
-
-            preference_score = 0
-            for pref_name, pref_func in self.preferences.items():
-                preference_score += pref_func(var, value, assignment)
-            
+            if support is not None:
+                conflict_count = support.conflicts(var, ts[value])
+            else:
+                ts_mask = ts_masks[ts[value]]
+                conflict_count = 0
+                for neighbor in neighbors:
+                    conflict_count += (domains[neighbor] & ts_mask).bit_count()
+
+            preference_score = static_scores[value]
+            for pref_func in dynamic:
+                preference_score += pref_func(var, values[value], self._decoded)
+
             # A higher score is better, so subtract conflicts.
             return preference_score - conflict_count
 
-        return sorted(domains[var], key=lambda val: calculate_value_score(val), reverse=True)
+        return sorted(iter_bits(domains[var]), key=lambda val: calculate_value_score(val), reverse=True)
+
+    def _dynamic_preferences(self):
+        return {name: pref_func for name, pref_func in self.preferences.items()
+                if not getattr(pref_func, "static", False)}
+
+    def value_score(self, var, value):
+        """Preference score of assigning encoded `value` to var given the current assignment."""
+        score = self._static_scores[var][value]
+        decoded = self.encoding.values[value]
+        for pref_func in self._dynamic_preferences().values():
+            score += pref_func(var, decoded, self._decoded)
+        return score
+
+    def _score_static_preferences(self, var, mask):
+        static = [pref_func for pref_func in self.preferences.values() if getattr(pref_func, "static", False)]
+        values = self.encoding.values
+        return {value: sum(pref_func(var, values[value], {}) for pref_func in static)
+                for value in iter_bits(mask)}
 
     def forward_checking(self, var, value, assignment, local_domains):
         self.forward_check_calls += 1
-        term, slot, time_label, building, room, professor = value
+        # Conflict: same term and same slot.
+        ts_mask = self.encoding.ts_masks[self.encoding.ts[value]]
+        reason = (var,)
 
         for neighbor in self.neighbors.get(var, []):
             if neighbor not in assignment:
-                new_domain = []
-                for val in local_domains[neighbor]:
-                    n_term, n_slot, n_time, n_building, n_room, n_professor = val
-                    if term == n_term and slot == n_slot:
-                        continue  # Conflict: same term and same slot
-                    new_domain.append(val)
-                local_domains[neighbor] = new_domain
+                self.prune(local_domains, neighbor, ts_mask, reason)
                 if not local_domains[neighbor]:
+                    if self._variable_queue is not None:
+                        self._variable_queue.bump(var, neighbor)
+                    self._failure = self.pruned_by(neighbor, assignment)
                     return False
         return True
 
-    def revise(self, domains, xi, xj):
-        revised = False
-        to_remove = []
-        # Enforce two conditions:
-        # 1. If values share the same term, they cannot have the same slot.
-        # 2. Lexicographic ordering: if xi < xj and same term, then slot number for xi must be less than xj.
-        for x in domains[xi]:
-            def compatible(x, y):
-                if x[0] == y[0] and x[1] == y[1]:
+    def propagate_nogoods(self, var, value, assignment, domains):
+        """
+        Visit the no-goods watching the literal (var, value) that just became
+        true. A no-good left with a single literal that is not true prunes that
+        literal's value; one with every literal true is a conflict.
+        """
+        store = self.nogoods
+        literal = (var, value)
+        for nogood_id in store.watching(literal):
+            store.checks += 1
+            literals = store.nogoods[nogood_id]
+            first, second = store.watched[nogood_id]
+            other = second if first == literal else first
+            replacement = None
+            for candidate in literals:
+                if candidate != literal and candidate != other and assignment.get(candidate[0]) != candidate[1]:
+                    replacement = candidate
+                    break
+            if replacement is not None:
+                store.move_watch(nogood_id, literal, replacement)
+                continue
+            other_var, other_value = other
+            if other_var in assignment:
+                if assignment[other_var] == other_value:
+                    self._failure = {v for v, _ in literals}
+                    return False
+                continue
+            if domains[other_var] >> other_value & 1:
+                store.prunings += 1
+                store.touch(nogood_id)
+                self.prune(domains, other_var, 1 << other_value,
+                           tuple(v for v, _ in literals if v != other_var))
+                if not domains[other_var]:
+                    self._failure = self.pruned_by(other_var, assignment)
                     return False
-                if xi < xj and x[0] == y[0]:
-                    try:
-                        x_slot = int(x[1][3:])
-                        y_slot = int(y[1][3:])
-                    except Exception:
-                        return True
-                    if not (x_slot < y_slot):
-                        return False
-                return True
-            if not any(compatible(x, y) for y in domains[xj]):
-                to_remove.append(x)
-                revised = True
-        for x in to_remove:
-            domains[xi].remove(x)
-        if revised:
-            print(f"Revise: For {xi}, removed {len(to_remove)} values; new domain size: {len(domains[xi])}")
-        return revised
-
-    def ac3(self, domains):
+        return True
+
+    def propagate(self, var, value, assignment, domains):
+        """Forward checking, then no-good and global constraint propagation, after var = value."""
+        return (self.forward_checking(var, value, assignment, domains)
+                and (self.nogoods is None or self.propagate_nogoods(var, value, assignment, domains))
+                and self.propagate_globals(var, assignment, domains))
+
+    def propagate_globals(self, var, assignment, domains):
+        """Run the global constraint propagators after `var` was assigned (None at the root)."""
+        for propagator in self._propagators:
+            if not propagator.propagate(self, domains, assignment, var):
+                return False
+        return True
+
+    def prune(self, domains, var, removed, reason=None):
+        """
+        Remove the values in bitset `removed` from domains[var], recording the
+        change on the trail. `reason` names the assigned variables that caused it.
+        """
+        old = domains[var]
+        new = old & ~removed
+        if new != old:
+            if self._trail is not None:
+                self._trail.append((var, old))
+                self._pruners[var].append(reason)
+            domains[var] = new
+            if self.instrumentation is not None:
+                self.instrumentation.values_pruned += (old & removed).bit_count()
+            for watcher in self._watchers:
+                watcher.domain_changed(var, old, new)
+
+    def pruned_by(self, var, assignment):
+        """Assigned variables responsible for the values missing from var's domain."""
+        if self._pruners is None:
+            return set(assignment)
+        culprits = set()
+        for reason in self._pruners[var]:
+            if reason is None:
+                return set(assignment)
+            culprits.update(reason)
+        return culprits
+
+    def undo(self, domains, mark):
+        """Restore every domain pruned since the trail had length `mark`."""
+        trail = self._trail
+        while len(trail) > mark:
+            var, old = trail.pop()
+            self._pruners[var].pop()
+            current = domains[var]
+            domains[var] = old
+            for watcher in self._watchers:
+                watcher.domain_changed(var, current, old)
+
+    def assign(self, var, value, assignment):
+        self._depth[var] = len(assignment)
+        assignment[var] = value
+        decoded = self.encoding.values[value]
+        self._decoded[var] = decoded
+        if self._woken is not None:
+            for _, constraint, _ in self._woken.get(var, ()):
+                constraint.on_assign(var, decoded)
+        if self._variable_queue is not None:
+            self._variable_queue.assigned(var)
+
+    def unassign(self, var, assignment):
+        del assignment[var]
+        decoded = self._decoded.pop(var)
+        if self._woken is not None:
+            for _, constraint, _ in self._woken.get(var, ()):
+                constraint.on_unassign(var, decoded)
+        if self._variable_queue is not None:
+            self._variable_queue.unassigned(var)
+
+    def learn(self, conflict, assignment):
+        """Store the assignments of a failed node's conflict set as a no-good."""
+        culprits = sorted(conflict, key=lambda v: self._depth[v], reverse=True)
+        self.nogoods.add([(v, assignment[v]) for v in culprits])
+
+    def revise(self, domains, xi, xj):
+        """
+        Make xi arc consistent with xj under the relation "values in the same
+        term cannot share a slot". A value of xi is supported by any value of xj
+        with a different (term, slot) key, so xi can only lose values when every
+        value left in xj has one and the same key; then exactly the values of xi
+        with that key go. This needs a few bitset operations instead of a scan
+        over both domains.
+        """
+        di, dj = domains[xi], domains[xj]
+        if dj:
+            ts_mask = self.encoding.ts_masks[self.encoding.ts[(dj & -dj).bit_length() - 1]]
+            if dj & ~ts_mask:
+                return False
+            removed = di & ts_mask
+        else:
+            removed = di
+        if not removed:
+            return False
+        domains[xi] = di & ~removed
+        logger.debug("Revise: For %s, removed %d values; new domain size: %d",
+                     xi, removed.bit_count(), domains[xi].bit_count())
+        return True
+
+    def ac3(self, domains, on_revise=None):
+        """
+        on_revise: optional callback (xi, xj, old_size, new_size) run after each
+                   revision that removed values.
+        """
         queue = deque([(xi, xj) for xi in self.variables for xj in self.neighbors.get(xi, [])])
-        print("AC3: Initial queue size:", len(queue))
+        queued = set(queue)
+        logger.info("AC3: Initial queue size: %d", len(queue))
+        revisions = 0
         while queue:
-            xi, xj = queue.popleft()
-            old_size = len(domains[xi])
+            arc = queue.popleft()
+            queued.discard(arc)
+            xi, xj = arc
+            old_size = domains[xi].bit_count()
             if self.revise(domains, xi, xj):
-                new_size = len(domains[xi])
-                print(f"AC3: Revised {xi} due to {xj} (domain size {old_size} -> {new_size})")
+                revisions += 1
+                new_size = domains[xi].bit_count()
+                logger.debug("AC3: Revised %s due to %s (domain size %d -> %d)", xi, xj, old_size, new_size)
+                if on_revise is not None:
+                    on_revise(xi, xj, old_size, new_size)
                 if new_size == 0:
-                    print(f"AC3: Domain for {xi} is empty. Inconsistency detected.")
+                    logger.info("AC3: Domain for %s is empty. Inconsistency detected.", xi)
                     return False
                 for xk in self.neighbors.get(xi, []):
-                    if xk != xj:
+                    if xk != xj and (xk, xi) not in queued:
                         queue.append((xk, xi))
+                        queued.add((xk, xi))
+        logger.info("AC3: %d revisions", revisions)
         return True
 
     def backtrack(self, assignment, domains):
-        if len(assignment) == len(self.variables):
-            return assignment
-        key = frozenset(assignment.items())
-        if key in self.no_goods:
-            return None
-        var = self.select_unassigned_variable(assignment)
-        for value in self.order_domain_values(var, assignment, domains):
-            if self.is_consistent(var, value, assignment):
-                local_domains = {v: list(domains[v]) for v in domains}
-                assignment[var] = value
-                if self.forward_checking(var, value, assignment, local_domains):
-                    result = self.backtrack(assignment, local_domains)
-                    if result is not None:
-                        return result
-                del assignment[var]
+        """
+        In trail mode `domains` is pruned in place and restored from the trail on
+        backtrack; otherwise every candidate value works on a copy of `domains`.
+        In optimize mode complete assignments are recorded as incumbents and the
+        search goes on until the bounds prove none is better (or time runs out).
+
+        On failure, self._failure holds the node's conflict set: the assigned
+        variables that explain why no value of the selected variable worked.
+        With no-good learning on, it is stored as a no-good. With backjumping
+        on, a node whose variable is not in a failed child's conflict set
+        returns at once: its other values would fail for the same reason.
+
+        The search keeps its open nodes on an explicit stack of _Frame objects
+        instead of recursing, so its depth is not bounded by Python's
+        recursion limit.
+        """
+        optimizer = self._optimizer
+        inst = self.instrumentation
+        stack = []
+        entering = True
+        while True:
+            if entering:
+                # A new node over `domains`; if it fails at once, self._failure
+                # is handed to the frame above it.
+                entering = False
+                self.nodes += 1
+                if inst is not None:
+                    inst.node(len(assignment))
+                if len(assignment) > len(self._deepest):
+                    self._deepest = dict(assignment)
+                if self.should_stop():
+                    self._failure = set(assignment)
+                elif len(assignment) == len(self.variables):
+                    if optimizer is None:
+                        return assignment
+                    optimizer.record(self.encoding.decode_assignment(assignment))
+                    self._failure = set(assignment)
+                else:
+                    if inst is None:
+                        var = self.select_unassigned_variable(assignment, domains)
+                        values = self.order_domain_values(var, assignment, domains)
+                    else:
+                        var = inst.timed("variable_selection", self.select_unassigned_variable, assignment, domains)
+                        values = inst.timed("value_ordering", self.order_domain_values, var, assignment, domains)
+                    rest = None
+                    if optimizer is not None:
+                        rest = optimizer.remaining_bound(self.variables, assignment, domains, skip=var)
+                    stack.append(_Frame(var, values, self.pruned_by(var, assignment), rest, domains))
+            if not stack:
+                return None
+            frame = stack[-1]
+            var = frame.var
+            if frame.value is not None:
+                # Back from the child of frame.value, which failed with self._failure.
+                failure = self._failure
+                frame.conflict |= failure
+                if optimizer is not None:
+                    optimizer.score -= frame.gain
+                self.unassign(var, assignment)
+                if self._trail is not None:
+                    if inst is None:
+                        self.undo(frame.domains, frame.mark)
+                    else:
+                        inst.timed("undo", self.undo, frame.domains, frame.mark)
+                frame.value = None
                 self.backtracks += 1
-        self.no_goods.add(key)
-        return None
+                if self._restart_limit is not None and self.backtracks >= self._restart_limit:
+                    self._restarting = True
+                if self._stopped or self._restarting:
+                    self._failure = set(assignment)
+                    stack.pop()
+                    continue
+                if self._backjumping and var not in failure:
+                    self.backjumps += 1
+                    self._failure = failure
+                    stack.pop()
+                    continue
+            while frame.index < len(frame.values):
+                value = frame.values[frame.index]
+                frame.index += 1
+                if inst is not None:
+                    inst.values_tried += 1
+                gain = 0
+                if optimizer is not None:
+                    gain = self.value_score(var, value)
+                    if not optimizer.can_improve(optimizer.score + gain, frame.rest):
+                        frame.conflict.update(assignment)
+                        continue
+                reason = self.explain_inconsistency(var, value, assignment, frame.verdicts)
+                if reason is not None:
+                    if inst is not None:
+                        inst.values_rejected += 1
+                    frame.conflict |= reason
+                    continue
+                if self._trail is None:
+                    local_domains = dict(frame.domains) if inst is None else inst.timed("domain_copy", dict,
+                                                                                        frame.domains)
+                else:
+                    local_domains = frame.domains
+                    frame.mark = len(self._trail)
+                self.assign(var, value, assignment)
+                frame.value = value
+                frame.gain = gain
+                if optimizer is not None:
+                    optimizer.score += gain
+                if inst is None:
+                    consistent = self.propagate(var, value, assignment, local_domains)
+                else:
+                    consistent = inst.timed("propagation", self.propagate, var, value, assignment, local_domains)
+                if consistent:
+                    domains = local_domains
+                    entering = True
+                break
+            else:
+                frame.conflict.discard(var)
+                self._failure = frame.conflict
+                if self.nogoods is not None:
+                    self.learn(frame.conflict, assignment)
+                stack.pop()
+
+    def should_stop(self):
+        """
+        True once the search was cancelled or used up its time or node budget;
+        it then unwinds. The reason is kept in self._stop_reason.
+        """
+        if not self._stopped:
+            if self._cancel_event is not None and self._cancel_event.is_set():
+                self._stop_reason = "cancelled"
+            elif self._optimizer is not None and self._optimizer.out_of_time():
+                self._stop_reason = "time_limit"
+            elif self._deadline is not None and time.monotonic() > self._deadline:
+                self._stop_reason = "time_limit"
+            elif self._node_limit is not None and self.nodes >= self._node_limit:
+                self._stop_reason = "node_limit"
+            self._stopped = self._stop_reason is not None
+        return self._stopped
+
+    def _random_rank(self, rng):
+        order = list(self.variables)
+        rng.shuffle(order)
+        return {var: i for i, var in enumerate(order)}
+
+    def _domain_size_stats(self, domains):
+        sizes = [mask.bit_count() for mask in domains.values()]
+        return min(sizes), max(sizes), sum(sizes) / len(sizes)
+
+    def _phase(self, name):
+        if self.instrumentation is None:
+            return nullcontext()
+        return self.instrumentation.phase(name)
+
+    def preprocess(self, domains=None):
+        """
+        Apply the unary constraints, AC3 and the global constraint propagators to
+        a copy of the domains. Returns the filtered domains, or None if the
+        problem is unsolvable.
+
+        domains: encoded domains to start from instead of self.masks, already
+                 filtered by the unary constraints (node consistency is skipped).
+
+        Without `domains`, the result is loaded from self.domain_cache when it
+        has one for this problem, and stored there otherwise.
+        """
+        with self._phase("preprocess"):
+            if domains is not None or self.domain_cache is None:
+                return self._preprocess(domains)
+            key = fingerprint(self)
+            if key is None:
+                return self._preprocess(None)
+            found, local_domains = self.domain_cache.load(self, key)
+            if not found:
+                local_domains = self._preprocess(None)
+                self.domain_cache.store(self, local_domains, key)
+                return local_domains
+            logger.info("Loaded the preprocessed domains from the cache.")
+            self._trail = None
+            self._pruners = None
+            self._compile_constraints()
+            self._propagators = [c for c in self.constraints.values() if hasattr(c, "propagate")]
+            if local_domains is not None:
+                for propagator in self._propagators:
+                    propagator.setup(self, local_domains)
+            return local_domains
+
+    def _preprocess(self, domains):
+        self._trail = None
+        self._pruners = None
+        local_domains = dict(self.masks if domains is None else domains)
+        logger.info("Initial domain sizes: min=%d, max=%d, avg=%.1f", *self._domain_size_stats(local_domains))
+        if domains is None:
+            logger.info("Applying unary constraints...")
+            with self._phase("node_consistency"):
+                consistent = self.node_consistency(local_domains)
+            if not consistent:
+                logger.info("Problem is unsolvable after applying unary constraints.")
+                return None
+            logger.info("Domain sizes after node consistency: min=%d, max=%d, avg=%.1f",
+                        *self._domain_size_stats(local_domains))
+        else:
+            self._compile_constraints()
+            if not all(local_domains.values()):
+                logger.info("Problem is unsolvable: a given domain is empty.")
+                return None
+        logger.info("Running AC3 for initial constraint propagation...")
+        with self._phase("ac3"):
+            consistent = self.ac3(local_domains)
+        if not consistent:
+            logger.info("Problem is unsolvable after AC3 propagation.")
+            return None
+        logger.info("Domain sizes after AC3: min=%d, max=%d, avg=%.1f", *self._domain_size_stats(local_domains))
+        self._propagators = [c for c in self.constraints.values() if hasattr(c, "propagate")]
+        if self._propagators:
+            with self._phase("global_propagation"):
+                for propagator in self._propagators:
+                    propagator.setup(self, local_domains)
+                consistent = self.propagate_globals(None, {}, local_domains)
+            if not consistent:
+                logger.info("Problem is unsolvable after global constraint propagation.")
+                return None
+            logger.info("Domain sizes after global constraints: min=%d, max=%d, avg=%.1f",
+                        *self._domain_size_stats(local_domains))
+        return local_domains
+
+    def _start_search(self, domains, assignment, trail=True, variable_ordering="mrv", incremental=True):
+        """
+        Reset the search state for a search from the preprocessed `domains`.
+        With `incremental` (trail mode only) variable selection uses the
+        VariableQueue, value ordering the SlotSupport counts, and the global
+        propagators only run when their scope changed.
+        """
+        self._decoded = TrackedAssignment()
+        for _, constraint, _ in self._checked_constraints:
+            constraint.reset()
+        self._trail = [] if trail else None
+        self._pruners = {var: [] for var in self.variables} if trail else None
+        self._depth = {}
+        self._static_scores = {var: self._score_static_preferences(var, domains[var]) for var in self.variables}
+        self._variable_queue = None
+        self._slot_support = None
+        if trail and incremental:
+            self._variable_queue = VariableQueue(self.variables, self.neighbors, domains,
+                                                 assignment, variable_ordering, self._tie_rank)
+            self._slot_support = SlotSupport(self.variables, self.neighbors, domains, self.encoding)
+        self._watchers = [w for w in (self._variable_queue, self._slot_support) if w is not None]
+        if trail and incremental:
+            # Global propagators skip nodes where nothing in their scope changed.
+            for propagator in self._propagators:
+                propagator.watching = True
+                self._watchers.append(propagator)
+
+    def _end_search(self):
+        self._restart_limit = None
+        self._tie_rank = None
+        self._variable_queue = None
+        self._slot_support = None
+        self._watchers = []
+        for propagator in self._propagators:
+            propagator.watching = False
+        self._cancel_event = None
+        self._deadline = None
+        self._node_limit = None
+
+    def solve(self, trail=True, variable_ordering="mrv", optimize=False, time_limit=None, on_incumbent=None,
+              cancel_event=None, workers=None, strategy="split", learn_nogoods=True, nogood_capacity=10000,
+              nogood_max_size=None, backjumping=True, restarts=None, restart_base=100, restart_factor=1.5,
+              seed=None, instrumentation=None, domains=None, method="backtrack", max_steps=100000,
+              tabu_tenure=10, decompose=False, node_limit=None):
+        """
+        trail: if True, search prunes domains in place and undoes the prunings on
+               backtrack; if False, every search node copies the domains.
+        variable_ordering: "mrv" or "dom/wdeg" (see heuristics.VariableQueue).
+                           In trail mode the choice is kept in an incremental
+                           priority queue; copy mode rescans for "mrv" only.
+        optimize: if True, branch-and-bound over the total preference score
+                  (see optimization.BranchAndBound) returns the best schedule
+                  instead of the first one.
+        time_limit: seconds after which the search stops. Optimize mode then
+                    returns the best schedule found so far; local mode returns
+                    None if it still has conflicts.
+        node_limit: number of search nodes after which the backtracking search
+                    stops; with `workers` or `decompose` it bounds the nodes
+                    of all the searches together.
+        on_incumbent: in optimize mode, callback (solution, score, elapsed)
+                      run for every improving schedule; in local mode, callback
+                      (assignment, conflicts, elapsed) run whenever the number of
+                      conflicts reaches a new low.
+        cancel_event: object with is_set() (e.g. threading.Event); once set the
+                      search stops and returns what it has.
+        workers: if more than 1, solve in a process pool (see parallel.py) using
+                 `strategy` "split" (subtrees of the first variable) or "portfolio"
+                 (differently configured searches of the whole problem).
+        learn_nogoods: record the conflict sets of failed nodes as no-goods (see
+                       nogoods.NoGoodStore), keeping at most `nogood_capacity` of
+                       them with at most `nogood_max_size` literals each. Not used
+                       in optimize mode, where nodes also fail on bounds.
+        backjumping: jump back over variables that play no part in a failure
+                     (conflict-directed backjumping). Conflict sets are only
+                     precise in trail mode; copy mode blames every assignment.
+        restarts: None, "luby" or "geometric" (see heuristics.restart_cutoffs).
+                  The search restarts from the root once a run has used up its
+                  backtrack budget, which starts at `restart_base` and grows by
+                  the Luby sequence or by `restart_factor`. Learned no-goods and
+                  dom/wdeg weights carry over, and every run breaks variable
+                  ordering ties in a new random order.
+        seed: seed for the random tie-breaking; also randomizes the first run.
+        instrumentation: an Instrumentation, or True for a new one, to profile
+                         this solve; its summary() is added to the metrics as
+                         "instrumentation". Not supported with workers.
+        domains: encoded domains to search instead of self.masks, already
+                 filtered by the unary constraints (see preprocess and
+                 session.SolverSession).
+        method: "backtrack" for the complete search, or "local" for min-conflicts
+                local search with a tabu list (see localsearch.MinConflicts)
+                after the same preprocessing, making at most `max_steps` moves.
+                Local search finds schedules of large instances quickly but
+                cannot prove that none exists.
+        decompose: solve the independent components of the constraint graph
+                   separately and join their schedules (see
+                   decomposition.solve_decomposed); with `workers`, the
+                   components are shared out between the processes.
 
-    def solve(self):
-        print("Starting to solve...")
+        metrics["status"] says how the solve ended: "solved" (a schedule was
+        found), "optimal" (optimize mode searched to the end and found one),
+        "infeasible" (there is none), or "time_limit", "node_limit",
+        "step_limit" (local mode's max_steps) or "cancelled" when it stopped
+        early. A backtracking search stopped without a schedule also returns
+        the largest consistent partial schedule it reached as
+        metrics["partial"].
+        """
+        if method not in ("backtrack", "local"):
+            raise ValueError(f"Unknown search method: {method}")
+        if method == "local" and optimize:
+            raise ValueError("Local search does not support optimize mode")
+        if variable_ordering != "mrv" and not trail:
+            raise ValueError(f"Variable ordering {variable_ordering!r} requires trail mode")
+        if instrumentation is True:
+            instrumentation = Instrumentation()
+        if decompose:
+            if instrumentation is not None:
+                raise ValueError("Instrumentation is not supported when solving by components")
+            from decomposition import solve_decomposed
+            return solve_decomposed(self, workers, cancel_event, domains, trail=trail,
+                                    variable_ordering=variable_ordering, optimize=optimize, time_limit=time_limit,
+                                    on_incumbent=on_incumbent, learn_nogoods=learn_nogoods,
+                                    nogood_capacity=nogood_capacity, nogood_max_size=nogood_max_size,
+                                    backjumping=backjumping, restarts=restarts, restart_base=restart_base,
+                                    restart_factor=restart_factor, seed=seed, method=method, max_steps=max_steps,
+                                    tabu_tenure=tabu_tenure, node_limit=node_limit)
+        if workers is not None and workers > 1:
+            if instrumentation is not None:
+                raise ValueError("Instrumentation is not supported with parallel workers")
+            from parallel import solve_parallel
+            return solve_parallel(self, workers, strategy, trail=trail, variable_ordering=variable_ordering,
+                                  optimize=optimize, time_limit=time_limit, on_incumbent=on_incumbent,
+                                  cancel_event=cancel_event, learn_nogoods=learn_nogoods,
+                                  nogood_capacity=nogood_capacity, nogood_max_size=nogood_max_size,
+                                  backjumping=backjumping, restarts=restarts, restart_base=restart_base,
+                                  restart_factor=restart_factor, seed=seed, domains=domains, method=method,
+                                  max_steps=max_steps, tabu_tenure=tabu_tenure, node_limit=node_limit)
+        logger.info("Starting to solve...")
         start_time = time.time()
-        local_domains = {v: list(self.domains[v]) for v in self.domains}
-        print("Initial domain sizes: min=%d, max=%d, avg=%.1f" %
-              (min(len(d) for d in local_domains.values()),
-               max(len(d) for d in local_domains.values()),
-               sum(len(d) for d in local_domains.values()) / len(local_domains)))
-        print("Running AC3 for initial constraint propagation...")
-        if not self.ac3(local_domains):
-            print("Problem is unsolvable after AC3 propagation.")
-            return None, {"backtracks": self.backtracks,
-                          "consistency_checks": self.consistency_checks,
-                          "forward_check_calls": self.forward_check_calls}
-        print("Domain sizes after AC3: min=%d, max=%d, avg=%.1f" %
-              (min(len(d) for d in local_domains.values()),
-               max(len(d) for d in local_domains.values()),
-               sum(len(d) for d in local_domains.values()) / len(local_domains)))
-        print("Starting backtracking search...")
-        solution = self.backtrack({}, local_domains)
-        end_time = time.time()
-        metrics = {
-            "backtracks": self.backtracks,
-            "consistency_checks": self.consistency_checks,
-            "forward_check_calls": self.forward_check_calls,
-            "time_taken": end_time - start_time
-        }
+        deadline = time.monotonic() + time_limit if time_limit is not None else None
+        self.instrumentation = instrumentation
+        local_domains = self.preprocess(domains)
+        if local_domains is None:
+            self.instrumentation = None
+            metrics = {"backtracks": self.backtracks,
+                       "consistency_checks": self.consistency_checks,
+                       "forward_check_calls": self.forward_check_calls,
+                       "nodes": self.nodes,
+                       "status": "infeasible"}
+            if instrumentation is not None:
+                metrics["instrumentation"] = instrumentation.summary()
+            return None, metrics
+        return self._search(local_domains, start_time, deadline, trail=trail, variable_ordering=variable_ordering,
+                            optimize=optimize, time_limit=time_limit, on_incumbent=on_incumbent,
+                            cancel_event=cancel_event, learn_nogoods=learn_nogoods,
+                            nogood_capacity=nogood_capacity, nogood_max_size=nogood_max_size,
+                            backjumping=backjumping, restarts=restarts, restart_base=restart_base,
+                            restart_factor=restart_factor, seed=seed, instrumentation=instrumentation,
+                            method=method, max_steps=max_steps, tabu_tenure=tabu_tenure, node_limit=node_limit)
+
+    def _search(self, local_domains, start_time, deadline, trail=True, variable_ordering="mrv", optimize=False,
+                time_limit=None, on_incumbent=None, cancel_event=None, learn_nogoods=True, nogood_capacity=10000,
+                nogood_max_size=None, backjumping=True, restarts=None, restart_base=100, restart_factor=1.5,
+                seed=None, instrumentation=None, method="backtrack", max_steps=100000, tabu_tenure=10,
+                node_limit=None):
+        """The part of solve() after preprocessing: search the preprocessed `local_domains`."""
+        cutoffs = restart_cutoffs(restarts, restart_base, restart_factor) if restarts is not None else None
+        self.instrumentation = instrumentation
+        local = method == "local"
+        logger.info("Starting local search..." if local else "Starting backtracking search...")
+        self.nogoods = None
+        if learn_nogoods and not optimize and not local:
+            self.nogoods = NoGoodStore(nogood_capacity, nogood_max_size)
+        assignment = {}
+        rng = random.Random(seed)
+        self._tie_rank = None
+        if seed is not None:
+            self._tie_rank = self._random_rank(rng)
+        self._start_search(local_domains, assignment, trail, variable_ordering, incremental=not local)
+        self._optimizer = None
+        if optimize:
+            self._optimizer = BranchAndBound(self._static_scores, self._dynamic_preferences(),
+                                             time_limit, on_incumbent)
+        self._cancel_event = cancel_event
+        self._stopped = False
+        self._stop_reason = None
+        self._deadline = deadline
+        self._node_limit = self.nodes + node_limit if node_limit is not None else None
+        self._deepest = {}
+        self._backjumping = backjumping
+        restarts_before = self.restarts
+        nodes_before = self.nodes
+        local_search = None
+        if local:
+            local_search = MinConflicts(self, local_domains, rng, max_steps, time_limit, tabu_tenure,
+                                        on_incumbent, cancel_event)
+        search_start = time.time()
+        with self._phase("search"):
+            while local_search is None:
+                self._restarting = False
+                self._restart_limit = self.backtracks + next(cutoffs) if cutoffs is not None else None
+                solution = self.backtrack(assignment, local_domains)
+                if not self._restarting:
+                    break
+                self.restarts += 1
+                logger.debug("Restart %d after %d backtracks", self.restarts - restarts_before, self.backtracks)
+                self._tie_rank = self._random_rank(rng)
+                if self._variable_queue is not None:
+                    self._variable_queue.reorder(self._tie_rank)
+            if local_search is not None:
+                solution = local_search.run()
+        self._end_search()
+        with self._phase("reporting"):
+            if solution is not None:
+                solution = self.encoding.decode_assignment(solution)
+            optimizer, self._optimizer = self._optimizer, None
+            if optimizer is not None:
+                solution = optimizer.best
+            end_time = time.time()
+            search_time = end_time - search_start
+            metrics = {
+                "backtracks": self.backtracks,
+                "consistency_checks": self.consistency_checks,
+                "forward_check_calls": self.forward_check_calls,
+                "nodes": self.nodes,
+                "backjumps": self.backjumps,
+                "restarts": self.restarts,
+                "nodes_per_second": (self.nodes - nodes_before) / search_time if search_time > 0 else 0.0,
+                "time_taken": end_time - start_time,
+                "cancelled": cancel_event is not None and cancel_event.is_set()
+            }
+            if self.nogoods is not None:
+                metrics.update(self.nogoods.metrics())
+            if local_search is not None:
+                metrics.update(local_search.metrics())
+            if optimizer is not None:
+                metrics.update(optimizer.metrics())
+                metrics["optimal"] = metrics["optimal"] and self._stop_reason is None
+            if local_search is not None:
+                if solution is not None:
+                    metrics["status"] = "solved"
+                elif metrics["cancelled"]:
+                    metrics["status"] = "cancelled"
+                else:
+                    metrics["status"] = "time_limit" if local_search.timed_out else "step_limit"
+            elif self._stop_reason is not None:
+                metrics["status"] = self._stop_reason
+                if solution is None:
+                    metrics["partial"] = self.encoding.decode_assignment(self._deepest)
+            elif solution is None:
+                metrics["status"] = "infeasible"
+            else:
+                metrics["status"] = "optimal" if optimizer is not None else "solved"
+            self._deepest = {}
+        self.instrumentation = None
+        if instrumentation is not None:
+            metrics["instrumentation"] = instrumentation.summary()
         return solution, metrics
+
+    async def solve_async(self, cancel_event=None, **solve_kwargs):
+        """
+        solve() in a thread of the event loop's default executor, for asyncio
+        code. If the awaiting task is cancelled (e.g. by asyncio.wait_for), the
+        search is cancelled through `cancel_event` (a new threading.Event by
+        default) and awaited before CancelledError propagates, so no search is
+        left running. Setting `cancel_event` instead makes the solve return
+        with status "cancelled".
+        """
+        if cancel_event is None:
+            cancel_event = threading.Event()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(None, functools.partial(self.solve, cancel_event=cancel_event, **solve_kwargs))
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            cancel_event.set()
+            await future
+            raise
+
+    def iter_solutions(self, limit=None, symmetry_breaking=False, cancel_event=None):
+        """
+        Generate the solutions one at a time, as solve() returns them, until
+        `limit` have been produced (all of them by default). The search is
+        suspended between solutions, so nothing but the current branch is kept.
+
+        symmetry_breaking: produce one schedule per set of schedules that only
+                           differ by a permutation of interchangeable rooms
+                           (see symmetry.RoomSymmetry).
+        cancel_event: object with is_set(); once set no more solutions come.
+        """
+        local_domains = self.preprocess()
+        if local_domains is None:
+            return
+        assignment = {}
+        self.nogoods = None
+        self._tie_rank = None
+        self._start_search(local_domains, assignment)
+        self._cancel_event = cancel_event
+        self._stopped = False
+        self._stop_reason = None
+        symmetry = RoomSymmetry(self.encoding, self.variables, local_domains) if symmetry_breaking else None
+        found = 0
+        try:
+            for solution in self._enumerate(assignment, local_domains, symmetry):
+                yield self.encoding.decode_assignment(solution)
+                found += 1
+                if limit is not None and found >= limit:
+                    return
+        finally:
+            self._end_search()
+
+    def _enumerate(self, assignment, domains, symmetry):
+        """The search of iter_solutions, on a _Frame stack like backtrack()."""
+        stack = []
+        entering = True
+        while True:
+            if entering:
+                entering = False
+                self.nodes += 1
+                if self.should_stop():
+                    return
+                if len(assignment) == len(self.variables):
+                    yield dict(assignment)
+                else:
+                    var = self.select_unassigned_variable(assignment, domains)
+                    stack.append(_Frame(var, self.order_domain_values(var, assignment, domains), None, None, domains))
+            if not stack:
+                return
+            frame = stack[-1]
+            var = frame.var
+            if frame.value is not None:
+                # Back from the subtree of frame.value.
+                self._leave(frame, assignment, domains, symmetry)
+            while frame.index < len(frame.values):
+                value = frame.values[frame.index]
+                frame.index += 1
+                if symmetry is not None and not symmetry.allowed(value):
+                    continue
+                if self.explain_inconsistency(var, value, assignment) is not None:
+                    continue
+                frame.mark = len(self._trail)
+                frame.value = value
+                self.assign(var, value, assignment)
+                if symmetry is not None:
+                    symmetry.use(value)
+                if self.propagate(var, value, assignment, domains):
+                    entering = True
+                    break
+                self._leave(frame, assignment, domains, symmetry)
+            else:
+                stack.pop()
+
+    def _leave(self, frame, assignment, domains, symmetry=None):
+        """Take back frame.value and the prunings made under it."""
+        if symmetry is not None:
+            symmetry.release(frame.value)
+        self.unassign(frame.var, assignment)
+        self.undo(domains, frame.mark)
+        self.backtracks += 1
+        frame.value = None
+
+    def count_solutions(self, symmetry_breaking=False):
+        """
+        Number of solutions.
+
+        At every node the unassigned courses are split into components that no
+        neighbor relation or constraint group (see Constraint.groups) links;
+        the components are counted separately and their counts multiplied. A
+        component's count is cached by its domains and the values of the
+        assigned courses it is linked to, and a component of one course counts
+        its consistent values without search.
+
+        symmetry_breaking: count the schedules up to a permutation of
+                           interchangeable rooms instead, by enumerating them.
+        """
+        if symmetry_breaking:
+            return sum(1 for _ in self.iter_solutions(symmetry_breaking=True))
+        local_domains = self.preprocess()
+        if local_domains is None:
+            return 0
+        self.nogoods = None
+        self._tie_rank = None
+        self._start_search(local_domains, {}, incremental=False)
+        self._stopped = False
+        self._stop_reason = None
+        try:
+            return self._count({}, local_domains, set(self.variables), {})
+        finally:
+            self._end_search()
+
+    def _components(self, variables, assignment, domains):
+        """
+        Split the unassigned `variables` into independent components; returns
+        (component, frozenset of the (var, value) pairs of the assigned courses
+        linked to it) pairs.
+        """
+        live = {var: 1 << assignment[var] if var in assignment else domains[var] for var in self.variables}
+        parent = {var: var for var in variables}
+
+        def find(var):
+            while parent[var] != var:
+                parent[var] = parent[parent[var]]
+                var = parent[var]
+            return var
+
+        groups = [[var] + self.neighbors.get(var, []) for var in variables]
+        for _, constraint, _ in self._checked_constraints:
+            groups.extend(constraint.groups(self.variables, live))
+        linked = []
+        for group in groups:
+            free = [var for var in group if var in parent]
+            if not free:
+                continue
+            root = find(free[0])
+            for var in free[1:]:
+                other = find(var)
+                if other != root:
+                    parent[other] = root
+            fixed = [var for var in group if var in assignment]
+            if fixed:
+                linked.append((free[0], fixed))
+        components = {}
+        for var in variables:
+            components.setdefault(find(var), set()).add(var)
+        context = {root: set() for root in components}
+        for var, fixed in linked:
+            context[find(var)].update((other, assignment[other]) for other in fixed)
+        return [(frozenset(component), frozenset(context[root])) for root, component in components.items()]
+
+    def _count(self, assignment, domains, variables, cache):
+        """
+        Solutions for the unassigned `variables` given the assignment (all
+        other courses assigned). Each component being branched on is a _Frame
+        on a stack, so the depth is not bounded by the recursion limit.
+        """
+        self.nodes += 1
+        root = _Frame(None, (), None, None, domains)
+        root.parts = self._components(variables, assignment, domains)[::-1]
+        stack = [root]
+        while True:
+            frame = stack[-1]
+            if frame.parts:
+                # Count the next component below frame.value (or at the root).
+                count = self._count_component(assignment, domains, *frame.parts.pop(), cache)
+                if isinstance(count, _Frame):
+                    stack.append(count)
+                    continue
+                frame.product *= count
+                if not frame.product:
+                    frame.parts = []
+                continue
+            if frame.var is None:
+                return frame.product
+            if frame.value is not None:
+                frame.total += frame.product
+                self._leave(frame, assignment, domains)
+            while frame.index < len(frame.values):
+                value = frame.values[frame.index]
+                frame.index += 1
+                if self.explain_inconsistency(frame.var, value, assignment) is not None:
+                    continue
+                frame.mark = len(self._trail)
+                frame.value = value
+                self.assign(frame.var, value, assignment)
+                if self.propagate(frame.var, value, assignment, domains):
+                    self.nodes += 1
+                    frame.parts = self._components(frame.rest, assignment, domains)[::-1]
+                    frame.product = 1
+                    break
+                self._leave(frame, assignment, domains)
+            else:
+                cache[frame.key] = frame.total
+                stack.pop()
+                parent = stack[-1]
+                parent.product *= frame.total
+                if not parent.product:
+                    parent.parts = []
+
+    def _count_component(self, assignment, domains, component, context, cache):
+        """The count of a component if known without search, else a _Frame branching on one of its courses."""
+        if len(component) == 1:
+            (var,) = component
+            return sum(1 for value in iter_bits(domains[var])
+                       if self.explain_inconsistency(var, value, assignment) is None)
+        key = (frozenset((var, domains[var]) for var in component), context)
+        if key in cache:
+            return cache[key]
+        var = min(component, key=lambda v: domains[v].bit_count())
+        frame = _Frame(var, list(iter_bits(domains[var])), None, component - {var}, domains)
+        frame.key = key
+        return frame
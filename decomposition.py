@@ -0,0 +1,275 @@
+import concurrent.futures
+import logging
+import multiprocessing
+import time
+
+import parallel
+from csp import CSP
+from parallel import STOPPED, SUMMED_METRICS, _init_worker, _share_node_limit
+
+logger = logging.getLogger(__name__)
+
+
+def constraint_graph(csp, domains):
+    """
+    var -> set of the courses it shares a neighbor relation or a constraint
+    group with (see Constraint.groups), given the preprocessed `domains`.
+    """
+    graph = {var: set() for var in csp.variables}
+    for var in csp.variables:
+        for other in csp.neighbors.get(var, []):
+            if other in graph:
+                graph[var].add(other)
+                graph[other].add(var)
+    for _, constraint, _ in csp._checked_constraints:
+        for group in constraint.groups(csp.variables, domains):
+            for var in group:
+                graph[var].update(group)
+    for var, others in graph.items():
+        others.discard(var)
+    return graph
+
+
+def components(graph, order):
+    """The connected components of `graph`, each listed in `order`."""
+    position = {var: i for i, var in enumerate(order)}
+    seen = set()
+    result = []
+    for root in order:
+        if root in seen:
+            continue
+        seen.add(root)
+        component = [root]
+        stack = [root]
+        while stack:
+            for other in graph[stack.pop()]:
+                if other not in seen:
+                    seen.add(other)
+                    component.append(other)
+                    stack.append(other)
+        result.append(sorted(component, key=position.get))
+    return result
+
+
+def cut_vertices(graph, order):
+    """
+    Courses whose removal splits their component (articulation points), in
+    `order`: fixing one of them leaves independent pieces to search.
+    """
+    index = {}
+    low = {}
+    cuts = set()
+    for root in order:
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        children = 0
+        stack = [(root, None, iter(graph[root]))]
+        while stack:
+            var, parent, others = stack[-1]
+            for other in others:
+                if other == parent:
+                    continue
+                if other in index:
+                    low[var] = min(low[var], index[other])
+                else:
+                    index[other] = low[other] = len(index)
+                    stack.append((other, var, iter(graph[other])))
+                    break
+            else:
+                stack.pop()
+                if parent is None:
+                    continue
+                low[parent] = min(low[parent], low[var])
+                if parent == root:
+                    children += 1
+                elif low[var] >= index[parent]:
+                    cuts.add(parent)
+        if children > 1:
+            cuts.add(root)
+    return [var for var in order if var in cuts]
+
+
+def width_estimate(graph):
+    """
+    Upper bound on the treewidth of `graph` from a min-degree elimination
+    order: the largest number of neighbors a course has when eliminated.
+    """
+    adjacency = {var: set(others) for var, others in graph.items()}
+    width = 0
+    while adjacency:
+        var = min(adjacency, key=lambda v: len(adjacency[v]))
+        others = adjacency.pop(var)
+        width = max(width, len(others))
+        for other in others:
+            adjacency[other].discard(var)
+            adjacency[other].update(others - {other})
+    return width
+
+
+def analyze(csp, domains):
+    """
+    The structure of the constraint graph of `csp` over `domains` (as
+    returned by csp.preprocess()): its "components" (lists of courses), their
+    "cut_vertices" and a tree decomposition "width" estimate.
+    """
+    graph = constraint_graph(csp, domains)
+    return {
+        "components": components(graph, csp.variables),
+        "cut_vertices": cut_vertices(graph, csp.variables),
+        "width": width_estimate(graph),
+    }
+
+
+def subproblem(csp, variables):
+    """
+    A CSP over `variables` alone, sharing the constraints, preferences and
+    encoding of `csp`, and taking its encoded domains instead of encoding them again.
+    """
+    members = set(variables)
+    sub = CSP(list(variables), {},
+              {var: [other for other in csp.neighbors.get(var, []) if other in members] for var in variables},
+              csp.constraints, csp.prerequisites, csp.course_term, csp.preferences, encoding=csp.encoding)
+    sub.domains = {var: csp.domains[var] for var in variables}
+    sub.masks = {var: csp.masks[var] for var in variables}
+    return sub
+
+
+def _solve_component(sub, solve_kwargs, cancel_event=None):
+    """
+    Search `sub` from solve_kwargs["domains"], already preprocessed as part of
+    the whole problem: only its constraints and propagators are set up again.
+    """
+    solve_kwargs = dict(solve_kwargs)
+    domains = solve_kwargs.pop("domains")
+    time_limit = solve_kwargs.get("time_limit")
+    start_time = time.time()
+    deadline = time.monotonic() + time_limit if time_limit is not None else None
+    sub._compile_constraints()
+    sub._propagators = [c for c in sub.constraints.values() if hasattr(c, "propagate")]
+    for propagator in sub._propagators:
+        propagator.setup(sub, domains)
+    if cancel_event is None:
+        cancel_event = parallel._cancel_event
+    return sub._search(domains, start_time, deadline, cancel_event=cancel_event, **solve_kwargs)
+
+
+def _solve_pool(tasks, workers, cancel_event):
+    """Solve the (csp, solve_kwargs) tasks in a process pool; a component without a schedule cancels the rest."""
+    context = multiprocessing.get_context()
+    stop = context.Event()
+    results = [None] * len(tasks)
+    with concurrent.futures.ProcessPoolExecutor(min(workers, len(tasks)), mp_context=context,
+                                                initializer=_init_worker, initargs=(stop, None)) as pool:
+        pending = {pool.submit(_solve_component, sub, kwargs): i for i, (sub, kwargs) in enumerate(tasks)}
+        while pending:
+            done, _ = concurrent.futures.wait(pending, timeout=0.05, return_when=concurrent.futures.FIRST_COMPLETED)
+            if cancel_event is not None and cancel_event.is_set():
+                stop.set()
+            for future in done:
+                solution, metrics = results[pending.pop(future)] = future.result()
+                if solution is None:
+                    stop.set()
+    return [result for result in results if result is not None]
+
+
+def solve_decomposed(csp, workers=None, cancel_event=None, domains=None, **solve_kwargs):
+    """
+    Solve `csp` one component of its constraint graph at a time (see analyze)
+    and join the schedules; used by solve(decompose=True). Courses in
+    different components share no constraint, so the search cost grows with
+    the largest component instead of their sum. The components are solved
+    smallest first, or in a pool of `workers` processes, and one without a
+    schedule ends the solve.
+
+    The counters of all components are added to the metrics, which also hold
+    the "components" (their sizes), "cut_vertices", "width" and the
+    "component_metrics". In optimize mode the scores of the components are
+    summed, which needs every preference to be static. The time and node
+    limits hold for the whole solve; when it stops early, "partial" joins the
+    schedules of the components solved and the partial ones of the others.
+    """
+    if solve_kwargs.get("on_incumbent") is not None:
+        raise ValueError("on_incumbent is not supported when solving by components")
+    optimize = solve_kwargs.get("optimize", False)
+    dynamic = list(csp._dynamic_preferences())
+    if optimize and dynamic:
+        raise ValueError(f"Preference {dynamic[0]!r} depends on the assignment, so the components cannot be "
+                         f"optimized separately")
+    start_time = time.time()
+    time_limit = solve_kwargs.get("time_limit")
+    deadline = time.monotonic() + time_limit if time_limit is not None else None
+    local_domains = csp.preprocess(domains)
+    if local_domains is None:
+        metrics = {name: getattr(csp, name) for name in SUMMED_METRICS}
+        metrics["time_taken"] = time.time() - start_time
+        metrics["status"] = "infeasible"
+        return None, metrics
+    report = analyze(csp, local_domains)
+    pieces = sorted(report["components"], key=len)
+    logger.info("Solving %d components (largest %d courses, width estimate %d)",
+                len(pieces), max(map(len, pieces), default=0), report["width"])
+    if len(pieces) == 1:
+        # Nothing to split: search the whole problem from the domains preprocessed here.
+        solution, metrics = csp._search(local_domains, start_time, deadline, cancel_event=cancel_event, **solve_kwargs)
+        metrics["components"] = [len(pieces[0])]
+        metrics["cut_vertices"] = report["cut_vertices"]
+        metrics["width"] = report["width"]
+        metrics["component_metrics"] = [dict(metrics)]
+        return solution, metrics
+
+    tasks = [(subproblem(csp, piece), dict(solve_kwargs, domains={var: local_domains[var] for var in piece}))
+             for piece in pieces]
+    search_start = time.time()
+    if workers is not None and workers > 1:
+        # The node budget is shared out in proportion to the components' sizes.
+        results = _solve_pool(_share_node_limit(tasks, [len(piece) for piece in pieces]), workers, cancel_event)
+    else:
+        # The budgets are shared by the components, not given to each.
+        node_limit = solve_kwargs.get("node_limit")
+        results = []
+        for sub, kwargs in tasks:
+            if deadline is not None:
+                kwargs["time_limit"] = max(deadline - time.monotonic(), 0)
+            if node_limit is not None:
+                kwargs["node_limit"] = max(node_limit - sum(m.get("nodes", 0) for _, m in results), 0)
+            solution, metrics = _solve_component(sub, kwargs, cancel_event)
+            results.append((solution, metrics))
+            if solution is None:
+                break
+
+    solution = None
+    if len(results) == len(tasks) and all(piece is not None for piece, _ in results):
+        solution = {}
+        for piece, _ in results:
+            solution.update(piece)
+    component_metrics = [metrics for _, metrics in results]
+    for name in SUMMED_METRICS:
+        setattr(csp, name, getattr(csp, name) + sum(m.get(name, 0) for m in component_metrics))
+    end_time = time.time()
+    metrics = {name: getattr(csp, name) for name in SUMMED_METRICS}
+    search_nodes = sum(m.get("nodes", 0) for m in component_metrics)
+    metrics["nodes_per_second"] = search_nodes / (end_time - search_start) if end_time > search_start else 0.0
+    metrics["time_taken"] = end_time - start_time
+    metrics["cancelled"] = cancel_event is not None and cancel_event.is_set()
+    metrics["components"] = [len(piece) for piece in pieces]
+    metrics["cut_vertices"] = report["cut_vertices"]
+    metrics["width"] = report["width"]
+    metrics["component_metrics"] = component_metrics
+    if optimize:
+        complete = len(results) == len(tasks) and all(m.get("best_score") is not None for m in component_metrics)
+        metrics["best_score"] = sum(m["best_score"] for m in component_metrics) if complete else None
+        metrics["optimal"] = complete and all(m.get("optimal", False) for m in component_metrics)
+    # A component without a schedule settles the solve; otherwise the first one that stopped early.
+    statuses = [m.get("status") for m in component_metrics]
+    if "infeasible" in statuses:
+        metrics["status"] = "infeasible"
+    elif any(status in STOPPED for status in statuses):
+        metrics["status"] = next(status for status in statuses if status in STOPPED)
+    else:
+        metrics["status"] = "optimal" if optimize else "solved"
+    if solution is None and metrics["status"] in STOPPED:
+        metrics["partial"] = {}
+        for piece, piece_metrics in results:
+            metrics["partial"].update(piece if piece is not None else piece_metrics.get("partial", {}))
+    return solution, metrics
@@ -0,0 +1,259 @@
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import sys
+import types
+
+from constraints import Constraint
+from encoding import FIELDS, iter_bits
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"CSPDOM01"
+# magic, fingerprint, feasible, number of strings, values and courses
+HEADER = struct.Struct("<8s32sBIII")
+# Modules whose code decides the preprocessed domains, besides those of the constraints.
+SOURCE_MODULES = ("csp", "encoding", "constraints", "propagators", "resources")
+
+_source_digests = {}  # module file -> sha256 of its contents
+
+
+def _source_digest(module_name):
+    path = getattr(sys.modules.get(module_name), "__file__", None)
+    if path is None:
+        return b""
+    if path not in _source_digests:
+        with open(path, "rb") as f:
+            _source_digests[path] = hashlib.sha256(f.read()).digest()
+    return _source_digests[path]
+
+
+class Uncacheable(Exception):
+    """Raised by _canonical for an object it cannot describe by value."""
+
+
+def _code_digest(code):
+    """sha256 of the bytecode of `code` and of the constants and names it uses, nested functions included."""
+    digest = hashlib.sha256(code.co_code)
+    for const in code.co_consts:
+        digest.update(_code_digest(const) if isinstance(const, types.CodeType) else repr(const).encode())
+    digest.update(repr(code.co_names).encode())
+    return digest.digest()
+
+
+def _canonical(obj, modules, active=None):
+    """
+    `obj` as nested tuples with a stable repr; records the modules of the code
+    it refers to. A function is described by its code, defaults and the
+    contents of its closure, so closures over different values differ.
+    Raises Uncacheable for any other kind of object.
+    """
+    if active is None:
+        active = set()
+    if obj is None or isinstance(obj, (str, bytes, int, float, complex)):
+        return obj
+    if isinstance(obj, Constraint):
+        modules.add(type(obj).__module__)
+        return ("constraint", _canonical(obj.signature(), modules, active))
+    if isinstance(obj, types.MethodType):
+        return ("method", _canonical(obj.__self__, modules, active), _canonical(obj.__func__, modules, active))
+    if isinstance(obj, types.FunctionType):
+        modules.add(obj.__module__)
+        if id(obj) in active:  # a closure that refers to itself
+            return ("function", obj.__module__, obj.__qualname__)
+        active.add(id(obj))
+        try:
+            cells = []
+            for cell in obj.__closure__ or ():
+                try:
+                    contents = cell.cell_contents
+                except ValueError:  # not bound yet
+                    cells.append(("empty",))
+                else:
+                    cells.append(_canonical(contents, modules, active))
+            return ("function", obj.__module__, obj.__qualname__, _code_digest(obj.__code__),
+                    _canonical(obj.__defaults__, modules, active), _canonical(obj.__kwdefaults__, modules, active),
+                    tuple(cells))
+        finally:
+            active.discard(id(obj))
+    if isinstance(obj, (type, types.BuiltinFunctionType)):
+        modules.add(obj.__module__)
+        return ("name", obj.__module__, obj.__qualname__)
+    if isinstance(obj, dict):
+        items = [(_canonical(key, modules, active), _canonical(value, modules, active)) for key, value in obj.items()]
+        return ("dict", tuple(sorted(items, key=repr)))
+    if isinstance(obj, (set, frozenset)):
+        return ("set", tuple(sorted((_canonical(item, modules, active) for item in obj), key=repr)))
+    if isinstance(obj, (list, tuple)):
+        return tuple(_canonical(item, modules, active) for item in obj)
+    raise Uncacheable(f"cannot fingerprint {type(obj).__qualname__} object {obj!r}")
+
+
+def fingerprint(csp):
+    """
+    sha256 digest of everything the preprocessed domains of `csp` depend on:
+    the domains (as bitsets, with the encoding of the values they use),
+    neighbors, constraints with their tables, prerequisites, terms, and the
+    source of the solver and constraint modules. None if a constraint holds
+    something that cannot be described by value (see _canonical), so the
+    domains must not be cached.
+    """
+    digest = hashlib.sha256(MAGIC)
+    encoding = csp.encoding
+    used = 0
+    for var in csp.variables:
+        mask = csp.masks[var]
+        used |= mask
+        digest.update(repr((var, sorted(csp.neighbors.get(var, [])))).encode())
+        digest.update(mask.to_bytes((mask.bit_length() + 7) // 8, "little"))
+    for field in range(len(FIELDS)):
+        digest.update(repr(encoding.labels[field]).encode())
+        digest.update(encoding.codes[field][:used.bit_length()].tobytes())
+    modules = set(SOURCE_MODULES)
+    setting = (csp.constraints, csp.prerequisites, csp.course_term)
+    try:
+        digest.update(repr(_canonical(setting, modules)).encode())
+    except Uncacheable as e:
+        logger.info("Not caching the preprocessed domains: %s", e)
+        return None
+    for module_name in sorted(modules):
+        digest.update(_source_digest(module_name))
+    return digest.digest()
+
+
+class DomainCache:
+    """
+    Directory of preprocessed domains, one file per problem fingerprint (see
+    fingerprint). Set as CSP.domain_cache, it lets preprocess() load the
+    domains after the unary constraints, AC3 and the global propagators
+    instead of computing them, whenever the search starts from the full
+    domains. A problem whose courses, values, constraints or solver code
+    changed has another fingerprint, so stale files are never read; the
+    least recently used ones are deleted beyond `max_entries`.
+
+    A file holds a header, a string table, the values used by the domains as
+    string ids per field and each domain as a fixed-width bitset over those
+    values, all little-endian, and is read through mmap.
+    """
+
+    def __init__(self, directory, max_entries=32):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, key):
+        return os.path.join(self.directory, key.hex() + ".dom")
+
+    def load(self, csp, key=None):
+        """
+        (True, domains or None if unsolvable) from the cache, or (False, None)
+        on a miss. `key` is the fingerprint of `csp`, if already computed.
+        """
+        if key is None:
+            key = fingerprint(csp)
+            if key is None:
+                return False, None
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                entry = self._read(data, key)
+        except (OSError, ValueError, struct.error) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.warning("Ignoring unreadable domain cache file %s: %s", path, e)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return False, None
+        os.utime(path)
+        self.hits += 1
+        feasible, variables, values, masks = entry
+        if not feasible:
+            return True, None
+        ids = [csp.encoding.encode(value) for value in values]
+        domains = {}
+        for var, stored in zip(variables, masks):
+            mask = 0
+            for i in iter_bits(stored):
+                mask |= 1 << ids[i]
+            domains[var] = mask
+        return True, domains
+
+    def _read(self, data, key):
+        magic, stored_key, feasible, n_strings, n_values, n_vars = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError("not a domain cache file")
+        if stored_key != key:
+            return None
+        offset = HEADER.size
+        bounds = struct.unpack_from(f"<{n_strings + 1}I", data, offset)
+        offset += 4 * (n_strings + 1)
+        value_ids = struct.unpack_from(f"<{n_values * len(FIELDS)}I", data, offset)
+        offset += 4 * n_values * len(FIELDS)
+        var_ids = struct.unpack_from(f"<{n_vars}I", data, offset)
+        offset += 4 * n_vars
+        width = (n_values + 7) // 8
+        masks = [int.from_bytes(data[offset + i * width:offset + (i + 1) * width], "little") for i in range(n_vars)]
+        offset += width * n_vars
+        if offset + bounds[-1] != len(data):
+            raise ValueError("truncated domain cache file")
+        blob = data[offset:]
+        strings = [blob[bounds[i]:bounds[i + 1]].decode() for i in range(n_strings)]
+        values = [tuple(strings[s] for s in value_ids[i:i + len(FIELDS)])
+                  for i in range(0, len(value_ids), len(FIELDS))]
+        return bool(feasible), [strings[i] for i in var_ids], values, masks
+
+    def store(self, csp, domains, key=None):
+        """Write the preprocessed `domains` of `csp` (None if unsolvable)."""
+        if key is None:
+            key = fingerprint(csp)
+            if key is None:
+                return
+        strings = {}
+        used = 0
+        for mask in (domains or {}).values():
+            used |= mask
+        value_ids = list(iter_bits(used))
+        position = {value: i for i, value in enumerate(value_ids)}
+        fields = []
+        for value in value_ids:
+            for label in csp.encoding.values[value]:
+                fields.append(strings.setdefault(label, len(strings)))
+        variables = [strings.setdefault(var, len(strings)) for var in csp.variables] if domains is not None else []
+        width = (len(value_ids) + 7) // 8
+        masks = bytearray()
+        for var in (csp.variables if domains is not None else []):
+            mask = 0
+            for value in iter_bits(domains[var]):
+                mask |= 1 << position[value]
+            masks += mask.to_bytes(width, "little")
+        encoded = [label.encode() for label in strings]
+        bounds = [0]
+        for label in encoded:
+            bounds.append(bounds[-1] + len(label))
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(key)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(HEADER.pack(MAGIC, key, domains is not None, len(encoded), len(value_ids), len(variables)))
+            f.write(struct.pack(f"<{len(bounds)}I", *bounds))
+            f.write(struct.pack(f"<{len(fields)}I", *fields))
+            f.write(struct.pack(f"<{len(variables)}I", *variables))
+            f.write(masks)
+            f.write(b"".join(encoded))
+        os.replace(temporary, path)
+        self._evict()
+
+    def _evict(self):
+        entries = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".dom")]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=os.path.getmtime, reverse=True)
+        for path in entries[self.max_entries:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
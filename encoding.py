@@ -0,0 +1,117 @@
+from array import array
+
+FIELDS = ("term", "slot", "time_label", "building", "room", "professor")
+TERM, SLOT, TIME_LABEL, BUILDING, ROOM, PROFESSOR = range(len(FIELDS))
+
+
+def iter_bits(mask):
+    """Yield the indices of the set bits of `mask` in ascending order."""
+    if mask.bit_length() <= 256:
+        while mask:
+            low = mask & -mask
+            yield low.bit_length() - 1
+            mask ^= low
+        return
+    # Clearing bits copies the whole int, which costs O(width) per bit once
+    # values of later terms have large ids; scan the binary digits instead.
+    bits = bin(mask)[:1:-1]
+    i = bits.find("1")
+    while i >= 0:
+        yield i
+        i = bits.find("1", i + 1)
+
+
+class DomainEncoding:
+    """
+    Integer encoding of domain values.
+
+    Every distinct (term, slot, time_label, building, room, professor) tuple is
+    given one integer id. For each field, `labels[field]` lists the distinct
+    labels and `codes[field]` is an array mapping a value id to the index of its
+    label, so the solver can compare fields as small integers. A domain is a
+    bitset (Python int) whose bit i is set when value id i is in the domain.
+    `values` keeps one shared tuple per id and is only used to decode.
+    """
+
+    def __init__(self):
+        self.labels = [[] for _ in FIELDS]
+        self.codes = [array("I") for _ in FIELDS]
+        self.values = []
+        self._label_index = [{} for _ in FIELDS]
+        self._ids = {}
+        self._domain_masks = {}  # domain key -> mask, for domains that declare a `key`
+
+        # Combined (term, slot) key of each value, the unit of the slot all-different.
+        self.ts = array("I")
+        self.ts_keys = []
+        self.ts_masks = []
+        self._ts_index = {}
+        self._label_masks = [None for _ in FIELDS]  # (number of values, masks) per field
+
+    def __len__(self):
+        return len(self.values)
+
+    def _label_code(self, field, label):
+        index = self._label_index[field]
+        code = index.get(label)
+        if code is None:
+            code = len(self.labels[field])
+            index[label] = code
+            self.labels[field].append(label)
+        return code
+
+    def encode(self, value):
+        value_id = self._ids.get(value)
+        if value_id is not None:
+            return value_id
+        value = tuple(value)
+        value_id = len(self.values)
+        self._ids[value] = value_id
+        self.values.append(value)
+        for field, label in enumerate(value):
+            self.codes[field].append(self._label_code(field, label))
+
+        key = (self.codes[TERM][value_id], self.codes[SLOT][value_id])
+        ts = self._ts_index.get(key)
+        if ts is None:
+            ts = len(self.ts_keys)
+            self._ts_index[key] = ts
+            self.ts_keys.append(key)
+            self.ts_masks.append(0)
+        self.ts.append(ts)
+        self.ts_masks[ts] |= 1 << value_id
+        return value_id
+
+    def encode_domain(self, values):
+        """
+        Bitset of any iterable of values. Domains with a `key` attribute (see
+        loader.CourseDomain) are generated once per distinct key.
+        """
+        key = getattr(values, "key", None)
+        if key is not None and key in self._domain_masks:
+            return self._domain_masks[key]
+        mask = 0
+        for value in values:
+            mask |= 1 << self.encode(value)
+        if key is not None:
+            self._domain_masks[key] = mask
+        return mask
+
+    def label_masks(self, field):
+        """Bitset of the values with each label of `field`, indexed by label code."""
+        cached = self._label_masks[field]
+        if cached is None or cached[0] != len(self.values):
+            bits = [bytearray((len(self.values) + 7) // 8) for _ in self.labels[field]]
+            for value_id, code in enumerate(self.codes[field]):
+                bits[code][value_id >> 3] |= 1 << (value_id & 7)
+            cached = self._label_masks[field] = (len(self.values), [int.from_bytes(b, "little") for b in bits])
+        return cached[1]
+
+    def decode(self, value_id):
+        return self.values[value_id]
+
+    def decode_domain(self, mask):
+        return [self.values[i] for i in iter_bits(mask)]
+
+    def decode_assignment(self, assignment):
+        return {var: self.values[value_id] for var, value_id in assignment.items()}
@@ -0,0 +1,191 @@
+import heapq
+
+
+class VariableQueue:
+    """
+    Priority queue of unassigned variables for MRV selection.
+
+    Keys are computed from the live (pruned) domain sizes and the dynamic degree
+    (number of unassigned neighbors), and are refreshed only when something
+    changes: a domain is pruned or restored, a neighbor is assigned or
+    unassigned, or a constraint weight grows. Outdated heap entries are skipped
+    lazily when popped.
+
+    ordering: "mrv"      - smallest domain, ties broken by largest dynamic degree.
+              "dom/wdeg" - smallest domain size / weighted degree, where the
+                           weight of an edge grows every time propagation along
+                           it wipes out a domain.
+    Remaining ties go to the variable with the lower `rank` (by default its
+    position in `variables`); see reorder().
+    """
+
+    def __init__(self, variables, neighbors, domains, assignment, ordering="mrv", rank=None):
+        if ordering not in ("mrv", "dom/wdeg"):
+            raise ValueError(f"Unknown variable ordering: {ordering}")
+        self.ordering = ordering
+        self.domains = domains
+        self.assignment = assignment
+        self.position = {var: i for i, var in enumerate(variables)}
+        self.rank = rank if rank is not None else self.position
+        self.neighbors = {var: neighbors.get(var, []) for var in variables}
+        self.dependents = {var: [] for var in variables}  # variables that list var as a neighbor
+        for var in variables:
+            for neighbor in self.neighbors[var]:
+                if neighbor in self.dependents:
+                    self.dependents[neighbor].append(var)
+
+        self.weights = {}
+        self.degree = {}
+        self.weighted_degree = {}
+        for var in variables:
+            unassigned = [n for n in self.neighbors[var] if n not in assignment]
+            self.degree[var] = len(unassigned)
+            self.weighted_degree[var] = len(unassigned)
+
+        self.stamp = dict.fromkeys(variables, 0)
+        self.heap = []
+        for var in variables:
+            if var not in assignment:
+                self.update(var)
+
+    def _key(self, var):
+        size = self.domains[var].bit_count()
+        if self.ordering == "dom/wdeg":
+            wdeg = self.weighted_degree[var]
+            ratio = size / wdeg if wdeg else float("inf")
+            return (ratio, size, -self.degree[var], self.rank[var])
+        return (size, -self.degree[var], self.rank[var])
+
+    def domain_changed(self, var, old, new):
+        self.update(var)
+
+    def update(self, var):
+        """Re-key `var` after its domain or degree changed."""
+        if var not in self.stamp or var in self.assignment:
+            return
+        self.stamp[var] += 1
+        heapq.heappush(self.heap, (self._key(var), self.stamp[var], var))
+        if len(self.heap) > 8 * len(self.stamp):
+            self._rebuild()
+
+    def _rebuild(self):
+        self.heap = [(self._key(var), self.stamp[var], var)
+                     for var in self.stamp if var not in self.assignment]
+        heapq.heapify(self.heap)
+
+    def reorder(self, rank):
+        """Break remaining ties by `rank` (var -> number) from now on; constraint weights are kept."""
+        self.rank = rank
+        self._rebuild()
+
+    def _weight(self, a, b):
+        return self.weights.get((a, b) if self.position[a] < self.position[b] else (b, a), 1)
+
+    def assigned(self, var):
+        for other in self.dependents.get(var, ()):
+            self.degree[other] -= 1
+            self.weighted_degree[other] -= self._weight(other, var)
+            self.update(other)
+
+    def unassigned(self, var):
+        for other in self.dependents.get(var, ()):
+            self.degree[other] += 1
+            self.weighted_degree[other] += self._weight(other, var)
+            self.update(other)
+        self.update(var)
+
+    def bump(self, a, b):
+        """Increase the weight of the (a, b) edge after propagation along it failed."""
+        if a not in self.position or b not in self.position:
+            return
+        key = (a, b) if self.position[a] < self.position[b] else (b, a)
+        self.weights[key] = self.weights.get(key, 1) + 1
+        for var, other in ((a, b), (b, a)):
+            if other in self.neighbors[var] and other not in self.assignment:
+                self.weighted_degree[var] += 1
+                self.update(var)
+
+    def pop(self):
+        """Return the best unassigned variable; it stays queued until assigned."""
+        heap = self.heap
+        while heap:
+            key, stamp, var = heap[0]
+            if var in self.assignment or stamp != self.stamp[var]:
+                heapq.heappop(heap)
+                continue
+            return var
+        return None
+
+
+def luby(i):
+    """The i-th term (from 0) of the Luby sequence 1, 1, 2, 1, 1, 2, 4, 1, 1, 2, ..."""
+    i += 1
+    while True:
+        k = i.bit_length()
+        if i == (1 << k) - 1:
+            return 1 << (k - 1)
+        i -= (1 << (k - 1)) - 1
+
+
+def restart_cutoffs(policy, base=100, factor=1.5):
+    """
+    Yield the number of backtracks allowed in each run of a restarting search.
+
+    policy: "luby"      - base * luby(i) for run i.
+            "geometric" - base * factor ** i.
+    """
+    if policy not in ("luby", "geometric"):
+        raise ValueError(f"Unknown restart policy: {policy}")
+    i = 0
+    while True:
+        if policy == "luby":
+            yield base * luby(i)
+        else:
+            yield int(base * factor ** i)
+        i += 1
+
+
+class SlotSupport:
+    """
+    Per-(term, slot) support counters for value ordering.
+
+    conflicts(var, ts) is the number of values with (term, slot) key `ts` left
+    in the live domains of var's neighbors, i.e. how many neighbor values
+    choosing that slot would rule out. The counts are adjusted whenever a
+    domain is pruned or restored, so reading them is O(1).
+    """
+
+    def __init__(self, variables, neighbors, domains, encoding):
+        self.ts_masks = encoding.ts_masks
+        self.dependents = {var: [] for var in variables}
+        for var in variables:
+            for neighbor in neighbors.get(var, []):
+                if neighbor in self.dependents:
+                    self.dependents[neighbor].append(var)
+        # (term, slot) keys that can occur in each domain.
+        self.keys = {var: [ts for ts, mask in enumerate(self.ts_masks) if domains[var] & mask]
+                     for var in variables}
+        self.counts = {var: [0] * len(self.ts_masks) for var in variables}
+        for var in variables:
+            self._add(var, domains[var], 1)
+
+    def _add(self, var, mask, sign):
+        dependents = self.dependents[var]
+        for ts in self.keys[var]:
+            count = (mask & self.ts_masks[ts]).bit_count()
+            if count:
+                for other in dependents:
+                    self.counts[other][ts] += sign * count
+
+    def domain_changed(self, var, old, new):
+        if var not in self.keys:
+            return
+        removed = old & ~new
+        if removed:
+            self._add(var, removed, -1)
+        added = new & ~old
+        if added:
+            self._add(var, added, 1)
+
+    def conflicts(self, var, ts):
+        return self.counts[var][ts]
@@ -0,0 +1,128 @@
+import csv
+import json
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+
+class Instrumentation:
+    """
+    Profile of CSP.solve, enabled with solve(instrumentation=...).
+
+    constraints: name -> [calls, rejects, seconds] for every constraint check
+                 during search ("nogood" and "slot_neighbors" count the
+                 rejections made before the constraint functions run).
+    timers:      name -> [calls, seconds] for the search steps: variable
+                 selection, value ordering, propagation, domain copies (copy
+                 mode) and undo (trail mode).
+    phases:      (name, start, end) of preprocess, node_consistency, ac3,
+                 global_propagation, search and reporting, in perf_counter
+                 seconds.
+    depths:      search nodes per depth (number of assigned courses).
+
+    The propagation effectiveness is the share of the values removed during
+    search that propagation pruned, rather than consistency checks rejecting
+    them one by one. When no Instrumentation is given the solver only pays an
+    `is None` test at each hook.
+    """
+
+    def __init__(self):
+        self.constraints = {}
+        self.timers = {}
+        self.phases = []
+        self.depths = Counter()
+        self.values_tried = 0
+        self.values_rejected = 0
+        self.values_pruned = 0
+        self.origin = time.perf_counter()
+
+    def check(self, name, check, *args):
+        """Run constraint `check(*args)`, counting the call, its time and a rejection."""
+        start = time.perf_counter()
+        ok = check(*args)
+        elapsed = time.perf_counter() - start
+        stats = self.constraints.get(name)
+        if stats is None:
+            stats = self.constraints[name] = [0, 0, 0.0]
+        stats[0] += 1
+        stats[2] += elapsed
+        if not ok:
+            stats[1] += 1
+        return ok
+
+    def reject(self, name):
+        stats = self.constraints.get(name)
+        if stats is None:
+            stats = self.constraints[name] = [0, 0, 0.0]
+        stats[0] += 1
+        stats[1] += 1
+
+    def timed(self, name, func, *args):
+        """Call `func(*args)` and add its time to timer `name`."""
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        stats = self.timers.get(name)
+        if stats is None:
+            stats = self.timers[name] = [0, 0.0]
+        stats[0] += 1
+        stats[1] += elapsed
+        return result
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, start, time.perf_counter()))
+
+    def node(self, depth):
+        self.depths[depth] += 1
+
+    def propagation_effectiveness(self):
+        removed = self.values_pruned + self.values_rejected
+        return self.values_pruned / removed if removed else 0.0
+
+    def summary(self):
+        return {
+            "constraints": {name: {"calls": calls, "rejects": rejects, "seconds": seconds}
+                            for name, (calls, rejects, seconds) in self.constraints.items()},
+            "timers": {name: {"calls": calls, "seconds": seconds}
+                       for name, (calls, seconds) in self.timers.items()},
+            "phases": [{"name": name, "start": start - self.origin, "seconds": end - start}
+                       for name, start, end in self.phases],
+            "depth_histogram": {depth: self.depths[depth] for depth in sorted(self.depths)},
+            "values_tried": self.values_tried,
+            "values_rejected": self.values_rejected,
+            "values_pruned": self.values_pruned,
+            "propagation_effectiveness": self.propagation_effectiveness(),
+        }
+
+    def to_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def to_csv(self, path):
+        """One row per constraint, timer, phase and depth: kind, name, calls, rejects, seconds."""
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["kind", "name", "calls", "rejects", "seconds"])
+            for name, (calls, rejects, seconds) in self.constraints.items():
+                writer.writerow(["constraint", name, calls, rejects, seconds])
+            for name, (calls, seconds) in self.timers.items():
+                writer.writerow(["timer", name, calls, "", seconds])
+            for name, start, end in self.phases:
+                writer.writerow(["phase", name, 1, "", end - start])
+            for depth in sorted(self.depths):
+                writer.writerow(["depth", depth, self.depths[depth], "", ""])
+
+    def to_chrome_trace(self, path):
+        """Write the phases as a trace for chrome://tracing or Perfetto, with the summary as metadata."""
+        events = [{"name": name, "cat": "phase", "ph": "X", "pid": 0, "tid": 0,
+                   "ts": (start - self.origin) * 1e6, "dur": (end - start) * 1e6}
+                  for name, start, end in sorted(self.phases, key=lambda phase: phase[1])]
+        summary = self.summary()
+        del summary["phases"]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms", "otherData": summary}, f)
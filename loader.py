@@ -0,0 +1,220 @@
+import csv
+import json
+import os
+from itertools import product
+
+from constraints import PrerequisiteIndex, ProfessorAvailability, ProfessorSpecialty, required_courses_constraint
+from propagators import RoomCardinality, SlotAllDifferent
+
+# Tables of an instance directory; each may be a .csv, .jsonl or .json file.
+TABLES = ("courses", "slots", "rooms", "professors", "availability", "prerequisites")
+EXTENSIONS = (".csv", ".jsonl", ".json")
+
+
+def read_rows(path):
+    """
+    Yield the rows of a table as dicts, one at a time: a CSV file with a
+    header, a JSON Lines file with one object per line, or a JSON file holding
+    a list of objects (which is parsed whole).
+    """
+    if path.endswith(".csv"):
+        with open(path, newline="") as f:
+            yield from csv.DictReader(f)
+    elif path.endswith(".jsonl"):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif path.endswith(".json"):
+        with open(path) as f:
+            yield from json.load(f)
+    else:
+        raise ValueError(f"Unsupported table format: {path}")
+
+
+def _split(field):
+    """A list field: a JSON list, or a string of items separated by ';'."""
+    if isinstance(field, list):
+        return field
+    return [item.strip() for item in (field or "").split(";") if item.strip()]
+
+
+class CourseDomain:
+    """
+    The values (term, slot, time_label, building, room, professor) of a course,
+    generated on demand from the slots of its day type, the rooms and the
+    professors rather than stored. Courses with the same term and day type
+    share a `key`, so the solver encodes their domain once.
+    """
+
+    def __init__(self, term, slots, rooms, professors):
+        self.term = term
+        self.slots = slots
+        self.rooms = rooms
+        self.professors = professors
+        self.key = (term, slots, rooms, professors)
+
+    def __iter__(self):
+        term = self.term
+        for (slot, time_label), (building, room), professor in product(self.slots, self.rooms, self.professors):
+            yield (term, slot, time_label, building, room, professor)
+
+    def __len__(self):
+        return len(self.slots) * len(self.rooms) * len(self.professors)
+
+
+class Instance:
+    """
+    A scheduling problem read by load_instance.
+
+    variables:     course codes in file order.
+    course_term:   course -> "Term1", "Term2", ... or "Completed".
+    days:          course -> day type ("MWF" or "TTH").
+    domains:       course -> CourseDomain.
+    prerequisites: course -> list of requirements; a requirement with
+                   alternatives is a list, as in main.py.
+    availability:  professor -> term -> available time labels.
+    specialties:   professor -> course code prefixes.
+    """
+
+    def __init__(self):
+        self.variables = []
+        self.course_term = {}
+        self.days = {}
+        self.slots = {}
+        self.rooms = []
+        self.professors = []
+        self.availability = {}
+        self.specialties = {}
+        self.prerequisites = {}
+        self.domains = {}
+        self.term_names = None  # term order, when it is not the order of first appearance
+
+    def terms(self):
+        """Scheduled terms in the order they first appear in the courses table."""
+        if self.term_names is not None:
+            return list(self.term_names)
+        return list(dict.fromkeys(term for term in self.course_term.values() if term != "Completed"))
+
+    def term_order(self):
+        order = {"Completed": -1}
+        order.update((term, i) for i, term in enumerate(self.terms()))
+        return order
+
+    def neighbors(self):
+        """Courses in the same term, plus courses joined by a prerequisite."""
+        by_term = {}
+        for course in self.variables:
+            by_term.setdefault(self.course_term[course], []).append(course)
+        neighbors = {course: set(by_term[self.course_term[course]]) - {course} for course in self.variables}
+        for course, reqs in self.prerequisites.items():
+            for req in reqs:
+                for alt in (req if isinstance(req, list) else [req]):
+                    if alt in neighbors and course in neighbors:
+                        neighbors[course].add(alt)
+                        neighbors[alt].add(course)
+        return {course: sorted(others) for course, others in neighbors.items()}
+
+    def constraints(self):
+        """The hard constraints of main.py, with the instance's professor tables."""
+        prerequisite_index = PrerequisiteIndex(self.course_term, self.prerequisites, self.term_order())
+        return {
+            "prerequisite": prerequisite_index,
+            "prerequisite_term_bounds": prerequisite_index.within_term_bounds,
+            "prof_availability": ProfessorAvailability(self.availability),
+            "slot_all_different": SlotAllDifferent(),
+            "room_capacity": RoomCardinality(key_index=0, limit=2),
+            "room_diversity": RoomCardinality(key_index=1, limit=2),
+            "required_courses": required_courses_constraint,
+            "prof_specialty": ProfessorSpecialty(self.specialties),
+        }
+
+    def csp_args(self, preferences=None):
+        """Positional arguments for CSP(...)."""
+        return (self.variables, self.domains, self.neighbors(), self.constraints(),
+                self.prerequisites, self.course_term, preferences)
+
+
+def _table_path(directory, name):
+    for extension in EXTENSIONS:
+        path = os.path.join(directory, name + extension)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"No {name} table ({'/'.join(EXTENSIONS)}) in {directory}")
+
+
+def load_instance(path):
+    """
+    Read an instance from a directory holding one table per name in TABLES,
+    or from a single JSON file mapping each name to its list of rows.
+
+    courses:       course, term, days (term "Completed", with no days, for a
+                   course already taken: it is not scheduled)
+    slots:         slot, days, time
+    rooms:         building, room
+    professors:    professor, specialties (';'-separated course code prefixes)
+    availability:  professor, term, time
+    prerequisites: course, requires (one row per requirement; alternatives
+                   separated by '|')
+
+    Tables are read row by row and domains are CourseDomain generators, so
+    memory grows with the number of courses, not with their domain sizes.
+    """
+    if os.path.isdir(path):
+        tables = {name: read_rows(_table_path(path, name)) for name in TABLES}
+    else:
+        with open(path) as f:
+            data = json.load(f)
+        tables = {name: iter(data.get(name, [])) for name in TABLES}
+
+    instance = Instance()
+    slots = {}
+    for row in tables["slots"]:
+        slots.setdefault(row["days"], []).append((row["slot"], row["time"]))
+    instance.slots = {days: tuple(day_slots) for days, day_slots in slots.items()}
+    instance.rooms = tuple((row["building"], str(row["room"])) for row in tables["rooms"])
+    professors = []
+    for row in tables["professors"]:
+        professors.append(row["professor"])
+        instance.specialties[row["professor"]] = _split(row.get("specialties"))
+    instance.professors = tuple(professors)
+    for row in tables["availability"]:
+        instance.availability.setdefault(row["professor"], {}).setdefault(row["term"], []).append(row["time"])
+    for row in tables["prerequisites"]:
+        requires = row["requires"]
+        if isinstance(requires, list):
+            alternatives = requires
+        else:
+            alternatives = [alt.strip() for alt in requires.split("|")]
+        requirement = alternatives if len(alternatives) > 1 else alternatives[0]
+        instance.prerequisites.setdefault(row["course"], []).append(requirement)
+
+    for row in tables["courses"]:
+        course, term, days = row["course"], row["term"], row.get("days")
+        instance.course_term[course] = term
+        if term == "Completed":
+            continue
+        if days not in instance.slots:
+            raise ValueError(f"Course {course} uses day type {days!r}, which has no slots")
+        instance.variables.append(course)
+        instance.days[course] = days
+        instance.domains[course] = CourseDomain(term, instance.slots[days], instance.rooms, instance.professors)
+    return instance
+
+
+class Student:
+    """One student's plan request: the catalog courses to schedule and the courses already completed."""
+
+    def __init__(self, student_id, courses, completed=()):
+        self.student_id = student_id
+        self.courses = list(courses)
+        self.completed = list(completed)
+
+
+def read_students(path):
+    """
+    Yield a Student per row of a students table (.csv, .jsonl or .json) with
+    columns student, courses and completed (';'-separated course codes).
+    """
+    for row in read_rows(path):
+        yield Student(row["student"], _split(row.get("courses")), _split(row.get("completed")))
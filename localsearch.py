@@ -0,0 +1,209 @@
+import logging
+import time
+from collections import Counter
+
+from encoding import iter_bits
+
+logger = logging.getLogger(__name__)
+
+SLOT = "slot_neighbors"  # name under which clashes with neighbors in the same (term, slot) are counted
+
+
+class MinConflicts:
+    """
+    Min-conflicts local search with a tabu list, run by solve(method="local").
+
+    The search starts from a greedy assignment: courses are taken smallest
+    domain first, and each gets the first value in order_domain_values order
+    with the fewest conflicts with the courses placed before it. Then, at every
+    step, a random conflicted course moves to the value with the fewest
+    conflicts, ties going to the higher preference score. A course may not
+    return to a value it left in the last `tabu_tenure` steps, unless that
+    would beat the best assignment so far.
+
+    A conflict is one violated check of a course against the rest of the
+    assignment: a neighbor in the same (term, slot), or a constraint whose
+    check() fails. `violations` keeps these per course and per constraint; a
+    move only recounts the moved course and the courses its old and new
+    values conflict with (found through Constraint.explain), so constraints
+    are expected to be symmetric, as all of constraints.py and propagators.py
+    are.
+
+    max_steps / time_limit: the search gives up after this many moves / seconds.
+    on_incumbent: optional callback (solution, conflicts, elapsed_seconds) run
+                  every time the number of conflicts drops to a new low.
+    """
+
+    def __init__(self, csp, domains, rng, max_steps=100000, time_limit=None, tabu_tenure=10,
+                 on_incumbent=None, cancel_event=None):
+        self.csp = csp
+        self.domains = domains
+        self.rng = rng
+        self.max_steps = max_steps
+        self.tabu_tenure = tabu_tenure
+        self.on_incumbent = on_incumbent
+        self.cancel_event = cancel_event
+        self.start = time.monotonic()
+        self.deadline = self.start + time_limit if time_limit is not None else None
+
+        self.assignment = {}
+        self.violations = {}  # var -> Counter of constraint name -> violated checks
+        self.by_constraint = Counter()  # constraint name -> violated checks over all courses
+        self.total = 0
+        self.tabu = {}  # (var, value) -> step until which var may not take value again
+        self.steps = 0
+        self.best_total = None
+        self.best = None
+        self.history = []  # (elapsed seconds, conflicts) at every new low
+        self.timed_out = False
+
+    def _count(self, var, value, cache=None):
+        """Number of conflicts of var = value with the assignment (var itself unassigned)."""
+        csp = self.csp
+        ts = csp.encoding.ts
+        conflicts = 0
+        for neighbor in csp.neighbors.get(var, []):
+            if neighbor in self.assignment and ts[self.assignment[neighbor]] == ts[value]:
+                conflicts += 1
+        codes = csp.encoding.codes
+        decoded = csp.encoding.values[value]
+        for name, constraint, fields in csp._woken.get(var, ()):
+            key = None
+            if cache is not None and fields is not None:
+                key = (name, tuple(codes[field][value] for field in fields))
+                if key in cache:
+                    conflicts += cache[key]
+                    continue
+            failed = 0 if constraint.check(var, decoded, csp._decoded, csp.course_term, csp.prerequisites) else 1
+            if key is not None:
+                cache[key] = failed
+            conflicts += failed
+        return conflicts
+
+    def _explain(self, var, value):
+        """(Counter of violated constraint names, set of courses in conflict) for var = value."""
+        csp = self.csp
+        ts = csp.encoding.ts
+        names = Counter()
+        culprits = set()
+        for neighbor in csp.neighbors.get(var, []):
+            if neighbor in self.assignment and ts[self.assignment[neighbor]] == ts[value]:
+                names[SLOT] += 1
+                culprits.add(neighbor)
+        decoded = csp.encoding.values[value]
+        for name, constraint, _ in csp._woken.get(var, ()):
+            if not constraint.check(var, decoded, csp._decoded, csp.course_term, csp.prerequisites):
+                names[name] += 1
+                culprits.update(c for c in constraint.explain(var, decoded, csp._decoded, csp.course_term,
+                                                              csp.prerequisites) if c in self.assignment)
+        return names, culprits
+
+    def _set_violations(self, var, names):
+        old = self.violations.get(var)
+        if old:
+            self.by_constraint.subtract(old)
+            self.total -= sum(old.values())
+        self.violations[var] = names
+        self.by_constraint.update(names)
+        self.total += sum(names.values())
+
+    def _refresh(self, var):
+        csp = self.csp
+        value = self.assignment[var]
+        csp.unassign(var, self.assignment)
+        names, _ = self._explain(var, value)
+        csp.assign(var, value, self.assignment)
+        self._set_violations(var, names)
+
+    def _greedy(self):
+        csp = self.csp
+        domains = self.domains
+        order = sorted(csp.variables, key=lambda var: (domains[var].bit_count(), -len(csp.neighbors.get(var, []))))
+        for var in order:
+            best, best_conflicts = None, None
+            cache = {}
+            for value in csp.order_domain_values(var, self.assignment, domains):
+                conflicts = self._count(var, value, cache)
+                if best_conflicts is None or conflicts < best_conflicts:
+                    best, best_conflicts = value, conflicts
+                    if conflicts == 0:
+                        break
+            csp.assign(var, best, self.assignment)
+        for var in csp.variables:
+            self._refresh(var)
+
+    def _choose(self, var, current):
+        """The value var moves to: fewest conflicts, not tabu, then best preference score."""
+        csp = self.csp
+        cache = {}
+        candidates = []
+        fewest = None
+        for value in iter_bits(self.domains[var]):
+            if value == current:
+                continue
+            conflicts = self._count(var, value, cache)
+            if self.tabu.get((var, value), -1) >= self.steps:
+                # Aspiration: a tabu move is allowed if it beats the best assignment.
+                if self.total + 2 * (conflicts - sum(self.violations[var].values())) >= self.best_total:
+                    continue
+            if fewest is None or conflicts < fewest:
+                fewest, candidates = conflicts, [value]
+            elif conflicts == fewest:
+                candidates.append(value)
+        if not candidates:
+            return None
+        self.rng.shuffle(candidates)
+        return max(candidates, key=lambda value: csp.value_score(var, value))
+
+    def _move(self, var, value):
+        csp = self.csp
+        old = self.assignment[var]
+        csp.unassign(var, self.assignment)
+        _, before = self._explain(var, old)
+        names, after = self._explain(var, value)
+        csp.assign(var, value, self.assignment)
+        self._set_violations(var, names)
+        for other in before | after:
+            self._refresh(other)
+        self.tabu[(var, old)] = self.steps + self.tabu_tenure
+
+    def _improved(self):
+        if self.best_total is not None and self.total >= self.best_total:
+            return
+        self.best_total = self.total
+        self.best = dict(self.assignment)
+        elapsed = time.monotonic() - self.start
+        self.history.append((elapsed, self.total))
+        logger.debug("Local search: %d conflicts after %d steps", self.total, self.steps)
+        if self.on_incumbent is not None:
+            self.on_incumbent(self.csp.encoding.decode_assignment(self.best), self.total, elapsed)
+
+    def should_stop(self):
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            self.timed_out = True
+        return (self.timed_out or self.steps >= self.max_steps
+                or (self.cancel_event is not None and self.cancel_event.is_set()))
+
+    def run(self):
+        """Search until no conflicts are left; returns the encoded assignment, or None."""
+        self._greedy()
+        self._improved()
+        while self.total > 0 and not self.should_stop():
+            self.steps += 1
+            conflicted = [var for var in self.csp.variables if self.violations[var]]
+            var = self.rng.choice(conflicted)
+            value = self._choose(var, self.assignment[var])
+            if value is not None:
+                self._move(var, value)
+                self._improved()
+        return dict(self.assignment) if self.total == 0 else None
+
+    def metrics(self):
+        return {
+            "steps": self.steps,
+            "conflicts": self.total,
+            "best_conflicts": self.best_total,
+            "constraint_conflicts": {name: count for name, count in self.by_constraint.items() if count},
+            "history": self.history,
+            "timed_out": self.timed_out,
+        }
@@ -1,111 +1,46 @@
+import logging
+import os
+import sys
+
 from csp import CSP
+from domaincache import DomainCache
+from loader import load_instance
 
-from constraints import (
-    prerequisite_constraint_transitive,
-    professor_availability_constraint,
-    professor_specialty_constraint,
-    room_capacity_constraint,
-    room_diversity_constraint,
-    required_courses_constraint
-)
 from preferences import (
     prefer_later_start_times,
     prefer_professor,
     prefer_building_room,
-    prefer_room_diversity
+    prefer_room_diversity_incremental
 )
 
-def main():
-    # 2 academic terms
-    terms = ["Term1", "Term2"]
-
-    # define slot types
-    MWF_slots = [
-        ("MWF1", "8AM"), ("MWF2", "9AM"), ("MWF3", "10AM"),
-        ("MWF4", "11AM"), ("MWF5", "12PM"), ("MWF6", "1PM"),
-        ("MWF7", "2PM"), ("MWF8", "3PM"), ("MWF9", "4PM")
-    ]
-    
-    TTH_slots = [
-        ("TTH1", "8AM"), ("TTH2", "9AM"), ("TTH3", "10AM"),
-        ("TTH4", "11AM"), ("TTH5", "12PM"), ("TTH6", "1PM"),
-        ("TTH7", "2PM"), ("TTH8", "3PM"), ("TTH9", "4PM")
-    ]
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
 
-    buildings = ["CCIS", "ETLC", "CSC", "SUB"]
-    rooms = ["101", "201"]
-    professors = ["Smith", "Johnson", "Williams", "Brown", "Anderson", "Taylor"]
+def main():
+    # solver progress at INFO; use DEBUG to see every AC3 revision
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
 
-    # course options for Term1 and Term2
-    term1_MWF_course_options = [
-        "CMPUT174", "MATH144", "CMPUT204", "PHYS124", "CHEM101",
-        "ENGL103", "STAT151", "ECON101", "PSYCO104", "PHIL102"
-    ]
-    term1_TTH_course_options = [
-        "MATH134", "BIOL107", "ENGL102", "HIST116", "ANTHRO101",
-        "PSYCO105", "SOC100", "DRAMA102"
-    ]
-    term2_MWF_course_options = [
-        "CMPUT201", "MATH146", "CMPUT366", "PHYS126", "CHEM102",
-        "ENGL104", "STAT152", "ECON102", "PSYCO106", "PHIL103"
-    ]
-    term2_TTH_course_options = [
-        "MATH136", "BIOL207", "ENGL103", "HIST117", "ANTHRO201",
-        "PSYCO223", "SOC101", "DRAMA202"
-    ]
+    # instance tables (courses, slots, rooms, professors, availability,
+    # prerequisites); pass another directory or JSON file to solve that instead
+    instance = load_instance(sys.argv[1] if len(sys.argv) > 1 else DATA_DIR)
+    terms = instance.terms()
+    variables = instance.variables
+    course_term = instance.course_term
+    prerequisites = instance.prerequisites
 
-    # deterministically select courses
-    term1_MWF_courses = sorted(term1_MWF_course_options)[:3]
-    term1_TTH_courses = sorted(term1_TTH_course_options)[:2]
-    term2_MWF_courses = sorted(term2_MWF_course_options)[:3]
-    term2_TTH_courses = sorted(term2_TTH_course_options)[:2]
-    
-    term1_courses = term1_MWF_courses + term1_TTH_courses
-    term2_courses = term2_MWF_courses + term2_TTH_courses
-    variables = term1_courses + term2_courses
-    
-    print(f"\nSelected Term 1 MWF courses: {term1_MWF_courses}")
-    print(f"Selected Term 1 TTH courses: {term1_TTH_courses}")
-    print(f"Selected Term 2 MWF courses: {term2_MWF_courses}")
-    print(f"Selected Term 2 TTH courses: {term2_TTH_courses}")
+    print()
+    for term in terms:
+        for days in sorted(instance.slots):
+            courses = [c for c in variables if course_term[c] == term and instance.days[c] == days]
+            print(f"Selected {term.replace('Term', 'Term ')} {days} courses: {courses}")
 
-    # map each course to its term
-    course_term = {}
-    for course in term1_courses:
-        course_term[course] = "Term1"
-    for course in term2_courses:
-        course_term[course] = "Term2"
-        
-    # --- Mark completed courses ---
-    completed_courses = {"MATH134"}
-    for course in completed_courses:
-        course_term[course] = "Completed"
+    completed_courses = {course for course, term in course_term.items() if term == "Completed"}
     print("\nCompleted courses:", completed_courses)
 
-    # build domains
-    domains = {}
+    # domains are generated on demand from the slot, room and professor tables
+    domains = instance.domains
     for course in variables:
-        term = course_term[course]
-        slots = MWF_slots if (course in term1_MWF_courses or course in term2_MWF_courses) else TTH_slots
-        course_values = []
-        for slot in slots:
-            slot_id, time_label = slot
-            for building in buildings:
-                for room in rooms:
-                    for professor in professors:
-                        course_values.append((term, slot_id, time_label, building, room, professor))
-        domains[course] = course_values
-        print(f"{course}: {len(course_values)} possible assignments")
+        print(f"{course}: {len(domains[course])} possible assignments")
 
-    # define explicit prerequisites
-    prerequisites = {
-        "CMPUT204": [["MATH144", "MATH134"]],
-        "MATH146": ["MATH144"],
-        "BIOL207": ["BIOL107"],
-        "MATH136": ["MATH134"],
-        "CMPUT366": ["CMPUT204"]
-    }
-    
     print("\n=== Prerequisites ===")
     for course, reqs in prerequisites.items():
         req_str = []
@@ -116,62 +51,39 @@ def main():
                 req_str.append(req)
         print(f"{course} requires: {', '.join(req_str)}")
 
-    # build neighbors
-    neighbors = {}
-    for course in variables:
-        neighbors[course] = set()
-    for course in variables:
-        for other in variables:
-            if other != course and course_term[other] == course_term[course]:
-                neighbors[course].add(other)
-    # add prerequisite-based neighbor relationships
-    for adv, prereq_list in prerequisites.items():
-        for prereq in prereq_list:
-            if isinstance(prereq, (list, tuple)):
-                for alt in prereq:
-                    if alt in variables:
-                        neighbors.setdefault(adv, set()).add(alt)
-                        neighbors.setdefault(alt, set()).add(adv)
-            else:
-                if prereq in variables:
-                    neighbors.setdefault(adv, set()).add(prereq)
-                    neighbors.setdefault(prereq, set()).add(adv)
+    # same-term courses and prerequisite pairs may conflict
+    neighbors = instance.neighbors()
     for course in neighbors:
-        neighbors[course] = list(neighbors[course])
         print(f"{course} has {len(neighbors[course])} neighbors.")
 
-    # constraint functions
-    constraints = {
-        "prerequisite": prerequisite_constraint_transitive,
-        "prof_availability": professor_availability_constraint,
-        "room_capacity": room_capacity_constraint,
-        "room_diversity": room_diversity_constraint,
-        "required_courses": required_courses_constraint,
-        "prof_specialty": professor_specialty_constraint
-    }
+    # hard constraints, with the professor tables of the instance; building the
+    # prerequisite index rejects cycles and impossible chains
+    constraints = instance.constraints()
     
     # Preference functions
     preferences = {
         "later_start_time": prefer_later_start_times,
         "professor_preference": prefer_professor,
         "building_room_preference": prefer_building_room,
-        "room_diversity_preference": prefer_room_diversity
+        "room_diversity_preference": prefer_room_diversity_incremental
     }
 
     print("\nCreating and solving the enhanced 2-term scheduling CSP without randomness...")
     scheduling_csp = CSP(variables, domains, neighbors, constraints, prerequisites, course_term, preferences)
+    # reuse the preprocessed domains of earlier runs kept in $CSP_DOMAIN_CACHE
+    if os.environ.get("CSP_DOMAIN_CACHE"):
+        scheduling_csp.domain_cache = DomainCache(os.environ["CSP_DOMAIN_CACHE"])
     solution, metrics = scheduling_csp.solve()
 
     if solution:
         print("\n=== Solution Found ===")
-        schedule = {"Term1": {"MWF": [], "TTH": []}, "Term2": {"MWF": [], "TTH": []}}
+        schedule = {term: {days: [] for days in sorted(instance.slots)} for term in terms}
         for course, (term, slot, time_label, building, room, professor) in solution.items():
-            slot_type = "MWF" if slot.startswith("MWF") else "TTH"
-            schedule[term][slot_type].append((slot, time_label, course, building, room, professor))
+            schedule[term][instance.days[course]].append((slot, time_label, course, building, room, professor))
         
         for term in terms:
             print(f"\n=== {term} Schedule ===")
-            for slot_type in ["MWF", "TTH"]:
+            for slot_type in schedule[term]:
                 print(f"\n  {slot_type} courses:")
                 for assignment in sorted(schedule[term][slot_type], key=lambda x: x[1]):
                     slot, time_label, course, building, room, professor = assignment
@@ -204,6 +116,7 @@ def main():
         print(f"Backtracks: {metrics['backtracks']}")
         print(f"Consistency checks: {metrics['consistency_checks']}")
         print(f"Forward checking calls: {metrics['forward_check_calls']}")
+        print(f"Search nodes: {metrics['nodes']} ({metrics['nodes_per_second']:.0f} nodes/sec)")
         print(f"Time taken: {metrics['time_taken']:.2f} seconds")
     else:
         print("No solution exists with these constraints.")
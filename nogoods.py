@@ -0,0 +1,106 @@
+from collections import OrderedDict
+
+
+class NoGoodStore:
+    """
+    Bounded store of learned no-goods.
+
+    A no-good is a set of literals (var, value id) that cannot all hold in a
+    solution. It is learned from the conflict set of a failed search node, so
+    it only names the assignments that actually caused the failure.
+
+    Every no-good of two or more literals watches two of them. When a watched
+    literal becomes true, the watch moves to another literal that is not true;
+    if there is none, the no-good has become unit and the value of the other
+    watched literal is pruned (see CSP.propagate_nogoods). Single-literal
+    no-goods simply ban a value. Watches never need undoing on backtrack.
+
+    capacity: maximum number of stored no-goods; the least recently used one is
+              evicted first (a no-good is "used" when it prunes a value).
+    max_size: no-goods with more literals than this are not stored.
+    """
+
+    def __init__(self, capacity=10000, max_size=None):
+        self.capacity = capacity
+        self.max_size = max_size
+        self.nogoods = OrderedDict()  # id -> tuple of literals, least recently used first
+        self.watched = {}  # id -> [literal, literal]
+        self.watches = {}  # literal -> set of ids watching it
+        self.banned = {}  # literal -> id of a single-literal no-good
+        self._next_id = 0
+
+        self.learned = 0
+        self.evicted = 0
+        self.checks = 0
+        self.prunings = 0
+
+    def __len__(self):
+        return len(self.nogoods)
+
+    def add(self, literals):
+        """
+        Store a no-good. `literals` must be ordered from the most recently
+        assigned literal to the least recent; the first two are watched.
+        """
+        literals = tuple(literals)
+        if not literals or (self.max_size is not None and len(literals) > self.max_size):
+            return None
+        nogood_id = self._next_id
+        self._next_id += 1
+        self.nogoods[nogood_id] = literals
+        self.learned += 1
+        if len(literals) == 1:
+            self.banned[literals[0]] = nogood_id
+        else:
+            self.watched[nogood_id] = [literals[0], literals[1]]
+            for literal in literals[:2]:
+                self.watches.setdefault(literal, set()).add(nogood_id)
+        while len(self.nogoods) > self.capacity:
+            self._remove(next(iter(self.nogoods)))
+            self.evicted += 1
+        return nogood_id
+
+    def _remove(self, nogood_id):
+        literals = self.nogoods.pop(nogood_id)
+        if len(literals) == 1:
+            self.banned.pop(literals[0], None)
+            return
+        for literal in self.watched.pop(nogood_id):
+            ids = self.watches.get(literal)
+            if ids is not None:
+                ids.discard(nogood_id)
+                if not ids:
+                    del self.watches[literal]
+
+    def touch(self, nogood_id):
+        self.nogoods.move_to_end(nogood_id)
+
+    def is_banned(self, var, value):
+        nogood_id = self.banned.get((var, value))
+        if nogood_id is None:
+            return False
+        self.prunings += 1
+        self.touch(nogood_id)
+        return True
+
+    def watching(self, literal):
+        return list(self.watches.get(literal, ()))
+
+    def move_watch(self, nogood_id, old, new):
+        pair = self.watched[nogood_id]
+        pair[pair.index(old)] = new
+        ids = self.watches[old]
+        ids.discard(nogood_id)
+        if not ids:
+            del self.watches[old]
+        self.watches.setdefault(new, set()).add(nogood_id)
+
+    def metrics(self):
+        return {
+            "nogoods_learned": self.learned,
+            "nogoods_stored": len(self.nogoods),
+            "nogoods_evicted": self.evicted,
+            "nogood_checks": self.checks,
+            "nogood_prunings": self.prunings,
+            "nogood_hit_rate": self.prunings / self.checks if self.checks else 0.0,
+        }
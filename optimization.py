@@ -0,0 +1,89 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class BranchAndBound:
+    """
+    State of an optimize-mode search over the total preference score.
+
+    The score of a schedule is the sum, over courses, of every preference
+    evaluated when the course is assigned (static preferences do not depend on
+    the assignment; dynamic ones see the courses assigned before it). A node is
+    pruned when its score so far plus an admissible bound on the unassigned
+    courses cannot beat the incumbent. The bound of an unassigned course is the
+    best static score left in its live domain plus the declared upper bounds of
+    the dynamic preferences (see preferences.preference_upper_bound).
+
+    time_limit: seconds after which the search stops and keeps the incumbent.
+    on_incumbent: optional callback (solution, score, elapsed_seconds) run every
+                  time a better schedule is found.
+    """
+
+    def __init__(self, static_scores, dynamic_preferences, time_limit=None, on_incumbent=None):
+        self.ranked = {var: sorted(scores.items(), key=lambda item: item[1], reverse=True)
+                       for var, scores in static_scores.items()}
+        self.dynamic_bound = 0
+        for name, pref_func in dynamic_preferences.items():
+            bound = getattr(pref_func, "upper_bound", None)
+            if bound is None:
+                raise ValueError(f"Preference {name!r} depends on the assignment but declares no upper bound")
+            self.dynamic_bound += bound
+        self.on_incumbent = on_incumbent
+        self.start = time.monotonic()
+        self.deadline = self.start + time_limit if time_limit is not None else None
+
+        self.score = 0
+        self.best_score = None
+        self.best = None
+        self.incumbents = 0
+        self.timed_out = False
+
+    def out_of_time(self):
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            self.timed_out = True
+        return self.timed_out
+
+    def best_static(self, var, mask):
+        for value, score in self.ranked[var]:
+            if mask >> value & 1:
+                return score
+        return 0
+
+    def remaining_bound(self, variables, assignment, domains, skip=None):
+        return sum(self.best_static(var, domains[var]) + self.dynamic_bound
+                   for var in variables if var not in assignment and var != skip)
+
+    def can_improve(self, score, bound):
+        return self.best_score is None or score + bound > self.best_score
+
+    def record(self, solution):
+        self.best_score = self.score
+        self.best = solution
+        self.incumbents += 1
+        elapsed = time.monotonic() - self.start
+        logger.info("New incumbent: score=%s after %.3f seconds", self.score, elapsed)
+        if self.on_incumbent is not None:
+            self.on_incumbent(solution, self.score, elapsed)
+
+    def metrics(self):
+        return {
+            "best_score": self.best_score,
+            "incumbents": self.incumbents,
+            "optimal": not self.timed_out,
+        }
+
+
+def score_schedule(solution, preferences):
+    """
+    Total preference score of a decoded schedule, as optimized by
+    BranchAndBound: each course is scored against the courses before it.
+    """
+    seen = {}
+    total = 0
+    for var, value in solution.items():
+        total += sum(pref_func(var, value, seen) for pref_func in preferences.values())
+        seen[var] = value
+    return total
+
@@ -0,0 +1,199 @@
+import concurrent.futures
+import logging
+import multiprocessing
+import queue
+import time
+
+logger = logging.getLogger(__name__)
+
+SUMMED_METRICS = ("backtracks", "consistency_checks", "forward_check_calls", "nodes", "backjumps", "restarts")
+# Values of metrics["status"] for a search that stopped before its end (see CSP.solve).
+STOPPED = ("time_limit", "node_limit", "step_limit", "cancelled")
+
+# Configurations tried by the "portfolio" strategy, in order; a seed makes
+# otherwise identical searches break variable ordering ties differently.
+PORTFOLIO = [
+    {"variable_ordering": "mrv"},
+    {"variable_ordering": "dom/wdeg"},
+    {"variable_ordering": "mrv", "seed": 1},
+    {"variable_ordering": "dom/wdeg", "seed": 1},
+]
+
+# Set in each worker process by _init_worker.
+_cancel_event = None
+_incumbents = None
+
+
+def _init_worker(cancel_event, incumbents):
+    global _cancel_event, _incumbents
+    _cancel_event = cancel_event
+    _incumbents = incumbents
+
+
+def _report_incumbent(solution, score, elapsed):
+    _incumbents.put((solution, score, elapsed))
+
+
+def _solve_task(csp, restrict, solve_kwargs):
+    """Run one search in a worker: optionally on a subset of one variable's domain."""
+    if restrict is not None:
+        var, mask = restrict
+        if solve_kwargs.get("domains") is not None:
+            domains = dict(solve_kwargs["domains"])
+            domains[var] &= mask
+            solve_kwargs = dict(solve_kwargs, domains=domains)
+        else:
+            csp.masks[var] &= mask
+    if _incumbents is not None and solve_kwargs.get("optimize"):
+        solve_kwargs = dict(solve_kwargs, on_incumbent=_report_incumbent)
+    return csp.solve(cancel_event=_cancel_event, **solve_kwargs)
+
+
+def _split_tasks(csp, workers, solve_kwargs):
+    """
+    One task per worker, each owning a round-robin share of the first variable's
+    values and starting from the domains preprocessed here.
+    """
+    domains = csp.preprocess(solve_kwargs.get("domains"))
+    if domains is None:
+        return []
+    solve_kwargs = dict(solve_kwargs, domains=domains)
+    root = csp.select_unassigned_variable({}, domains)
+    values = csp.order_domain_values(root, {}, domains)
+    tasks = []
+    for i in range(min(workers, len(values))):
+        mask = 0
+        for value in values[i::workers]:
+            mask |= 1 << value
+        tasks.append(((root, mask), solve_kwargs))
+    logger.info("Split %s into %d subtrees", root, len(tasks))
+    return tasks
+
+
+def _share_node_limit(tasks, weights):
+    """
+    Give the (anything, solve_kwargs) `tasks` shares of solve_kwargs["node_limit"]
+    in proportion to `weights`, so that together they search at most that many nodes.
+    """
+    node_limit = tasks[0][1].get("node_limit") if tasks else None
+    if node_limit is None:
+        return tasks
+    total = sum(weights)
+    shares = [node_limit * weight // total for weight in weights]
+    for i in range(node_limit - sum(shares)):
+        shares[i % len(shares)] += 1
+    return [(task, dict(kwargs, node_limit=share)) for (task, kwargs), share in zip(tasks, shares)]
+
+
+def _largest_partial(results):
+    """The largest partial schedule reached by any worker (see CSP.solve), or None."""
+    partials = [m["partial"] for m in results if m.get("partial") is not None]
+    return max(partials, key=len) if partials else None
+
+
+def _portfolio_tasks(workers, solve_kwargs):
+    tasks = []
+    for config in PORTFOLIO[:workers]:
+        tasks.append((None, dict(solve_kwargs, **config)))
+    return tasks
+
+
+def solve_parallel(csp, workers, strategy="split", cancel_event=None, on_incumbent=None, **solve_kwargs):
+    """
+    Solve `csp` with a pool of `workers` processes.
+
+    strategy "split": the first variable's values are shared out between the
+    workers, each searching its own subtrees. strategy "portfolio": every worker
+    searches the whole problem with a different configuration from PORTFOLIO.
+
+    Without optimize, the first schedule found cancels the other workers. In
+    optimize mode the best schedule over all workers is returned; in portfolio
+    mode the first worker that proves optimality cancels the rest. The counters
+    of all workers are summed into the returned metrics, which also list the
+    metrics of each worker under "worker_metrics". A node_limit is shared out
+    evenly between the workers, and a stopped solve returns the largest
+    "partial" schedule of any of them.
+    """
+    if strategy not in ("split", "portfolio"):
+        raise ValueError(f"Unknown parallel strategy: {strategy}")
+    start_time = time.time()
+    optimize = solve_kwargs.get("optimize", False)
+    baseline = {name: getattr(csp, name) for name in SUMMED_METRICS}
+    if strategy == "split":
+        tasks = _split_tasks(csp, workers, solve_kwargs)
+    else:
+        tasks = _portfolio_tasks(workers, solve_kwargs)
+    tasks = _share_node_limit(tasks, [1] * len(tasks))
+
+    context = multiprocessing.get_context()
+    stop = context.Event()
+    incumbents = context.Queue() if on_incumbent is not None and optimize else None
+    best, best_score, reported_score = None, None, None
+    results = []
+
+    with concurrent.futures.ProcessPoolExecutor(max(len(tasks), 1), mp_context=context,
+                                                initializer=_init_worker,
+                                                initargs=(stop, incumbents)) as pool:
+        pending = {pool.submit(_solve_task, csp, restrict, kwargs) for restrict, kwargs in tasks}
+        while pending:
+            done, pending = concurrent.futures.wait(pending, timeout=0.05,
+                                                    return_when=concurrent.futures.FIRST_COMPLETED)
+            if cancel_event is not None and cancel_event.is_set():
+                stop.set()
+            while incumbents is not None:
+                try:
+                    solution, score, elapsed = incumbents.get_nowait()
+                except queue.Empty:
+                    break
+                if reported_score is None or score > reported_score:
+                    reported_score = score
+                    on_incumbent(solution, score, elapsed)
+            for future in done:
+                solution, metrics = future.result()
+                results.append(metrics)
+                if solution is not None and (best is None or (optimize and metrics["best_score"] > best_score)):
+                    best, best_score = solution, metrics.get("best_score")
+                # A portfolio worker that finished its search has settled the whole problem.
+                finished = metrics.get("status") in ("solved", "optimal", "infeasible")
+                if (solution is not None and not optimize) or (strategy == "portfolio" and finished):
+                    stop.set()
+
+    end_time = time.time()
+    merged = {name: sum(m.get(name, 0) - baseline[name] for m in results) for name in SUMMED_METRICS}
+    for name in SUMMED_METRICS:
+        setattr(csp, name, baseline[name] + merged[name])
+    merged["nodes_per_second"] = merged["nodes"] / (end_time - start_time) if end_time > start_time else 0.0
+    merged["time_taken"] = end_time - start_time
+    merged["cancelled"] = cancel_event is not None and cancel_event.is_set()
+    merged["workers"] = len(tasks)
+    merged["strategy"] = strategy
+    merged["worker_metrics"] = results
+    if optimize:
+        merged["best_score"] = best_score
+        merged["incumbents"] = sum(m.get("incumbents", 0) for m in results)
+        if strategy == "split":
+            merged["optimal"] = all(m.get("optimal", False) for m in results)
+        else:
+            merged["optimal"] = any(m.get("optimal", False) for m in results)
+    merged["status"] = _merged_status(results, strategy, best is not None, optimize, merged.get("optimal"),
+                                      merged["cancelled"])
+    if best is None and merged["status"] in STOPPED:
+        merged["partial"] = _largest_partial(results) or {}
+    return best, merged
+
+
+def _merged_status(results, strategy, found, optimize, optimal, cancelled):
+    """The status of a parallel solve from those of its workers (see CSP.solve)."""
+    statuses = [m.get("status") for m in results]
+    if found and not optimize:
+        return "solved"
+    if optimize and optimal:
+        return "optimal" if found else "infeasible"
+    if cancelled:
+        return "cancelled"
+    # A portfolio worker searches the whole problem; split workers only their share.
+    settled = any if strategy == "portfolio" else all
+    if not found and settled(status == "infeasible" for status in statuses):
+        return "infeasible"
+    stopped = [status for status in statuses if status in STOPPED and status != "cancelled"]
+    return stopped[0] if stopped else "cancelled"
@@ -1,3 +1,24 @@
+from resources import resource_keys
+
+def static_preference(func):
+    """
+    Declare that a preference depends only on (var, value), not on the
+    assignment. The solver scores such preferences once per value.
+    """
+    func.static = True
+    return func
+
+def preference_upper_bound(bound):
+    """
+    Declare the largest score an assignment-dependent preference can return.
+    Branch-and-bound (solve(optimize=True)) needs it to keep its bounds admissible.
+    """
+    def decorate(func):
+        func.upper_bound = bound
+        return func
+    return decorate
+
+@static_preference
 def prefer_later_start_times(var, value, assignment):
     _, _, time_label, _, _, _ = value
     time_preference_scores = {
@@ -16,6 +37,7 @@ def prefer_later_start_times(var, value, assignment):
         score += 2
     return score
 
+@static_preference
 def prefer_professor(var, value, assignment):
     _, _, _, _, _, professor = value
     professor_scores = {
@@ -28,6 +50,7 @@ def prefer_professor(var, value, assignment):
     }
     return professor_scores.get(professor, 0)
 
+@static_preference
 def prefer_building_room(var, value, assignment):
     _, _, _, building, room, _ = value
     building_scores = {
@@ -42,6 +65,7 @@ def prefer_building_room(var, value, assignment):
     }
     return building_scores.get(building, 0) + room_scores.get(room, 0)
 
+@preference_upper_bound(0)
 def prefer_room_diversity(var, value, assignment):
     _, _, _, building, room, _ = value
     room_uses = 0
@@ -50,3 +74,11 @@ def prefer_room_diversity(var, value, assignment):
         if e_building == building and e_room == room:
             room_uses += 1
     return -1 * room_uses
+
+
+@preference_upper_bound(0)
+def prefer_room_diversity_incremental(var, value, assignment):
+    counters = getattr(assignment, "room_usage", None)
+    if counters is None:
+        return prefer_room_diversity(var, value, assignment)
+    return -1 * counters[resource_keys(value)[2]]
@@ -0,0 +1,335 @@
+from collections import Counter
+
+from constraints import Constraint
+from encoding import iter_bits
+from resources import resource_keys
+
+
+class CardinalityConstraint(Constraint):
+    """
+    Global constraint: at most `limit` of the courses in `variables` may take values with
+    the same key (see key()). With limit 1 this is an all-different.
+
+    Instances are called like any constraint function, checking one value
+    against the assigned courses; the solver's check() reads usage counts kept
+    by on_assign/on_unassign instead. solve() also propagates them over all
+    these courses (Régin's flow-based filtering): a maximum assignment of courses to
+    keys is kept between calls and only repaired where domains changed; if it
+    cannot cover every course the node fails, and a value is pruned when no
+    such assignment can use its key. This catches pigeonhole conflicts that
+    pairwise checks miss.
+
+    Courses and keys fall into blocks that share no key (every key holds the
+    term, so at least one per term); a node only repairs and filters the
+    blocks whose domains changed, or that hold the assigned course.
+
+    variables: the courses the constraint applies to; all courses if None.
+    value_keys: optional dict of value id -> key, filled by setup() and shared
+                by constraints with the same key over one encoding (see
+                batch.Catalog).
+    """
+
+    limit = 1
+    value_keys = None
+
+    def __init__(self, limit=None, variables=None):
+        if limit is not None:
+            self.limit = limit
+        self.variables = set(variables) if variables is not None else None
+        self.usage = Counter()
+        self.members = []  # courses covered by the propagator, set by setup()
+        self.member_set = set()
+        self.watching = False  # set by the solver when domain_changed is called for it
+        self.blocks = []  # (courses, keys) sharing no key with other blocks, set by setup()
+        self.block_of = {}
+        self.stale = set()  # blocks whose domains changed since they were last filtered
+
+    def key(self, value):
+        raise NotImplementedError
+
+    def signature(self):
+        return super().signature() + (self.limit,)
+
+    def __call__(self, var, value, assignment, course_term=None, prerequisites=None):
+        if not self.applies_to(var):
+            return True
+        key = self.key(value)
+        count = sum(1 for course, other in assignment.items()
+                    if course != var and self.applies_to(course) and self.key(other) == key)
+        return count < self.limit
+
+    def check(self, var, value, assignment, course_term=None, prerequisites=None):
+        return not self.applies_to(var) or self.usage[self.key(value)] < self.limit
+
+    def explain(self, var, value, assignment, course_term=None, prerequisites=None):
+        key = self.key(value)
+        return [course for course, other in assignment.items()
+                if course != var and self.applies_to(course) and self.key(other) == key]
+
+    def groups(self, variables, domains):
+        """The members whose domains share a key."""
+        groups = [[] for _ in self.key_masks]
+        for var in variables:
+            if var in self.member_set:
+                # The domains only shrink after setup(), so var_keys holds every key they can share.
+                mask = domains[var]
+                for k in self.var_keys[var]:
+                    if mask & self.key_masks[k]:
+                        groups[k].append(var)
+        return groups
+
+    def reset(self):
+        self.usage.clear()
+
+    def on_assign(self, var, value):
+        if self.applies_to(var):
+            self.usage[self.key(value)] += 1
+
+    def on_unassign(self, var, value):
+        if self.applies_to(var):
+            self.usage[self.key(value)] -= 1
+
+    def setup(self, csp, domains):
+        """Index the values in the members' domains by key and reset the matching."""
+        self.members = [var for var in csp.variables if self.applies_to(var)]
+        self.member_set = set(self.members)
+        values = 0
+        for var in self.members:
+            values |= domains[var]
+        index = {}
+        self.key_of = {}
+        self.key_masks = []
+        cache = self.value_keys if self.value_keys is not None else {}
+        for value_id in iter_bits(values):
+            key = cache.get(value_id)
+            if key is None:
+                key = cache[value_id] = self.key(csp.encoding.values[value_id])
+            k = index.setdefault(key, len(index))
+            if k == len(self.key_masks):
+                self.key_masks.append(0)
+            self.key_of[value_id] = k
+            self.key_masks[k] |= 1 << value_id
+        self.var_keys = {var: sorted({self.key_of[value_id] for value_id in iter_bits(domains[var])})
+                         for var in self.members}
+        self._split_blocks()
+        self.matched = {}
+        self.load = [0] * len(self.key_masks)
+        self.holders = [set() for _ in self.key_masks]
+        self.watching = False
+        self.stale = set(range(len(self.blocks)))
+
+    def _split_blocks(self):
+        """Group the members and keys into blocks linked by the members' domains."""
+        parent = list(range(len(self.key_masks)))
+
+        def root(k):
+            while parent[k] != k:
+                parent[k] = parent[parent[k]]
+                k = parent[k]
+            return k
+
+        for var in self.members:
+            keys = self.var_keys[var]
+            for k in keys[1:]:
+                parent[root(k)] = root(keys[0])
+        index = {}
+        self.blocks = []
+        self.block_of = {}
+        for var in self.members:
+            keys = self.var_keys[var]
+            b = index.setdefault(root(keys[0]) if keys else ("course", var), len(index))
+            if b == len(self.blocks):
+                self.blocks.append(([], []))
+            self.blocks[b][0].append(var)
+            self.block_of[var] = b
+        for k in range(len(self.key_masks)):
+            if root(k) in index:
+                self.blocks[index[root(k)]][1].append(k)
+
+    def domain_changed(self, var, old, new):
+        b = self.block_of.get(var)
+        if b is not None:
+            self.stale.add(b)
+
+    def _take(self, var, k):
+        self.matched[var] = k
+        self.load[k] += 1
+        self.holders[k].add(var)
+
+    def _release(self, var):
+        k = self.matched.pop(var)
+        self.load[k] -= 1
+        self.holders[k].discard(var)
+
+    def _augment(self, var, keys, seen):
+        for k in keys[var]:
+            if k in seen:
+                continue
+            seen.add(k)
+            if self.load[k] < self.limit or any(self._augment(holder, keys, seen)
+                                                for holder in list(self.holders[k])):
+                if var in self.matched:
+                    self._release(var)
+                self._take(var, k)
+                return True
+        return False
+
+    def _live_keys(self, members, domains, assignment):
+        keys = {}
+        for var in members:
+            if var in assignment:
+                keys[var] = [self.key_of[assignment[var]]]
+            else:
+                mask = domains[var]
+                keys[var] = [k for k in self.var_keys[var] if mask & self.key_masks[k]]
+        return keys
+
+    def _reason(self, csp, members, assignment):
+        """Assigned courses behind the current domains of `members`."""
+        reason = set()
+        for var in members:
+            if var in assignment:
+                reason.add(var)
+            else:
+                reason |= csp.pruned_by(var, assignment)
+        return tuple(reason)
+
+    def propagate(self, csp, domains, assignment, var=None):
+        """
+        Filter `domains` (encoded, pruned through csp.prune) after `var` was
+        assigned. Returns False, with csp._failure set, if the members cannot
+        all be given a key within the limit.
+        """
+        if self.watching:
+            blocks = set(self.stale)
+            if var in self.block_of:
+                blocks.add(self.block_of[var])
+        else:
+            blocks = range(len(self.blocks))
+        for b in sorted(blocks):
+            if not self._filter(csp, domains, assignment, *self.blocks[b]):
+                return False
+            self.stale.discard(b)
+        return True
+
+    def _filter(self, csp, domains, assignment, members, block_keys):
+        keys = self._live_keys(members, domains, assignment)
+        for course in members:
+            if course in self.matched and self.matched[course] not in keys[course]:
+                self._release(course)
+        for course in members:
+            if course not in self.matched and not self._augment(course, keys, set()):
+                csp._failure = set(self._reason(csp, members, assignment))
+                return False
+
+        # Residual graph: course -> unused key, key -> course matched to it,
+        # key -> sink while below the limit, sink -> key while used.
+        n = len(members)
+        node = {k: n + i for i, k in enumerate(block_keys)}
+        sink = n + len(block_keys)
+        adjacency = [[] for _ in range(sink + 1)]
+        for i, course in enumerate(members):
+            matched = self.matched[course]
+            adjacency[node[matched]].append(i)
+            for k in keys[course]:
+                if k != matched:
+                    adjacency[i].append(node[k])
+        for k in block_keys:
+            load = self.load[k]
+            if load < self.limit:
+                adjacency[node[k]].append(sink)
+            if load > 0:
+                adjacency[sink].append(node[k])
+        component = _strongly_connected_components(adjacency)
+
+        reason = None
+        for i, course in enumerate(members):
+            if course in assignment:
+                continue
+            matched = self.matched[course]
+            removed = 0
+            for k in keys[course]:
+                if k != matched and component[i] != component[node[k]]:
+                    removed |= self.key_masks[k]
+            if removed:
+                if reason is None:
+                    reason = self._reason(csp, members, assignment)
+                csp.prune(domains, course, removed, reason)
+        return True
+
+
+class SlotAllDifferent(CardinalityConstraint):
+    """No two courses in the same (term, slot)."""
+
+    limit = 1
+    fields = ("term", "slot")
+
+    def key(self, value):
+        return value[0], value[1]
+
+
+class RoomCardinality(CardinalityConstraint):
+    """
+    At most `limit` courses per room key, where key_index picks
+    the key from resources.resource_keys: 0 is (term, building, room, day type)
+    as in room_capacity_constraint, 1 is (term, building, room) as in
+    room_diversity_constraint, 2 is (building, room).
+    """
+
+    KEY_FIELDS = (("term", "slot", "building", "room"), ("term", "building", "room"), ("building", "room"))
+
+    def __init__(self, key_index=0, limit=2, variables=None):
+        super().__init__(limit, variables)
+        self.key_index = key_index
+        self.fields = self.KEY_FIELDS[key_index]
+
+    def key(self, value):
+        return resource_keys(value)[self.key_index]
+
+
+def _strongly_connected_components(adjacency):
+    """Component number of every node of a graph given as adjacency lists (iterative Tarjan)."""
+    index = [None] * len(adjacency)
+    low = [0] * len(adjacency)
+    component = [None] * len(adjacency)
+    on_stack = [False] * len(adjacency)
+    stack = []
+    counter = 0
+    components = 0
+    for root in range(len(adjacency)):
+        if index[root] is not None:
+            continue
+        work = [(root, 0)]
+        while work:
+            node, edge = work.pop()
+            if edge == 0:
+                index[node] = low[node] = counter
+                counter += 1
+                stack.append(node)
+                on_stack[node] = True
+            recurse = False
+            neighbors = adjacency[node]
+            while edge < len(neighbors):
+                other = neighbors[edge]
+                edge += 1
+                if index[other] is None:
+                    work.append((node, edge))
+                    work.append((other, 0))
+                    recurse = True
+                    break
+                if on_stack[other]:
+                    low[node] = min(low[node], index[other])
+            if recurse:
+                continue
+            if low[node] == index[node]:
+                while True:
+                    other = stack.pop()
+                    on_stack[other] = False
+                    component[other] = components
+                    if other == node:
+                        break
+                components += 1
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+    return component
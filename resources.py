@@ -0,0 +1,81 @@
+from collections import Counter
+
+
+def day_type(slot):
+    if slot.startswith("MWF"):
+        return "MWF"
+    elif slot.startswith("TTH"):
+        return "TTH"
+    else:
+        return None
+
+
+def resource_keys(value):
+    """Counter keys occupied by one (term, slot, time_label, building, room, professor) value."""
+    term, slot, time_label, building, room, professor = value
+    return (term, building, room, day_type(slot)), (term, building, room), (building, room)
+
+
+class TrackedAssignment(dict):
+    """
+    Decoded assignment (var -> value tuple) that keeps room occupancy counters
+    up to date on every assign and unassign:
+
+    room_day_usage:  (term, building, room, day_type) -> courses
+    room_term_usage: (term, building, room) -> courses
+    room_usage:      (building, room) -> courses
+
+    Constraints and preferences read these in O(1) instead of scanning the
+    assignment. It is still a plain dict to code that does not know about it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self.room_day_usage = Counter()
+        self.room_term_usage = Counter()
+        self.room_usage = Counter()
+        for var, value in dict(*args, **kwargs).items():
+            self[var] = value
+
+    def _count(self, value, delta):
+        room_day, room_term, room = resource_keys(value)
+        self.room_day_usage[room_day] += delta
+        self.room_term_usage[room_term] += delta
+        self.room_usage[room] += delta
+
+    def __setitem__(self, var, value):
+        if var in self:
+            self._count(dict.__getitem__(self, var), -1)
+        dict.__setitem__(self, var, value)
+        self._count(value, 1)
+
+    def __delitem__(self, var):
+        self._count(dict.__getitem__(self, var), -1)
+        dict.__delitem__(self, var)
+
+    def pop(self, var, *default):
+        if var in self:
+            value = dict.__getitem__(self, var)
+            del self[var]
+            return value
+        return dict.pop(self, var, *default)
+
+    def clear(self):
+        dict.clear(self)
+        self.room_day_usage.clear()
+        self.room_term_usage.clear()
+        self.room_usage.clear()
+
+    def update(self, *args, **kwargs):
+        for var, value in dict(*args, **kwargs).items():
+            self[var] = value
+
+    def copy(self):
+        return dict(self)
+
+    def verify(self):
+        """Recount from scratch and check the incremental counters agree."""
+        fresh = TrackedAssignment(dict(self))
+        return (+self.room_day_usage == +fresh.room_day_usage
+                and +self.room_term_usage == +fresh.room_term_usage
+                and +self.room_usage == +fresh.room_usage)
@@ -0,0 +1,205 @@
+import logging
+import time
+
+from constraints import PrerequisiteIndex, ProfessorAvailability
+from csp import CSP
+
+logger = logging.getLogger(__name__)
+
+
+class SolverSession:
+    """
+    A CSP kept alive across small edits of the schedule.
+
+    The first solve() encodes the domains and applies the unary constraints
+    once; those filtered domains (`base`) and the last solution are kept. After
+    an edit (add_course, remove_value, update_availability, pin, unpin) only
+    the courses it affects are searched again: every other course keeps its
+    value from the last solution. If that restricted search fails, the free
+    region grows by the neighbors of the courses in it, up to the whole
+    problem, so an edit costs a full re-solve only when the old schedule
+    cannot be repaired locally.
+
+    Edits return (solution, metrics) like CSP.solve; metrics also hold
+    "repaired" (the number of courses searched again) and "rounds" (how many
+    times the region grew). Keyword arguments are passed to every CSP.solve.
+    """
+
+    def __init__(self, variables, domains, neighbors, constraints=None, prerequisites=None, course_term=None,
+                 preferences=None, **solve_kwargs):
+        self.csp = CSP(list(variables), dict(domains), {var: list(others) for var, others in neighbors.items()},
+                       dict(constraints or {}), dict(prerequisites or {}), dict(course_term or {}), preferences)
+        self.solve_kwargs = solve_kwargs
+        self.base = None  # var -> encoded domain after the unary constraints
+        self.pins = {}  # var -> encoded value it is pinned to
+        self.assignment = None  # var -> encoded value of the last solution
+        self.solution = None
+        self.metrics = None
+
+    @classmethod
+    def from_instance(cls, instance, preferences=None, **solve_kwargs):
+        """A session for a loader.Instance."""
+        return cls(*instance.csp_args(preferences), **solve_kwargs)
+
+    def _filter(self, variables):
+        """Recompute the base domains of `variables` from their unfiltered domains."""
+        csp = self.csp
+        for var in variables:
+            self.base[var] = csp.masks[var]
+        csp.node_consistency(self.base, variables)
+
+    def solve(self):
+        """Solve the whole problem, ignoring the previous solution."""
+        csp = self.csp
+        if self.base is None:
+            self.base = dict(csp.masks)
+            csp.node_consistency(self.base)
+        solution, metrics = self._search(set(csp.variables))
+        metrics["rounds"] = 1
+        self._keep(solution, metrics)
+        return solution, metrics
+
+    def _search(self, region):
+        """CSP.solve with the courses outside `region` fixed to their values in the last solution."""
+        csp = self.csp
+        domains = {}
+        for var in csp.variables:
+            if var in region:
+                domains[var] = self.base[var]
+            else:
+                domains[var] = 1 << self.assignment[var]
+            if var in self.pins:
+                domains[var] &= 1 << self.pins[var]
+        solution, metrics = csp.solve(domains=domains, **self.solve_kwargs)
+        metrics["repaired"] = len(region)
+        return solution, metrics
+
+    def _keep(self, solution, metrics):
+        self.solution = solution
+        self.metrics = metrics
+        self.assignment = None
+        if solution is not None:
+            self.assignment = {var: self.csp.encoding.encode(value) for var, value in solution.items()}
+
+    def repair(self, affected):
+        """
+        Search again for the courses in `affected`, keeping the others fixed and
+        widening the region through the neighbors while that fails.
+        """
+        csp = self.csp
+        if self.assignment is None:
+            return self.solve()
+        start_time = time.time()
+        region = set(affected)
+        rounds = 0
+        while True:
+            rounds += 1
+            solution, metrics = self._search(region)
+            if solution is not None or len(region) == len(csp.variables):
+                break
+            grown = region | {n for var in region for n in csp.neighbors.get(var, []) if n in self.base}
+            region = grown if grown != region else set(csp.variables)
+            logger.debug("Repair failed; widening the region to %d courses", len(region))
+        metrics["rounds"] = rounds
+        metrics["time_taken"] = time.time() - start_time
+        self._keep(solution, metrics)
+        return solution, metrics
+
+    def _changed(self, variables):
+        """The courses among `variables` whose value in the last solution is no longer allowed."""
+        if self.assignment is None:
+            return set(variables)
+        changed = set()
+        for var in variables:
+            value = self.assignment.get(var)
+            if value is None or not self.base[var] >> value & 1 or self.pins.get(var, value) != value:
+                changed.add(var)
+        return changed
+
+    def add_course(self, course, domain, term, prerequisites=None):
+        """
+        Add a course with its `domain` (iterable of value tuples) in `term`.
+        `prerequisites` lists its requirements as in CSP; the course becomes a
+        neighbor of every course of its term and of its prerequisites. The
+        term bounds of the prerequisite chains are recomputed, so courses on
+        them may have to move too.
+        """
+        csp = self.csp
+        if course in csp.masks:
+            raise ValueError(f"Course {course} is already scheduled")
+        course_term = dict(csp.course_term)
+        course_term[course] = term
+        requirements = dict(csp.prerequisites)
+        if prerequisites is not None:
+            requirements[course] = list(prerequisites)
+        indexes = {id(c): PrerequisiteIndex(course_term, requirements, c.term_order)
+                   for c in csp.constraints.values() if isinstance(c, PrerequisiteIndex)}
+
+        csp.course_term = course_term
+        csp.prerequisites = requirements
+        csp.variables.append(course)
+        csp.domains[course] = domain
+        csp.masks[course] = csp.encoding.encode_domain(domain)
+        linked = {var for var in csp.variables if var != course and course_term.get(var) == term}
+        for other, reqs in requirements.items():
+            for req in reqs:
+                alternatives = req if isinstance(req, (list, tuple)) else [req]
+                if other == course:
+                    linked.update(alt for alt in alternatives if alt in csp.masks)
+                elif course in alternatives and other in csp.masks:
+                    linked.add(other)
+        csp.neighbors[course] = sorted(linked)
+        for other in linked:
+            csp.neighbors.setdefault(other, []).append(course)
+        for name, c in csp.constraints.items():
+            if id(c) in indexes:
+                csp.constraints[name] = indexes[id(c)]
+            elif id(getattr(c, "__self__", None)) in indexes:
+                # A bound method of the index, such as within_term_bounds.
+                csp.constraints[name] = getattr(indexes[id(c.__self__)], c.__name__)
+        csp.unary_constraints = {name: c for name, c in csp.constraints.items() if getattr(c, "unary", False)}
+        chained = {var for index in indexes.values() for var in index.variables if var in csp.masks}
+        if self.base is not None:
+            self._filter(chained | {course})
+        return self.repair(self._changed(chained) | {course})
+
+    def _value_id(self, course, value):
+        """The id of `value` in the domain of `course`, without growing the shared encoding."""
+        value_id = self.csp.encoding._ids.get(value)
+        if value_id is None or not self.csp.masks.get(course, 0) >> value_id & 1:
+            raise ValueError(f"{value!r} is not in the domain of {course}")
+        return value_id
+
+    def remove_value(self, course, value):
+        """Take the value tuple `value` out of the domain of `course`."""
+        csp = self.csp
+        bit = 1 << self._value_id(course, value)
+        csp.masks[course] &= ~bit
+        if self.base is not None:
+            self.base[course] &= ~bit
+        return self.repair(self._changed([course]))
+
+    def update_availability(self, professor, term, times):
+        """Replace the time labels at which `professor` can teach in `term`."""
+        csp = self.csp
+        tables = [c for c in csp.constraints.values() if isinstance(c, ProfessorAvailability)]
+        if not tables:
+            raise ValueError("The problem has no ProfessorAvailability constraint")
+        for constraint in tables:
+            # The table may be the caller's (Instance.availability, PROFESSOR_AVAILABILITY): edit a copy.
+            availability = dict(constraint.availability)
+            availability[professor] = dict(availability.get(professor, {}), **{term: list(times)})
+            constraint.availability = availability
+        courses = [var for var in csp.variables if csp.course_term.get(var) == term]
+        if self.base is not None:
+            self._filter(courses)
+        return self.repair(self._changed(courses))
+
+    def pin(self, course, value):
+        """Fix `course` to the value tuple `value` until unpin(course)."""
+        self.pins[course] = self._value_id(course, value)
+        return self.repair(self._changed([course]))
+
+    def unpin(self, course):
+        self.pins.pop(course, None)
+        return self.repair(set())
@@ -0,0 +1,60 @@
+from collections import Counter
+
+from encoding import BUILDING, FIELDS, ROOM, iter_bits
+
+
+class RoomSymmetry:
+    """
+    Value precedence over interchangeable rooms, for CSP.iter_solutions.
+
+    Two (building, room) pairs are interchangeable when swapping them maps
+    every domain onto itself; they are grouped into classes, each in a fixed
+    order. A course may then only take a room already used by an assigned
+    course, or the first unused room of its class. Along every branch the
+    used rooms of a class stay a prefix of it, so of all the schedules that
+    only differ by a permutation of interchangeable rooms, exactly one is
+    searched.
+
+    This is only sound when no constraint singles out a room, which holds for
+    constraints.py and propagators.py. Preferences do single out rooms and are
+    ignored: the schedule kept for a class is not its preferred one.
+    """
+
+    def __init__(self, encoding, variables, domains):
+        codes = encoding.codes
+        others = [field for field in range(len(FIELDS)) if field not in (BUILDING, ROOM)]
+        signatures = {}  # room -> {var: the other fields of the var's values with that room}
+        for var in variables:
+            by_room = {}
+            for value in iter_bits(domains[var]):
+                room = (codes[BUILDING][value], codes[ROOM][value])
+                by_room.setdefault(room, set()).add(tuple(codes[field][value] for field in others))
+            for room, rest in by_room.items():
+                signatures.setdefault(room, {})[var] = frozenset(rest)
+        classes = {}
+        for room in sorted(signatures):
+            classes.setdefault(frozenset(signatures[room].items()), []).append(room)
+        self.classes = list(classes.values())
+        self.position = {room: (i, j) for i, rooms in enumerate(self.classes) for j, room in enumerate(rooms)}
+        self.introduced = [0] * len(self.classes)  # per class, how many of its rooms are in use
+        self.used = Counter()
+        self.codes = codes
+
+    def _room(self, value):
+        return self.codes[BUILDING][value], self.codes[ROOM][value]
+
+    def allowed(self, value):
+        i, j = self.position[self._room(value)]
+        return j <= self.introduced[i]
+
+    def use(self, value):
+        room = self._room(value)
+        self.used[room] += 1
+        if self.used[room] == 1:
+            self.introduced[self.position[room][0]] += 1
+
+    def release(self, value):
+        room = self._room(value)
+        self.used[room] -= 1
+        if self.used[room] == 0:
+            self.introduced[self.position[room][0]] -= 1
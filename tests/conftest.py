@@ -0,0 +1,147 @@
+"""
+Shared helpers: seeded small instances with a brute-force reference, and
+the paths of the bundled data.
+"""
+import itertools
+import os
+import random
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import constraints as C  # noqa: E402
+import preferences as P  # noqa: E402
+from csp import CSP  # noqa: E402
+from propagators import RoomCardinality, SlotAllDifferent  # noqa: E402
+
+DATA_DIR = os.path.join(ROOT, "data")
+
+TERMS = ("Term1", "Term2")
+TIMES = ("8AM", "9AM", "10AM", "11AM", "1PM", "2PM")
+PROFESSORS = ("Smith", "Williams", "Johnson", "Brown", "Anderson", "Taylor")
+PREFIXES = ("CMPUT", "MATH", "STAT", "PHYS", "CHEM", "ENGL", "BIOL")
+
+PREFERENCES = {
+    "later_start_time": P.prefer_later_start_times,
+    "professor_preference": P.prefer_professor,
+    "building_room_preference": P.prefer_building_room,
+    "room_diversity_preference": P.prefer_room_diversity_incremental,
+}
+
+
+def build(seed, n=4, slots=4, global_constraints=False):
+    """A small random instance as CSP arguments, and its hard constraints as plain functions."""
+    rng = random.Random(seed)
+    variables = [f"{rng.choice(PREFIXES)}{100 + i}" for i in range(n)]
+    course_term = {var: rng.choice(TERMS) for var in variables}
+    domains = {}
+    for var in variables:
+        days = rng.choice(("MWF", "TTH"))
+        domains[var] = [(course_term[var], f"{days}{i}", TIMES[i], building, "101", professor)
+                        for i in rng.sample(range(len(TIMES)), slots) for building in ("CCIS", "ETLC")
+                        for professor in PROFESSORS]
+    prerequisites = {}
+    first = [var for var in variables if course_term[var] == "Term1"]
+    for var in variables:
+        if course_term[var] == "Term2" and first and rng.random() < 0.5:
+            prerequisites[var] = [rng.choice(first)] if rng.random() < 0.7 else [first[:2]]
+    neighbors = {var: {other for other in variables if other != var and course_term[other] == course_term[var]}
+                 for var in variables}
+    for var, reqs in prerequisites.items():
+        for req in reqs:
+            for other in (req if isinstance(req, list) else [req]):
+                neighbors[var].add(other)
+                neighbors[other].add(var)
+    neighbors = {var: sorted(others) for var, others in neighbors.items()}
+
+    index = C.PrerequisiteIndex(course_term, prerequisites)
+    constraints = {
+        "prerequisite": index,
+        "bounds": index.within_term_bounds,
+        "prof_availability": C.professor_availability_constraint,
+        "prof_specialty": C.professor_specialty_constraint,
+        "room_capacity": C.room_capacity_constraint_incremental,
+        "room_diversity": C.room_diversity_constraint_incremental,
+    }
+    if global_constraints:
+        constraints["room_capacity"] = RoomCardinality(0, 2)
+        constraints["room_diversity"] = RoomCardinality(1, 2)
+        constraints["slots"] = SlotAllDifferent()
+    reference = [C.prerequisite_constraint_transitive, C.professor_availability_constraint,
+                 C.professor_specialty_constraint, C.room_capacity_constraint, C.room_diversity_constraint]
+    if global_constraints:
+        reference.append(lambda var, value, assignment, course_term, prerequisites: all(
+            other[:2] != value[:2] for other in assignment.values()))
+    args = (variables, domains, neighbors, constraints, prerequisites, course_term, PREFERENCES)
+    return args, reference
+
+
+def brute_force(args, reference):
+    """Every solution of the instance, by enumerating the unary-filtered domains."""
+    variables, domains, neighbors, _, prerequisites, course_term, _ = args
+    candidates = [[value for value in domains[var]
+                   if C.professor_availability_constraint(var, value, {}, course_term, prerequisites)
+                   and C.professor_specialty_constraint(var, value, {}, course_term, prerequisites)]
+                  for var in variables]
+    solutions = []
+    for combination in itertools.product(*candidates):
+        solution = dict(zip(variables, combination))
+        if any(solution[var][:2] == solution[other][:2] for var in variables for other in neighbors[var]):
+            continue
+        if all(check(var, value, {other: v for other, v in solution.items() if other != var},
+                     course_term, prerequisites)
+               for var, value in solution.items() for check in reference):
+            solutions.append(solution)
+    return solutions
+
+
+def is_solution(solution, args, reference):
+    variables, domains, neighbors, _, prerequisites, course_term, _ = args
+    assert set(solution) == set(variables)
+    for var, value in solution.items():
+        assert value in domains[var]
+        assert all(solution[other][:2] != value[:2] for other in neighbors[var])
+        rest = {other: v for other, v in solution.items() if other != var}
+        assert all(check(var, value, rest, course_term, prerequisites) for check in reference)
+    return True
+
+
+INSTANCES = [(seed, n, global_constraints) for seed in range(12) for n in (3, 4, 5, 6)
+             for global_constraints in (False, True)]
+
+
+@pytest.fixture(scope="session")
+def references():
+    """Brute-force solutions of every case of INSTANCES."""
+    return {case: brute_force(*build(case[0], case[1], global_constraints=case[2])) for case in INSTANCES}
+
+
+def check_feasibility(references, **solve_kwargs):
+    """Solve every case of INSTANCES and check the result against the brute-force solutions."""
+    for case, solutions in references.items():
+        args, reference = build(case[0], case[1], global_constraints=case[2])
+        solution, metrics = CSP(*args).solve(**solve_kwargs)
+        assert (solution is not None) == bool(solutions), case
+        assert metrics["status"] == ("solved" if solutions else "infeasible")
+        if solution is not None:
+            assert is_solution(solution, args, reference)
+
+
+def pigeonhole(courses, term="Term1"):
+    """`courses` courses of one term that must take different slots, with one slot too few."""
+    variables = [f"{term}C{i}" for i in range(courses)]
+    domains = {var: [(term, f"MWF{slot}", "8AM", "CCIS", str(100 + room), "Smith")
+                     for slot in range(courses - 1) for room in range(2)] for var in variables}
+    neighbors = {var: [other for other in variables if other != var] for var in variables}
+    return variables, domains, neighbors, {}, {}, {var: term for var in variables}, {}
+
+
+def two_terms(hard=9, easy=4):
+    """A pigeonhole problem in Term1 and an easy one in Term2: two components."""
+    hard, easy = pigeonhole(hard), pigeonhole(easy, "Term2")
+    easy[1].update({var: values + [("Term2", "TTH1", "8AM", "CCIS", "100", "Smith")]
+                    for var, values in easy[1].items()})
+    return tuple({**a, **b} if isinstance(a, dict) else a + b for a, b in zip(hard, easy))
@@ -0,0 +1,43 @@
+import pytest
+
+from conftest import check_feasibility, pigeonhole, two_terms
+from csp import CSP
+from heuristics import luby, restart_cutoffs
+
+CONFIGS = [
+    {"backjumping": False},
+    {"learn_nogoods": False, "backjumping": False},
+    {"trail": False, "backjumping": False, "learn_nogoods": False},
+    {"variable_ordering": "dom/wdeg"},
+    {"restarts": "luby", "restart_base": 2, "seed": 1},
+    {"restarts": "geometric", "restart_base": 3, "seed": 2, "variable_ordering": "dom/wdeg"},
+]
+
+
+@pytest.mark.parametrize("config", CONFIGS, ids=str)
+def test_feasibility(config, references):
+    check_feasibility(references, **config)
+
+
+def test_restart_cutoffs():
+    assert [luby(i) for i in range(15)] == [1, 1, 2, 1, 1, 2, 4, 1, 1, 2, 1, 1, 2, 4, 8]
+    luby_cutoffs, geometric = restart_cutoffs("luby", 10), restart_cutoffs("geometric", 10, 1.5)
+    assert [next(luby_cutoffs) for _ in range(4)] == [10, 10, 20, 10]
+    assert [next(geometric) for _ in range(4)] == [10, 15, 22, 33]
+    with pytest.raises(ValueError):
+        next(restart_cutoffs("linear"))
+
+
+def test_backjumping_skips_the_independent_term():
+    # Term2 is assigned first (smaller domains); Term1's failures do not depend on it.
+    _, jumping = CSP(*two_terms(5, 4)).solve()
+    _, chronological = CSP(*two_terms(5, 4)).solve(backjumping=False)
+    assert jumping["status"] == chronological["status"] == "infeasible"
+    assert jumping["backjumps"] > 0 and chronological["backjumps"] == 0
+    assert (jumping["nodes"], chronological["nodes"]) == (253, 604)
+
+
+def test_restarts_keep_the_search_complete():
+    _, metrics = CSP(*pigeonhole(5)).solve(restarts="luby", restart_base=10, seed=0)
+    assert metrics["status"] == "infeasible"
+    assert metrics["restarts"] > 0
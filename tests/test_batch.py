@@ -0,0 +1,41 @@
+import os
+
+import pytest
+
+from batch import PREFERENCES, Catalog, solve_batch
+from conftest import DATA_DIR
+from csp import CSP
+from loader import Student, load_instance, read_students
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    return Catalog(load_instance(DATA_DIR), PREFERENCES)
+
+
+def students():
+    yield from read_students(os.path.join(DATA_DIR, "students.csv"))
+    yield Student("unknown", ["CHEM101", "NOPE101"])
+
+
+def test_serial_plans_match_separate_solves(catalog):
+    plans = {student_id: (solution, metrics) for student_id, solution, metrics in solve_batch(catalog, students())}
+    assert list(plans) == ["s1", "s2", "s3", "s4", "unknown"]
+    for student in read_students(os.path.join(DATA_DIR, "students.csv")):
+        expected, metrics = CSP(*catalog.view(student).csp_args(PREFERENCES)).solve()
+        assert plans[student.student_id][0] == expected
+        assert plans[student.student_id][1]["status"] == metrics["status"] == "solved"
+    solution, metrics = plans["unknown"]
+    assert solution is None and "NOPE101" in metrics["error"]
+
+
+def test_workers_match_the_serial_plans(catalog):
+    serial = {student_id: solution for student_id, solution, _ in solve_batch(catalog, students())}
+    parallel = {student_id: solution for student_id, solution, _ in solve_batch(catalog, students(), workers=2)}
+    assert parallel == serial
+
+
+def test_solve_kwargs_reach_every_plan(catalog):
+    for student_id, solution, metrics in solve_batch(catalog, students(), node_limit=3):
+        if student_id != "unknown":
+            assert solution is None and metrics["status"] == "node_limit", student_id
@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+import benchmark
+from benchmark import compare, fits, generate_instance, term_capacity
+
+
+def record(case, wall_time, nodes=10, solved=True):
+    return {"id": case, "wall_time": wall_time, "nodes": nodes, "solved": solved}
+
+
+def test_compare():
+    baseline = [record("slower", 1.0), record("faster", 1.0), record("changed", 1.0), record("same", 1.0)]
+    results = [record("slower", 1.5), record("faster", 0.5), record("changed", 1.05, nodes=12),
+               record("same", 1.05), record("new", 1.0)]
+    rows, regressions = compare(results, baseline, threshold=0.1)
+    assert [(row[0], row[4]) for row in rows] == [("slower", "regression"), ("faster", "speedup"),
+                                                  ("changed", "search changed"), ("same", "ok"), ("new", "new")]
+    assert regressions == 1
+    assert compare(results, baseline, threshold=1.0)[1] == 0
+
+
+def test_main_exit_status(tmp_path, monkeypatch, capsys):
+    grid = {"courses": [4], "terms": [2], "rooms": [2], "professors": [6], "depth": [1], "tightness": [0.0],
+            "booked": [0.0]}
+    monkeypatch.setitem(benchmark.GRIDS, "tiny", grid)
+    output, baseline = str(tmp_path / "results.json"), str(tmp_path / "baseline.json")
+    args = ["--grid", "tiny", "--seeds", "2", "--no-memory", "--output", output]
+    assert benchmark.main(args + ["--save-baseline", baseline]) == 0
+    with open(baseline) as f:
+        report = json.load(f)
+    assert len(report["results"]) == 2 and all(r["solved"] for r in report["results"])
+    for r in report["results"]:
+        r["wall_time"] = 1e-9
+    with open(baseline, "w") as f:
+        json.dump(report, f)
+    assert benchmark.main(args + ["--baseline", baseline]) == 1
+    assert "2 regression(s)" in capsys.readouterr().out
+    for r in report["results"]:
+        r["wall_time"] = 1e9
+    with open(baseline, "w") as f:
+        json.dump(report, f)
+    assert benchmark.main(args + ["--baseline", baseline]) == 0
+
+
+def test_generated_instances_fit():
+    assert not fits({"courses": 2 * term_capacity(4) + 1, "terms": 2, "rooms": 4})
+    with pytest.raises(ValueError):
+        generate_instance(0, courses=2 * term_capacity(4) + 1, terms=2, rooms=4)
+    for params in benchmark.grid_cases(benchmark.GRIDS["tight"]):
+        instance = generate_instance(0, **params)
+        assert len(instance.variables) == params["courses"]
@@ -0,0 +1,50 @@
+import functools
+import os
+
+from conftest import DATA_DIR
+from constraints import unary_constraint
+from csp import CSP
+from domaincache import DomainCache, fingerprint
+from loader import load_instance
+
+
+def banning(slot):
+    @unary_constraint
+    def not_in_slot(var, value, assignment, course_term=None, prerequisites=None):
+        return value[1] != slot
+    return not_in_slot
+
+
+def _csp(instance, extra):
+    args = list(instance.csp_args())
+    args[3] = dict(args[3], extra=extra)
+    return CSP(*args)
+
+
+def _slots(domains, csp):
+    return {value[1] for mask in domains.values() for value in csp.encoding.decode_domain(mask)}
+
+
+def test_closures_over_different_values_are_not_confused(tmp_path):
+    instance = load_instance(DATA_DIR)
+    cache = DomainCache(str(tmp_path))
+    first = _csp(instance, banning("MWF1"))
+    second = _csp(instance, banning("MWF2"))
+    assert fingerprint(first) != fingerprint(second)
+    assert fingerprint(first) == fingerprint(_csp(instance, banning("MWF1")))
+
+    first.domain_cache = second.domain_cache = cache
+    assert "MWF1" not in _slots(first.preprocess(), first)
+    slots = _slots(second.preprocess(), second)
+    assert "MWF2" not in slots and "MWF1" in slots
+    assert cache.hits == 0 and cache.misses == 2
+
+
+def test_uncacheable_constraints_skip_the_cache(tmp_path):
+    instance = load_instance(DATA_DIR)
+    csp = _csp(instance, unary_constraint(functools.partial(lambda slot, var, value, *rest: value[1] != slot,
+                                                            "MWF1")))
+    csp.domain_cache = DomainCache(str(tmp_path))
+    assert fingerprint(csp) is None
+    assert "MWF1" not in _slots(csp.preprocess(), csp)
+    assert not os.listdir(tmp_path)
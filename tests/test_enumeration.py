@@ -0,0 +1,60 @@
+import itertools
+import threading
+
+from benchmark import generate_instance
+from conftest import build, is_solution
+from csp import CSP
+from encoding import BUILDING, ROOM
+from symmetry import RoomSymmetry
+
+
+def test_counts(references):
+    for case, solutions in references.items():
+        args, reference = build(case[0], case[1], global_constraints=case[2])
+        assert CSP(*args).count_solutions() == len(solutions), case
+        enumerated = list(CSP(*args).iter_solutions())
+        assert len(enumerated) == len(solutions), case
+        assert all(is_solution(solution, args, reference) for solution in enumerated)
+        assert len({tuple(sorted(solution.items())) for solution in enumerated}) == len(enumerated)
+
+
+def test_enumeration_deeper_than_recursion_limit():
+    args = generate_instance(0, courses=1100, terms=110, rooms=6, professors=8).csp_args()
+    solutions = list(CSP(*args).iter_solutions(limit=1))
+    assert len(solutions) == 1 and len(solutions[0]) == 1100
+
+
+def orbit(solution, classes):
+    """A key shared by the schedules that only differ by a permutation of the rooms within `classes`."""
+    keys = []
+    for orders in itertools.product(*(itertools.permutations(rooms) for rooms in classes)):
+        rename = {room: new for rooms, order in zip(classes, orders) for room, new in zip(rooms, order)}
+        keys.append(tuple(sorted((var, value[:BUILDING] + rename.get(value[BUILDING:ROOM + 1], value[BUILDING:ROOM + 1])
+                                  + value[ROOM + 1:]) for var, value in solution.items())))
+    return min(keys)
+
+
+def test_symmetry_breaking(references):
+    for case, solutions in references.items():
+        args, reference = build(case[0], case[1], global_constraints=case[2])
+        csp = CSP(*args)
+        domains = csp.preprocess()
+        classes = [] if domains is None else \
+            [[(csp.encoding.labels[BUILDING][b], csp.encoding.labels[ROOM][r]) for b, r in rooms]
+             for rooms in RoomSymmetry(csp.encoding, csp.variables, domains).classes]
+        enumerated = list(CSP(*args).iter_solutions(symmetry_breaking=True))
+        assert all(is_solution(solution, args, reference) for solution in enumerated)
+        orbits = {orbit(solution, classes) for solution in solutions}
+        assert len({orbit(solution, classes) for solution in enumerated}) == len(enumerated) == len(orbits), case
+        assert CSP(*args).count_solutions(symmetry_breaking=True) == len(orbits), case
+
+
+def test_limit_and_cancel(references):
+    case = max(references, key=lambda case: len(references[case]))
+    args, _ = build(case[0], case[1], global_constraints=case[2])
+    assert len(list(CSP(*args).iter_solutions(limit=3))) == 3
+    cancel = threading.Event()
+    solutions = CSP(*args).iter_solutions(cancel_event=cancel)
+    next(solutions)
+    cancel.set()
+    assert list(solutions) == []
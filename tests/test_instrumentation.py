@@ -0,0 +1,77 @@
+import csv
+import json
+
+import pytest
+
+from benchmark import PREFERENCES
+from conftest import DATA_DIR, pigeonhole
+from csp import CSP
+from instrumentation import Instrumentation
+from loader import load_instance
+
+
+@pytest.fixture(scope="module")
+def profiled():
+    """An Instrumentation of a solve of the bundled instance, with the solve's result."""
+    instrumentation = Instrumentation()
+    solution, metrics = CSP(*load_instance(DATA_DIR).csp_args(PREFERENCES)).solve(instrumentation=instrumentation)
+    return instrumentation, solution, metrics
+
+
+def test_summary(profiled):
+    instrumentation, solution, metrics = profiled
+    plain, _ = CSP(*load_instance(DATA_DIR).csp_args(PREFERENCES)).solve()
+    assert solution == plain
+    summary = metrics["instrumentation"]
+    assert sum(summary["depth_histogram"].values()) == metrics["nodes"]
+    assert [phase["name"] for phase in summary["phases"]] == \
+        ["node_consistency", "ac3", "global_propagation", "preprocess", "search", "reporting"]
+    assert {"variable_selection", "value_ordering", "propagation"} <= set(summary["timers"])
+    assert summary["constraints"]["prerequisite"]["calls"] > 0
+    assert 0.0 <= summary["propagation_effectiveness"] <= 1.0
+
+
+def test_undo_is_timed_in_trail_mode():
+    _, metrics = CSP(*pigeonhole(5)).solve(instrumentation=True)
+    summary = metrics["instrumentation"]
+    assert summary["timers"]["undo"]["calls"] > 0
+    assert summary["values_pruned"] > 0
+    _, metrics = CSP(*pigeonhole(5)).solve(instrumentation=True, trail=False)
+    assert "undo" not in metrics["instrumentation"]["timers"]
+
+
+def test_json_export(profiled, tmp_path):
+    instrumentation, _, metrics = profiled
+    instrumentation.to_json(str(tmp_path / "profile.json"))
+    with open(tmp_path / "profile.json") as f:
+        exported = json.load(f)
+    assert exported == json.loads(json.dumps(metrics["instrumentation"]))
+
+
+def test_csv_export(profiled, tmp_path):
+    instrumentation, _, metrics = profiled
+    instrumentation.to_csv(str(tmp_path / "profile.csv"))
+    with open(tmp_path / "profile.csv", newline="") as f:
+        rows = list(csv.DictReader(f))
+    summary = metrics["instrumentation"]
+    assert {row["name"]: int(row["calls"]) for row in rows if row["kind"] == "constraint"} == \
+        {name: stats["calls"] for name, stats in summary["constraints"].items()}
+    assert [row["name"] for row in rows if row["kind"] == "phase"] == [phase["name"] for phase in summary["phases"]]
+    assert sum(int(row["calls"]) for row in rows if row["kind"] == "depth") == metrics["nodes"]
+
+
+def test_chrome_trace_export(profiled, tmp_path):
+    instrumentation, _, metrics = profiled
+    instrumentation.to_chrome_trace(str(tmp_path / "trace.json"))
+    with open(tmp_path / "trace.json") as f:
+        trace = json.load(f)
+    events = trace["traceEvents"]
+    assert sorted(event["name"] for event in events) == sorted(name for name, _, _ in instrumentation.phases)
+    assert all(event["ph"] == "X" and event["dur"] >= 0 for event in events)
+    assert [event["ts"] for event in events] == sorted(event["ts"] for event in events)
+    assert trace["otherData"]["values_tried"] == metrics["instrumentation"]["values_tried"]
+
+
+def test_not_supported_with_workers():
+    with pytest.raises(ValueError):
+        CSP(*pigeonhole(4)).solve(instrumentation=True, workers=2)
@@ -0,0 +1,67 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from benchmark import PREFERENCES
+from conftest import DATA_DIR, pigeonhole
+from csp import CSP
+from loader import load_instance
+
+
+def assert_partial(metrics, args):
+    """metrics["partial"] is a non-empty schedule of some courses, in different slots."""
+    partial = metrics["partial"]
+    assert partial and set(partial) <= set(args[0])
+    assert all(value in args[1][var] for var, value in partial.items())
+    assert len({value[:2] for value in partial.values()}) == len(partial)
+
+
+def test_node_limit():
+    args = pigeonhole(7)
+    solution, metrics = CSP(*args).solve(node_limit=50)
+    assert solution is None
+    assert metrics["status"] == "node_limit" and metrics["nodes"] == 50
+    assert_partial(metrics, args)
+
+
+def test_time_limit():
+    args = pigeonhole(10)
+    start = time.monotonic()
+    solution, metrics = CSP(*args).solve(time_limit=0.2)
+    assert time.monotonic() - start < 2
+    assert solution is None and metrics["status"] == "time_limit"
+    assert_partial(metrics, args)
+
+
+def test_cancel_event():
+    cancel = threading.Event()
+    cancel.set()
+    solution, metrics = CSP(*pigeonhole(7)).solve(cancel_event=cancel)
+    assert solution is None
+    assert metrics["status"] == "cancelled" and metrics["cancelled"]
+
+
+def test_optimize_keeps_the_incumbent():
+    solution, metrics = CSP(*load_instance(DATA_DIR).csp_args(PREFERENCES)).solve(optimize=True, node_limit=30)
+    assert metrics["status"] == "node_limit" and not metrics["optimal"]
+    assert solution is not None and metrics["best_score"] is not None
+    assert "partial" not in metrics
+
+
+def test_solve_async():
+    solution, metrics = asyncio.run(CSP(*load_instance(DATA_DIR).csp_args(PREFERENCES)).solve_async())
+    assert solution is not None and metrics["status"] == "solved"
+
+    cancel = threading.Event()
+
+    async def timed_out():
+        await asyncio.wait_for(CSP(*pigeonhole(12)).solve_async(cancel_event=cancel), timeout=0.2)
+
+    start = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(timed_out())
+    # The search was cancelled and awaited, not left running.
+    assert cancel.is_set()
+    assert time.monotonic() - start < 5
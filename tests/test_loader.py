@@ -0,0 +1,61 @@
+import json
+import os
+
+import pytest
+
+from conftest import DATA_DIR
+from csp import CSP
+from loader import TABLES, load_instance, read_rows
+
+FIELDS = ("variables", "course_term", "days", "slots", "rooms", "professors", "availability", "specialties",
+          "prerequisites")
+
+
+def json_rows(name):
+    """The rows of a bundled CSV table, with list fields as JSON lists."""
+    rows = list(read_rows(os.path.join(DATA_DIR, name + ".csv")))
+    for row in rows:
+        if "specialties" in row:
+            row["specialties"] = row["specialties"].split(";")
+        if "requires" in row:
+            row["requires"] = row["requires"].split("|")
+    return rows
+
+
+def assert_same_instance(instance, expected):
+    for field in FIELDS:
+        assert getattr(instance, field) == getattr(expected, field), field
+    assert {var: list(domain) for var, domain in instance.domains.items()} == \
+        {var: list(domain) for var, domain in expected.domains.items()}
+
+
+def test_jsonl_tables(tmp_path):
+    for name in TABLES:
+        with open(tmp_path / (name + ".jsonl"), "w") as f:
+            for row in json_rows(name):
+                f.write(json.dumps(row) + "\n\n")
+    assert_same_instance(load_instance(str(tmp_path)), load_instance(DATA_DIR))
+
+
+def test_json_file(tmp_path):
+    path = tmp_path / "instance.json"
+    with open(path, "w") as f:
+        json.dump({name: json_rows(name) for name in TABLES}, f)
+    instance = load_instance(str(path))
+    assert_same_instance(instance, load_instance(DATA_DIR))
+    solution, metrics = CSP(*instance.csp_args()).solve()
+    assert metrics["status"] == "solved"
+
+
+def test_domains_are_generated():
+    instance = load_instance(DATA_DIR)
+    domain = instance.domains[instance.variables[0]]
+    assert len(domain) == len(list(domain)) == \
+        len(instance.slots[instance.days[instance.variables[0]]]) * len(instance.rooms) * len(instance.professors)
+
+
+def test_bad_tables(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        load_instance(str(tmp_path))
+    with pytest.raises(ValueError):
+        list(read_rows(str(tmp_path / "courses.xml")))
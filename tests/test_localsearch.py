@@ -0,0 +1,43 @@
+import threading
+
+import pytest
+
+from conftest import build, is_solution, pigeonhole
+from csp import CSP
+
+
+def test_finds_schedules(references):
+    steps = 0
+    for case, solutions in references.items():
+        if not solutions:
+            continue
+        args, reference = build(case[0], case[1], global_constraints=case[2])
+        solution, metrics = CSP(*args).solve(method="local", seed=case[0], max_steps=2000)
+        assert metrics["status"] == "solved" and metrics["conflicts"] == 0, case
+        assert is_solution(solution, args, reference)
+        steps += metrics["steps"]
+    assert steps > 0
+
+
+def test_gives_up_on_infeasible_problems():
+    lows = []
+    solution, metrics = CSP(*pigeonhole(5)).solve(method="local", seed=0, max_steps=200,
+                                                  on_incumbent=lambda assignment, conflicts, elapsed:
+                                                  lows.append(conflicts))
+    assert solution is None
+    assert metrics["status"] == "step_limit" and metrics["steps"] == 200
+    assert metrics["best_conflicts"] == lows[-1] > 0
+    assert lows == sorted(lows, reverse=True)
+    _, metrics = CSP(*pigeonhole(5)).solve(method="local", seed=0, max_steps=10 ** 9, time_limit=0.05)
+    assert metrics["status"] == "time_limit" and metrics["timed_out"]
+    cancel = threading.Event()
+    cancel.set()
+    _, metrics = CSP(*pigeonhole(5)).solve(method="local", seed=0, cancel_event=cancel)
+    assert metrics["status"] == "cancelled"
+
+
+def test_rejects_optimize_mode():
+    with pytest.raises(ValueError):
+        CSP(*pigeonhole(4)).solve(method="local", optimize=True)
+    with pytest.raises(ValueError):
+        CSP(*pigeonhole(4)).solve(method="tabu")
@@ -0,0 +1,47 @@
+import pytest
+
+from conftest import check_feasibility, pigeonhole
+from csp import CSP
+from nogoods import NoGoodStore
+
+
+@pytest.mark.parametrize("config", [{"learn_nogoods": False}, {"nogood_capacity": 3}, {"nogood_max_size": 2}],
+                         ids=str)
+def test_feasibility(config, references):
+    check_feasibility(references, **config)
+
+
+def test_store_evicts_the_least_recently_used():
+    store = NoGoodStore(capacity=2)
+    first = store.add([("A", 1), ("B", 2)])
+    second = store.add([("C", 3)])
+    store.touch(first)
+    store.add([("D", 4), ("A", 1)])
+    assert second not in store.nogoods and first in store.nogoods
+    assert not store.is_banned("C", 3)
+    store.add([("E", 5), ("F", 6)])
+    assert first not in store.nogoods
+    assert store.watching(("B", 2)) == []
+    assert len(store) == 2
+    assert store.metrics()["nogoods_evicted"] == 2
+
+
+def test_store_skips_large_nogoods():
+    store = NoGoodStore(max_size=2)
+    assert store.add([("A", 1), ("B", 2), ("C", 3)]) is None
+    assert store.add([("A", 1), ("B", 2)]) is not None
+    assert len(store) == store.learned == 1
+    assert store.watching(("C", 3)) == []
+
+
+def test_search_keeps_the_store_bounded():
+    csp = CSP(*pigeonhole(5))
+    _, metrics = csp.solve(nogood_capacity=5)
+    assert metrics["status"] == "infeasible"
+    assert metrics["nogoods_stored"] == 5
+    assert metrics["nogoods_evicted"] == metrics["nogoods_learned"] - 5 > 0
+    csp = CSP(*pigeonhole(5))
+    _, metrics = csp.solve(nogood_max_size=2)
+    assert metrics["status"] == "infeasible"
+    assert metrics["nogoods_learned"] > 0
+    assert all(len(literals) <= 2 for literals in csp.nogoods.nogoods.values())
@@ -0,0 +1,19 @@
+"""Branch-and-bound optimize mode against the best brute-force score."""
+import pytest
+
+from conftest import PREFERENCES, build, is_solution
+from csp import CSP
+from optimization import score_schedule
+
+
+@pytest.mark.parametrize("config", [{}, {"trail": False}, {"variable_ordering": "dom/wdeg"}], ids=str)
+def test_optimal_score(config, references):
+    for case, solutions in references.items():
+        if not solutions:
+            continue
+        args, reference = build(case[0], case[1], global_constraints=case[2])
+        solution, metrics = CSP(*args).solve(optimize=True, **config)
+        best = max(score_schedule(s, PREFERENCES) for s in solutions)
+        assert metrics["optimal"] and metrics["status"] == "optimal"
+        assert metrics["best_score"] == best == score_schedule(solution, PREFERENCES), case
+        assert is_solution(solution, args, reference)
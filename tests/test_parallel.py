@@ -0,0 +1,54 @@
+import pytest
+
+from benchmark import generate_instance
+from conftest import PREFERENCES, build, is_solution, pigeonhole, two_terms
+from csp import CSP
+from optimization import score_schedule
+
+
+@pytest.mark.parametrize("strategy", ["split", "portfolio"])
+def test_workers_share_the_node_limit(strategy):
+    solution, metrics = CSP(*pigeonhole(11)).solve(workers=2, strategy=strategy, node_limit=300)
+    assert solution is None
+    assert metrics["status"] == "node_limit"
+    assert metrics["nodes"] <= 300
+    assert all(m["status"] == "node_limit" for m in metrics["worker_metrics"])
+    assert len(metrics["partial"]) == max(len(m["partial"]) for m in metrics["worker_metrics"]) > 0
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_decomposed_solve_joins_partial_schedules(workers):
+    args = two_terms()
+    solution, metrics = CSP(*args).solve(decompose=True, workers=workers, node_limit=200)
+    assert solution is None
+    assert metrics["status"] == "node_limit"
+    assert metrics["nodes"] <= 200
+    partial = metrics["partial"]
+    assert {var for var in partial if var.startswith("Term2")} == {var for var in args[0] if var.startswith("Term2")}
+    assert any(var.startswith("Term1") for var in partial)
+
+
+@pytest.mark.parametrize("depth", [0, 2])
+def test_decomposed_solve_matches_the_plain_solve(depth):
+    instance = generate_instance(0, courses=24, terms=3, rooms=4, depth=depth, tightness=0.3)
+    plain, plain_metrics = CSP(*instance.csp_args()).solve()
+    solution, metrics = CSP(*instance.csp_args()).solve(decompose=True)
+    assert metrics["status"] == plain_metrics["status"] == "solved"
+    assert solution == plain
+    # Prerequisite chains across the terms leave one component, searched like the plain solve.
+    assert len(metrics["components"]) == (3 if depth == 0 else 1)
+    if depth:
+        assert metrics["nodes"] == plain_metrics["nodes"]
+
+
+@pytest.mark.parametrize("strategy", ["split", "portfolio"])
+def test_workers_agree_with_the_serial_solve(strategy, references):
+    for case in [case for case, solutions in references.items() if solutions and case[1] == 6][:3]:
+        args, reference = build(case[0], case[1], global_constraints=case[2])
+        _, serial = CSP(*args).solve(optimize=True)
+        solution, metrics = CSP(*args).solve(optimize=True, workers=2, strategy=strategy)
+        assert metrics["status"] == "optimal"
+        assert metrics["best_score"] == serial["best_score"] == score_schedule(solution, PREFERENCES), case
+        assert is_solution(solution, args, reference)
+    _, metrics = CSP(*two_terms(5, 4)).solve(workers=2, strategy=strategy)
+    assert metrics["status"] == "infeasible"
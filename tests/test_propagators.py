@@ -0,0 +1,42 @@
+import constraints as C
+from benchmark import generate_instance
+from conftest import brute_force, build, is_solution
+from csp import CSP
+
+
+def test_propagators_cut_the_search():
+    plain = propagated = 0
+    for seed in range(150):
+        args, reference = build(seed, n=6 + seed % 5, slots=3 + seed % 4)
+        solution, metrics = CSP(*args).solve()
+        plain += metrics["nodes"]
+        global_args, _ = build(seed, n=6 + seed % 5, slots=3 + seed % 4, global_constraints=True)
+        for config in ({}, {"trail": False}):
+            found, global_metrics = CSP(*global_args).solve(**config)
+            assert (found is None) == (solution is None), seed
+            if found is not None:
+                assert is_solution(found, args, reference)
+        propagated += global_metrics["nodes"]
+    assert (plain, propagated) == (6216, 222)
+
+
+def test_propagators_detect_pigeonhole():
+    for seed in range(40):
+        args, reference = build(seed, n=5, slots=2, global_constraints=True)
+        solution, metrics = CSP(*args).solve()
+        assert (solution is None) == (not brute_force(args, reference)), seed
+
+
+def test_propagation_on_large_instance():
+    # 400 courses over 40 terms: neither model backtracks when the rooms are free,
+    # and the propagators prove a booked instance infeasible before branching.
+    for booked, expected in ((0.0, (401, 0, 401, 0)), (0.8, (0, 0, 30, 101))):
+        args = generate_instance(0, courses=400, terms=40, rooms=6, professors=8, booked=booked).csp_args()
+        pairwise = dict(args[3], room_capacity=C.room_capacity_constraint_incremental,
+                        room_diversity=C.room_diversity_constraint_incremental)
+        del pairwise["slot_all_different"]
+        _, metrics = CSP(*args).solve()
+        _, pairwise_metrics = CSP(*args[:3] + (pairwise,) + args[4:]).solve()
+        assert metrics["status"] == pairwise_metrics["status"]
+        assert (metrics["nodes"], metrics["backtracks"],
+                pairwise_metrics["nodes"], pairwise_metrics["backtracks"]) == expected
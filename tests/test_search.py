@@ -0,0 +1,16 @@
+"""
+Cross-checks of the search against a brute-force reference on seeded small
+instances, with the trail and with copied domains.
+"""
+import pytest
+
+from conftest import check_feasibility
+
+CONFIGS = [
+    {},
+    {"trail": False},
+]
+
+@pytest.mark.parametrize("config", CONFIGS, ids=str)
+def test_feasibility(config, references):
+    check_feasibility(references, **config)
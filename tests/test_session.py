@@ -0,0 +1,84 @@
+import copy
+
+import pytest
+
+from benchmark import PREFERENCES
+from conftest import DATA_DIR
+from encoding import iter_bits
+from loader import CourseDomain, load_instance
+from session import SolverSession
+
+
+def test_update_availability_keeps_the_callers_table():
+    instance = load_instance(DATA_DIR)
+    before = copy.deepcopy(instance.availability)
+    session = SolverSession.from_instance(instance, PREFERENCES)
+    solution, _ = session.solve()
+    course = next(iter(solution))
+    term, _, time_label, _, _, professor = solution[course]
+    solution, _ = session.update_availability(professor, term, [t for t in ("8AM", "4PM") if t != time_label])
+    assert instance.availability == before
+    assert solution is None or solution[course][5] != professor or solution[course][2] != time_label
+
+
+def consistent(session, solution):
+    csp = session.csp
+    assert set(solution) == set(csp.variables)
+    for var, value in solution.items():
+        others = {other: v for other, v in solution.items() if other != var}
+        for name, constraint in csp.constraints.items():
+            assert constraint(var, value, others, csp.course_term, csp.prerequisites), (name, var)
+
+
+def test_remove_value_moves_only_that_course():
+    session = SolverSession.from_instance(load_instance(DATA_DIR), PREFERENCES)
+    solution, _ = session.solve()
+    size = len(session.csp.encoding)
+    repaired, metrics = session.remove_value("CMPUT204", solution["CMPUT204"])
+    consistent(session, repaired)
+    assert repaired["CMPUT204"] != solution["CMPUT204"]
+    assert metrics["repaired"] < len(solution)
+    assert len(session.csp.encoding) == size
+
+
+def test_unknown_values_are_rejected():
+    session = SolverSession.from_instance(load_instance(DATA_DIR), PREFERENCES)
+    solution, _ = session.solve()
+    size = len(session.csp.encoding)
+    unknown = ("Term9",) + solution["CHEM101"][1:]
+    other_term = solution["CHEM102"]
+    for edit in (session.remove_value, session.pin):
+        for value in (unknown, other_term):
+            with pytest.raises(ValueError):
+                edit("CHEM101", value)
+    assert len(session.csp.encoding) == size
+    assert session.solve()[1]["status"] == "solved"
+
+
+def test_pin_and_unpin():
+    session = SolverSession.from_instance(load_instance(DATA_DIR), PREFERENCES)
+    solution, _ = session.solve()
+    values = [session.csp.encoding.values[v] for v in iter_bits(session.base["CHEM101"])]
+    target = next(value for value in values if value != solution["CHEM101"])
+    pinned, _ = session.pin("CHEM101", target)
+    consistent(session, pinned)
+    assert pinned["CHEM101"] == target
+    repaired, _ = session.remove_value("CMPUT174", pinned["CMPUT174"])
+    assert repaired["CHEM101"] == target
+    unpinned, metrics = session.unpin("CHEM101")
+    consistent(session, unpinned)
+    assert metrics["status"] == "solved"
+    assert "CHEM101" not in session.pins
+
+
+def test_add_course():
+    instance = load_instance(DATA_DIR)
+    session = SolverSession.from_instance(instance, PREFERENCES)
+    session.solve()
+    domain = CourseDomain("Term2", instance.slots["TTH"], instance.rooms, instance.professors)
+    solution, _ = session.add_course("CMPUT175", domain, "Term2", ["CMPUT174"])
+    consistent(session, solution)
+    assert solution["CMPUT175"][0] == "Term2"
+    assert "CMPUT175" in session.csp.neighbors["CMPUT174"]
+    with pytest.raises(ValueError):
+        session.add_course("CMPUT175", domain, "Term2")